@@ -3,13 +3,33 @@
 # WebDriver settings
 # CHROME_DRIVER_PATH = 'crawler/chromedriver-win64/chromedriver.exe' # Uncomment and specify if using a local chromedriver
 CHROME_DRIVER_URL = "https://registry.npmmirror.com/-/binary/chromedriver" # Or use webdriver-manager
+DRIVER_CACHE_FILE = "data/chromedriver.json" # resolved chromedriver path, refreshed through webdriver-manager once a week
+BROWSER_PROFILE_DIR = "data/chrome_profiles" # persistent Chrome user data per browser (cache, cookies), None for a fresh profile each run
 COOKIES_FILE = "data/autohome_cookies.pkl"
 USER_PROFILE_URL = 'https://i.autohome.com.cn/' # AutoHome User Profile URL (replace with a valid one if needed)
 BASE_URL = "https://club.autohome.com.cn"
 
 # Data files
 POSTS_FILE = "data/autohome_posts.json"
+POSTS_LOG_FILE = "data/autohome_posts.jsonl"
 PROGRESS_FILE = "data/autohome_progress.json"
+WATERMARKS_FILE = "data/autohome_watermarks.json" # newest post seen per community, for incremental runs
+
+# Storage backend: 'jsonl' appends one line per post to POSTS_LOG_FILE (converted from POSTS_FILE on first run),
+# 'json' rewrites the whole POSTS_FILE on every save, 'sqlite' keeps posts, replies, links, progress and watermarks
+# in SQLITE_FILE (WAL mode, indexed upserts committed SQLITE_BATCH_SIZE writes at a time, safe for several processes;
+# existing files are imported on first use), 'shards' writes compressed JSONL shards to SHARD_DIR (see below)
+STORAGE_BACKEND = 'jsonl'
+SQLITE_FILE = "data/autohome.db"
+SQLITE_BATCH_SIZE = 100
+
+# Compressed shards: one community per shard, rotated after SHARD_MAX_MB (compressed) or SHARD_MAX_RECORDS posts,
+# listed with their community, time range and record count in SHARD_DIR/manifest.json.
+# 'gzip' needs nothing extra, 'zstd' needs the zstandard package
+SHARD_DIR = "data/autohome_shards"
+SHARD_COMPRESSION = 'gzip'
+SHARD_MAX_MB = 64
+SHARD_MAX_RECORDS = 10000
 
 # Community settings
 # Define communities to scrape in the format: {'community_name': {'url_template': 'url_with_{page_num}', 'total_pages': N, 'page_offset': M}}
@@ -28,11 +48,65 @@ COMMUNITIES = {
     # }
 }
 
+# Incremental mode: walk list pages newest-first and stop at the first page with nothing newer than the last run.
+# False walks every page up to total_pages.
+INCREMENTAL = True
+
 # Selenium settings
 WAIT_TIME = 10
-SCROLL_WAIT_TIME = 1
+SCROLL_QUIET_TIME = 0.5 # seconds without DOM changes or network requests before a page counts as loaded
+SCROLL_MAX_WAIT = 10 # upper bound for scrolling and waiting on lazy content, seconds
 RANDOM_DELAY_RANGE = (1, 3) # seconds
 
+# Worker pool settings
+NUM_WORKERS = 1 # Number of browser instances scraping pages in parallel
+MIN_REQUEST_INTERVAL = 1 # Minimum seconds between two page requests to the site, shared by all workers
+
+# Pipeline settings: when scraping links and details in one run, new links go straight to detail workers
+PIPELINE = True # False scrapes all links first, then all details
+PIPELINE_QUEUE_SIZE = 20 # Max links waiting for a detail worker; listing pauses while the queue is full
+
+# Reply pages: pages 2..N of a thread are fetched over HTTP with the browser's cookies, REPLY_PAGE_WORKERS at a time
+# (still spaced by MIN_REQUEST_INTERVAL); pages that fail fall back to the browser. Threads longer than
+# MAX_REPLY_PAGES pages are cut off there.
+REPLY_PAGE_WORKERS = 4
+MAX_REPLY_PAGES = 50
+
+# HTML parser backend: 'html.parser' (default, pure Python), 'lxml' or 'selectolax' (fastest, optional dependency).
+# python bench_parsers.py checks that a backend extracts the same as html.parser on the pages in samples/
+HTML_PARSER = 'html.parser'
+
+# Page cache: 'record' stores every fetched page source compressed in PAGE_CACHE_DIR,
+# 'replay' re-extracts everything from the cached pages without starting a browser, 'off' disables the cache
+PAGE_CACHE_MODE = 'record'
+PAGE_CACHE_DIR = "data/page_cache"
+
+# Error pages: pages that failed to scrape are saved gzip-compressed with a .json record in ERROR_PAGES_DIR by a
+# background thread; identical pages are stored once, and no new pages are saved beyond these limits (across runs)
+ERROR_PAGES_DIR = "error_pages"
+ERROR_PAGES_MAX_FILES = 200
+ERROR_PAGES_MAX_MB = 100
+
+# Metrics: per-phase timings and page/post/reply/error/byte counters in Prometheus text format.
+# METRICS_TEXTFILE is rewritten at every checkpoint (point node_exporter's textfile collector at it, or None to disable);
+# METRICS_PORT serves the same data at http://127.0.0.1:<port>/metrics while the crawler runs (None to disable)
+METRICS_TEXTFILE = "data/metrics.prom"
+METRICS_PORT = None
+
+# Resource policy: requests for these resource types and URL patterns are blocked through the DevTools protocol,
+# extraction only needs the page text. RESOURCE_STATS logs blocked and loaded requests per page (off by default:
+# it turns on Chrome's performance log, which is parsed after every page).
+BLOCKED_RESOURCE_TYPES = ['image', 'font', 'media'] # see RESOURCE_TYPE_EXTENSIONS in resource_policy.py
+BLOCKED_URL_PATTERNS = [
+    '*hm.baidu.com*',
+    '*cnzz.com*',
+    '*google-analytics.com*',
+    '*googletagmanager.com*',
+    '*googlesyndication.com*',
+    '*doubleclick.net*',
+]
+RESOURCE_STATS = False
+
 # Chrome options (adjust as needed)
 CHROME_OPTIONS = [
     '--disable-plugins-discovery',
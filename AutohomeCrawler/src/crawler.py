@@ -1,23 +1,39 @@
 # crawler.py
 
+import itertools
 import time
 import random
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
 
 
 from src.utils import load_cookies, save_cookies, manual_login, read_json, write_json
 from src.scraper import get_post_detail_links, get_post_detail
+from src.storage import open_post_store
+from src.progress import open_progress_store
+from src.sqlite_store import open_database
+from src.link_index import LinkIndex, canonical_url
+from src.watermark import HighWaterMarks
+from src.pool import DriverPool, RateLimiter
+from src.driver_setup import start_chrome, use_profile
+from src.reply_pages import ReplyPageFetcher
+from src.page_cache import page_cache
+from src.metrics import metrics
+from src.error_capture import error_pages
+from src.resource_policy import apply_resource_policy, enable_resource_log, resource_stats
 from config.settings import (
-    CHROME_DRIVER_URL, COOKIES_FILE, USER_PROFILE_URL, POSTS_FILE,
-    PROGRESS_FILE, COMMUNITIES, 
-    WAIT_TIME, RANDOM_DELAY_RANGE, CHROME_OPTIONS, CHROME_PREFS
+    CHROME_DRIVER_URL, DRIVER_CACHE_FILE, BROWSER_PROFILE_DIR, COOKIES_FILE, USER_PROFILE_URL, POSTS_FILE,
+    POSTS_LOG_FILE, STORAGE_BACKEND, SQLITE_FILE, SQLITE_BATCH_SIZE, SHARD_DIR, SHARD_COMPRESSION, SHARD_MAX_MB,
+    SHARD_MAX_RECORDS, PROGRESS_FILE, WATERMARKS_FILE, COMMUNITIES,
+    INCREMENTAL, WAIT_TIME, RANDOM_DELAY_RANGE, NUM_WORKERS, MIN_REQUEST_INTERVAL,
+    PIPELINE, PIPELINE_QUEUE_SIZE, REPLY_PAGE_WORKERS, BLOCKED_RESOURCE_TYPES, BLOCKED_URL_PATTERNS, RESOURCE_STATS,
+    PAGE_CACHE_MODE, PAGE_CACHE_DIR, METRICS_TEXTFILE, METRICS_PORT,
+    ERROR_PAGES_DIR, ERROR_PAGES_MAX_FILES, ERROR_PAGES_MAX_MB, CHROME_OPTIONS, CHROME_PREFS
 )
 
 # Define paths for intermediate links file
 LINKS_FILE = "data/autohome_links.json"
+# Canonical URLs of every link seen so far, shared by all communities and kept across runs
+LINK_INDEX_FILE = "data/autohome_link_index.json"
 
 class AutohomeCrawler:
     def __init__(self):
@@ -25,27 +41,64 @@ class AutohomeCrawler:
         # Use dictionaries to store posts and links, keyed by community name
         self.posts = {}
         self.links = {}
+        # With the sqlite backend, posts, links, progress and marks all live in one database
+        self.db = open_database(SQLITE_FILE, SQLITE_BATCH_SIZE) if STORAGE_BACKEND == 'sqlite' else None
+        shards = dict(folder=SHARD_DIR, site='autohome', compression=SHARD_COMPRESSION,
+                      max_bytes=SHARD_MAX_MB * 1024 * 1024, max_records=SHARD_MAX_RECORDS)
+        self.store = open_post_store(STORAGE_BACKEND, POSTS_FILE, POSTS_LOG_FILE, db=self.db, shards=shards)
         # Progress is a set of URLs of posts for which details have been scraped
+        self.progress = None
         self.processed_post_urls = set()
-
-    def _init_driver(self):
-        """初始化WebDriver"""
-        print("正在初始化WebDriver...")
+        self.link_index = None
+        self.marks = None
+        self.pool = None
+        # Each browser needs a profile directory of its own, workers are numbered in creation order
+        self._worker_ids = itertools.count(1)
+        self.rate_limiter = None
+        self.reply_fetcher = None
+        page_cache.configure(PAGE_CACHE_DIR, PAGE_CACHE_MODE)
+        metrics.configure('autohome', METRICS_TEXTFILE, METRICS_PORT)
+        error_pages.configure(ERROR_PAGES_DIR, ERROR_PAGES_MAX_FILES, ERROR_PAGES_MAX_MB * 1024 * 1024)
+
+    def _create_driver(self, profile='main'):
+        """创建一个WebDriver实例，profile 为 BROWSER_PROFILE_DIR 下的用户目录名"""
         options = Options()
         for arg in CHROME_OPTIONS:
             options.add_argument(arg)
         if CHROME_PREFS:
             options.add_experimental_option("prefs", CHROME_PREFS)
+        if RESOURCE_STATS:
+            enable_resource_log(options)
+        use_profile(options, BROWSER_PROFILE_DIR, profile)
             
-        # Use webdriver_manager to handle driver executable
-        service = Service(ChromeDriverManager(url=CHROME_DRIVER_URL).install())
-        self.driver = webdriver.Chrome(service=service, options=options)
-        self.driver.set_window_size(1920, 1080)
+        # The driver path is resolved once and cached, startup does not need the network
+        driver = start_chrome(options, CHROME_DRIVER_URL, DRIVER_CACHE_FILE)
+        apply_resource_policy(driver, BLOCKED_RESOURCE_TYPES, BLOCKED_URL_PATTERNS)
+        driver.set_window_size(1920, 1080)
+        return driver
+
+    def _create_worker_driver(self):
+        """为 worker 创建WebDriver，并加载主浏览器登录时保存的cookies"""
+        driver = self._create_driver(f"worker-{next(self._worker_ids)}")
+        driver.get(USER_PROFILE_URL)
+        load_cookies(driver, COOKIES_FILE)
+        return driver
+
+    def _init_driver(self):
+        """初始化WebDriver"""
+        print("正在初始化WebDriver...")
+        self.driver = self._create_driver()
+        self.rate_limiter = RateLimiter(MIN_REQUEST_INTERVAL)
+        # The logged-in main driver is the first worker, extra workers share its cookies
+        self.pool = DriverPool(
+            self._create_worker_driver, NUM_WORKERS, first_driver=self.driver,
+            rate_limiter=self.rate_limiter, delay_range=RANDOM_DELAY_RANGE
+        )
 
     def _load_data_and_progress(self):
         """加载已有的数据、链接和进度"""
         print("加载数据和进度...")
-        self.posts = read_json(POSTS_FILE)
+        self.posts = self.store.load()
         # Ensure posts structure is dictionary with lists
         if not isinstance(self.posts, dict):
              self.posts = {}
@@ -53,37 +106,63 @@ class AutohomeCrawler:
              if community_key not in self.posts or not isinstance(self.posts[community_key], list):
                   self.posts[community_key] = []
 
-        self.links = read_json(LINKS_FILE)
+        self.links = self._read_links()
         # Ensure links structure is dictionary with lists
         if not isinstance(self.links, dict):
              self.links = {}
         for community_key in COMMUNITIES.keys():
              if community_key not in self.links or not isinstance(self.links[community_key], list):
                   self.links[community_key] = []
-
-        # Load progress as a set for efficient lookups
-        processed_list = read_json(PROGRESS_FILE)
-        if isinstance(processed_list, list):
-             self.processed_post_urls = set(processed_list)
-        else:
-             self.processed_post_urls = set()
+        # Links are kept in canonical form, older files may still contain fragments and duplicates
+        for community_key, links_list in self.links.items():
+             if isinstance(links_list, list):
+                  self.links[community_key] = list(dict.fromkeys(canonical_url(link) for link in links_list if link))
+
+        # Load progress as an indexed, journaled set for efficient lookups
+        if self.progress:
+             self.progress.close()
+        self.progress = open_progress_store(PROGRESS_FILE, db=self.db)
+        self.processed_post_urls = self.progress.view()
+        for url in list(self.processed_post_urls):
+             self.processed_post_urls.add(canonical_url(url))
+
+        # The index is seeded from the links file the first time it is created
+        if self.link_index:
+             self.link_index.close()
+        self.link_index = LinkIndex(LINK_INDEX_FILE, seed=itertools.chain.from_iterable(self.links.values()), db=self.db)
+
+        # Newest post id seen per community, used to stop incremental runs early
+        if self.marks:
+             self.marks.close()
+        self.marks = HighWaterMarks(WATERMARKS_FILE, db=self.db)
 
         print(f"加载完成：{len(self.posts)} 个社区的数据, {sum(len(v) for v in self.links.values())} 个链接, {len(self.processed_post_urls)} 条进度记录。")
 
     def _save_data_and_progress(self):
         """保存抓取到的数据和进度"""
         print("保存数据和进度...")
-        write_json(self.posts, POSTS_FILE)
-        # Save progress as a list
-        write_json(list(self.processed_post_urls), PROGRESS_FILE)
+        with metrics.timer('persist'):
+            self.store.flush()
+            # Progress changes are already in the journal, just flush it
+            self.progress.flush()
+        metrics.write_textfile()
         print("保存完成。")
 
-    def _save_links(self):
-         """保存抓取到的链接"""
+    def _save_links(self, community_key, new_links):
+         """保存抓取到的链接，sqlite 存储时只写入这一页的新链接"""
          print("保存链接...")
-         write_json(self.links, LINKS_FILE)
+         if self.db:
+              self.db.add_links(community_key, new_links)
+         else:
+              write_json(self.links, LINKS_FILE)
          print("链接保存完成。")
 
+    def _read_links(self):
+        """读取已保存的链接，sqlite 存储第一次使用时导入链接文件"""
+        if self.db:
+            return self.db.load_links(seed=lambda: read_json(LINKS_FILE))
+        return read_json(LINKS_FILE)
+
     def _ensure_login(self):
         """确保用户登录"""
         print("检查登录状态...")
@@ -107,16 +186,20 @@ class AutohomeCrawler:
         print("登录检查完成。")
 
 
-    def scrape_links(self):
-        """抓取所有社区的帖子链接"""
-        print("开始抓取帖子链接...")
-        
+    def _scrape_link_pages(self):
+        """逐页抓取所有社区的帖子链接，每页保存一次链接，并逐页返回 (社区, 该页新链接列表)
+
+        INCREMENTAL 为 True 时，遇到一整页都不比上次见过的最新帖子更新就停止翻页。
+        """
         for community_key, community_info in COMMUNITIES.items():
             url_template = community_info['url_template']
             total_pages = community_info.get('total_pages', 1)
             page_offset = community_info.get('page_offset', 0)
 
             print(f"开始抓取社区 {community_key} 的帖子链接...")
+            mark = self.marks.get(community_key) if INCREMENTAL else {}
+            if mark:
+                print(f"社区 {community_key} 上次见过的最新帖子 id: {mark.get('id')}")
 
             for i in range(page_offset, total_pages + page_offset):
                 page_num = i + 1
@@ -129,21 +212,67 @@ class AutohomeCrawler:
 
                 print(f"抓取社区 {community_key} 的第 {page_num} 页链接...")
                 
-                partial_links = get_post_detail_links(self.driver, page_url, page_num, WAIT_TIME)
+                # Listing pages count towards the same site-wide request interval as detail pages
+                self.rate_limiter.wait()
+                with metrics.context(community_key):
+                    partial_links = get_post_detail_links(self.driver, page_url, page_num, WAIT_TIME)
+                # Pinned posts are old, so a page only counts as known when none of its posts is newer than the mark
+                if mark and partial_links and not any(self.marks.is_new(community_key, link) for link in partial_links):
+                    print(f"社区 {community_key} 第 {page_num} 页没有新帖子，停止翻页。")
+                    break
+                for link in partial_links:
+                    self.marks.observe(community_key, link)
+
+                # Only links never seen before, in any community or run, are kept
+                new_links = self.link_index.ingest(partial_links)
                 
                 # Append links to the community's list
                 # Initialize if not exists
                 if community_key not in self.links:
                      self.links[community_key] = []
-                self.links[community_key].extend(partial_links)
+                self.links[community_key].extend(new_links)
                 
                 # Save links periodically or after each community/page
-                self._save_links()
-                print(f"社区 {community_key} 第 {page_num} 页链接已抓取并保存。")
-                time.sleep(random.uniform(*RANDOM_DELAY_RANGE)) # Delay between pages
-        
+                with metrics.context(community_key), metrics.timer('persist'):
+                    self._save_links(community_key, new_links)
+                print(f"社区 {community_key} 第 {page_num} 页链接已抓取并保存，新链接 {len(new_links)}/{len(partial_links)}。")
+                yield community_key, new_links
+                with metrics.timer('sleep'):
+                    time.sleep(random.uniform(*RANDOM_DELAY_RANGE)) # Delay between pages
+
+            # The mark only moves once the walk is done, an interrupted walk is redone next time
+            self.marks.commit(community_key)
+
+    def scrape_links(self):
+        """抓取所有社区的帖子链接"""
+        print("开始抓取帖子链接...")
+        for _ in self._scrape_link_pages():
+            pass
         print("帖子链接抓取完成。")
 
+    def _create_reply_fetcher(self):
+        """创建回复页抓取器，带上主浏览器当前的cookies和User-Agent"""
+        return ReplyPageFetcher(
+            self.driver.get_cookies(), self.driver.execute_script("return navigator.userAgent"),
+            max_workers=REPLY_PAGE_WORKERS, rate_limiter=self.rate_limiter
+        )
+
+    def _detail_tasks(self, link_pages):
+        """把 (社区, 链接列表) 展开成待抓取详情的 (社区, 链接) 任务，跳过已处理和重复的链接"""
+        queued = set()
+        for community_key, links_list in link_pages:
+            if not isinstance(links_list, list):
+                 print(f"警告: 社区 {community_key} 的链接数据格式不正确，跳过详情抓取。")
+                 continue
+
+            for link in links_list:
+                # Check if this post URL has already been processed
+                if not link:
+                    print(f"警告: 发现一个空的帖子链接，跳过。")
+                elif link not in self.processed_post_urls and link not in queued:
+                    queued.add(link)
+                    yield community_key, link
+
     def scrape_details(self):
         """抓取所有帖子的详情和回复"""
         print("开始抓取帖子详情和回复...")
@@ -153,76 +282,143 @@ class AutohomeCrawler:
              print("没有链接可供抓取详情。请先运行 scrape_links。")
              return
 
-        processed_count_session = 0
+        # Collect (community, link) tasks that still need details
+        tasks = list(self._detail_tasks(self.links.items()))
+        print(f"共有 {len(tasks)} 个帖子待抓取详情。")
+        self.reply_fetcher = self._create_reply_fetcher()
+        self._save_details(self.pool.imap(tasks, self._fetch_detail))
+        print("所有帖子详情抓取完成。")
 
-        # Iterate through all communities and their links
-        for community_key, links_list in self.links.items():
-            if not isinstance(links_list, list):
-                 print(f"警告: 社区 {community_key} 的链接数据格式不正确，跳过详情抓取。")
-                 continue
+    def scrape_pipelined(self):
+        """边抓取链接边抓取详情
 
-            print(f"抓取社区 {community_key} 的帖子详情...")
-            for link in links_list:
-                # Check if this post URL has already been processed
-                if link and link not in self.processed_post_urls:
-                    print(f"抓取帖子详情: {link}")
-                    post_detail = get_post_detail(self.driver, link, WAIT_TIME)
-
-                    if post_detail:
-                        # Append post detail to the community's list in self.posts
-                        # Initialize if not exists
-                        if community_key not in self.posts:
-                             self.posts[community_key] = []
-                        self.posts[community_key].append(post_detail)
-
-                        # Add the processed URL to the set
-                        self.processed_post_urls.add(link)
-                        processed_count_session += 1
-
-                        # Save progress and data periodically
-                        if processed_count_session % 10 == 0: # Save every 10 posts
-                             self._save_data_and_progress()
-                             print(f"已抓取并保存 {processed_count_session} 个帖子详情 (总计 {len(self.processed_post_urls)})。")
-
-                        time.sleep(random.uniform(*RANDOM_DELAY_RANGE)) # Delay between posts
-                    else:
-                        print(f"帖子详情抓取失败或无有效内容，跳过：{link}")
-                        # The get_post_detail function already saves error page
-                        time.sleep(random.uniform(*RANDOM_DELAY_RANGE)) # Still add delay even if failed
-
-                elif link in self.processed_post_urls:
-                    pass # Skip if already processed
-                elif not link:
-                    print(f"警告: 发现一个空的帖子链接，跳过。")
+        主浏览器在生产线程中逐页抓取列表，新链接经有界队列直接交给详情 worker，
+        队列满时列表抓取暂停；数据和进度仍在当前线程统一写入。
+        """
+        print("开始流水线抓取帖子链接和详情...")
+        # Cookies are read before the main driver starts on listing pages in the producer thread
+        self.reply_fetcher = self._create_reply_fetcher()
+        # The main driver is busy with listing pages, so detail workers get browsers of their own
+        pool = DriverPool(
+            self._create_worker_driver, NUM_WORKERS,
+            rate_limiter=self.rate_limiter, delay_range=RANDOM_DELAY_RANGE
+        )
+        try:
+            # Links found in earlier runs but not yet scraped go first, then new links as they are found
+            known_links = list(self.links.items())
+            tasks = self._detail_tasks(itertools.chain(known_links, self._scrape_link_pages()))
+            self._save_details(pool.imap(tasks, self._fetch_detail, max_pending=PIPELINE_QUEUE_SIZE))
+        finally:
+            pool.close()
+        print("帖子链接和详情抓取完成。")
+
+    def _save_details(self, results):
+        """保存 worker 返回的 ((社区, 链接), 帖子详情)"""
+        processed_count_session = 0
+
+        # Workers only fetch pages; data and progress are written here by a single writer
+        for (community_key, link), post_detail in results:
+            if post_detail:
+                # Append post detail to the community's list in self.posts
+                # Initialize if not exists
+                if community_key not in self.posts:
+                     self.posts[community_key] = []
+                self.posts[community_key].append(post_detail)
+                with metrics.context(community_key), metrics.timer('persist'):
+                    self.store.append(community_key, post_detail)
+
+                # Add the processed URL to the set
+                self.processed_post_urls.add(link)
+                processed_count_session += 1
+
+                # Save progress and data periodically
+                if processed_count_session % 10 == 0: # Save every 10 posts
+                     self._save_data_and_progress()
+                     print(f"已抓取并保存 {processed_count_session} 个帖子详情 (总计 {len(self.processed_post_urls)})。")
+            else:
+                print(f"帖子详情抓取失败或无有效内容，跳过：{link}")
+                # The get_post_detail function already saves error page
 
         # Save remaining data and progress after loop finishes
         self._save_data_and_progress()
-        print("所有帖子详情抓取完成。")
 
-    def run(self, scrape_links=True, scrape_details=True):
+    def _fetch_detail(self, driver, task):
+        """worker 线程中抓取单个帖子详情"""
+        community_key, link = task
+        print(f"抓取帖子详情: {link}")
+        with metrics.context(community_key):
+            return get_post_detail(driver, link, WAIT_TIME, self.reply_fetcher)
+
+    def replay(self):
+        """不启动浏览器，用页面缓存重新抽取所有已知链接的帖子详情
+
+        结果按 url 覆盖原来的记录，不读取也不修改进度。
+        """
+        print("开始从页面缓存重新抽取帖子详情...")
+        self.posts = self.store.load()
+        self.links = self._read_links()
+        replayed = missing = 0
+        start_time = time.perf_counter()
+        for community_key, links_list in self.links.items():
+            if not isinstance(links_list, list):
+                continue
+            for link in dict.fromkeys(canonical_url(link) for link in links_list if link):
+                post_detail = get_post_detail(None, link)
+                if post_detail is None:
+                    missing += 1
+                    continue
+                self.store.append(community_key, post_detail)
+                replayed += 1
+        self.store.close()
+        print(f"重放完成：重新抽取 {replayed} 个帖子，{missing} 个没有缓存或无有效内容，用时 {time.perf_counter() - start_time:.1f} 秒。")
+
+    def run(self, scrape_links=True, scrape_details=True, pipeline=PIPELINE):
         """运行爬虫
 
         Args:
             scrape_links (bool): Whether to scrape post links.
             scrape_details (bool): Whether to scrape post details and replies.
+            pipeline (bool): When scraping both, hand new links to detail workers as soon as they are found.
         """
+        if page_cache.replaying:
+            self.replay()
+            return
+
         self._load_data_and_progress()
         self._init_driver()
 
         try:
             self._ensure_login()
-            if scrape_links:
-                self.scrape_links()
-            if scrape_details:
-                 # Reload data/links after scraping links, in case links file was empty initially
-                 # Or if running scrape_details separately after a previous link scraping run
-                 if scrape_links: # Only reload if links were potentially updated in this run
-                      self._load_data_and_progress()
-                 self.scrape_details()
+            if scrape_links and scrape_details and pipeline:
+                self.scrape_pipelined()
+            else:
+                if scrape_links:
+                    self.scrape_links()
+                if scrape_details:
+                     # Reload data/links after scraping links, in case links file was empty initially
+                     # Or if running scrape_details separately after a previous link scraping run
+                     if scrape_links: # Only reload if links were potentially updated in this run
+                          self._load_data_and_progress()
+                     self.scrape_details()
 
         except Exception as e:
             print(f"爬虫运行出错: {e}")
         finally:
+            if self.pool:
+                self.pool.close()
             if self.driver:
                 self.driver.quit()
+            resource_stats.summary()
+            metrics.summary()
+            metrics.write_textfile()
+            error_pages.close()
+            self.store.close()
+            if self.progress:
+                self.progress.close()
+            if self.link_index:
+                self.link_index.close()
+            if self.marks:
+                self.marks.close()
+            if self.db:
+                self.db.close()
             print("爬虫运行结束。") 
\ No newline at end of file
@@ -0,0 +1,152 @@
+# error_capture.py
+
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+
+class ErrorPageWriter:
+    """在后台线程中保存出错的页面，抓取线程只负责把页面源码放进队列
+
+    每个页面 gzip 压缩保存为 <sha256 前 16 位>.html.gz，旁边的同名 .json 记录 url、出错原因、
+    出现次数和首末次时间。内容相同的页面只保存一份，再次出现时只更新 .json。
+    保存的页面数或总字节数达到上限后不再保存新的页面（已有页面的记录仍会更新），
+    队列满时直接丢弃，出错页面再多也不会拖慢抓取或占满磁盘。
+
+    Args:
+        folder (str): 保存目录
+        max_files (int): 最多保存的页面数（跨运行累计）
+        max_bytes (int): 压缩后的页面最多占用的字节数（跨运行累计）
+        queue_size (int): 等待写入的页面数上限
+    """
+
+    MAX_URLS = 20  # 每个页面的 .json 中最多记录的 url 数
+
+    def __init__(self, folder='error_pages', max_files=200, max_bytes=100 * 1024 * 1024, queue_size=50):
+        self.folder = folder
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._digests = None
+        self._files = 0
+        self._bytes = 0
+        self._budget_warned = False
+
+    def configure(self, folder, max_files, max_bytes):
+        with self._lock:
+            self.folder = folder
+            self.max_files = max_files
+            self.max_bytes = max_bytes
+            self._digests = None
+
+    def capture(self, url, html, reason='', page_num=None):
+        """把页面交给后台线程保存，不阻塞；队列满时丢弃并返回 False"""
+        if html is None:
+            return False
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+        try:
+            self._queue.put_nowait((url, html, reason, page_num, time.time()))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self, timeout=10):
+        """等待队列中的页面写完"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+        if self.dropped:
+            print(f"出错页面: 因队列已满或超出上限，{self.dropped} 个页面未保存。")
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self._write(*item)
+            except Exception as e:
+                print(f"保存错误页面失败: {e}")
+
+    def _load(self):
+        """扫描已保存的页面，统计数量和大小"""
+        self._digests = set()
+        self._files = self._bytes = 0
+        if not os.path.isdir(self.folder):
+            return
+        for name in os.listdir(self.folder):
+            if name.endswith('.html.gz'):
+                self._digests.add(name[:-len('.html.gz')])
+                self._files += 1
+                self._bytes += os.path.getsize(os.path.join(self.folder, name))
+
+    def _write(self, url, html, reason, page_num, captured_at):
+        if self._digests is None:
+            self._load()
+        body = html.encode('utf-8') if isinstance(html, str) else html
+        sha256 = hashlib.sha256(body).hexdigest()
+        digest = sha256[:16]
+        base = os.path.join(self.folder, digest)
+
+        if digest in self._digests:
+            # 同样的出错页面已经保存过，只更新记录
+            try:
+                with open(base + '.json', 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                meta = {'sha256': sha256, 'urls': [], 'reason': reason, 'page_num': page_num,
+                        'size': len(body), 'count': 0, 'first_seen': captured_at}
+            meta['count'] += 1
+            meta['last_seen'] = captured_at
+            if url not in meta['urls'] and len(meta['urls']) < self.MAX_URLS:
+                meta['urls'].append(url)
+        else:
+            compressed = gzip.compress(body)
+            if self._files >= self.max_files or self._bytes + len(compressed) > self.max_bytes:
+                self.dropped += 1
+                if not self._budget_warned:
+                    print(f"出错页面已达到上限（{self.max_files} 个 / {self.max_bytes / 1024 / 1024:.0f} MB），之后的新页面不再保存。")
+                    self._budget_warned = True
+                return
+            os.makedirs(self.folder, exist_ok=True)
+            with open(base + '.html.gz', 'wb') as f:
+                f.write(compressed)
+            self._digests.add(digest)
+            self._files += 1
+            self._bytes += len(compressed)
+            meta = {
+                'sha256': sha256,
+                'urls': [url],
+                'reason': reason,
+                'page_num': page_num,
+                'size': len(body),
+                'count': 1,
+                'first_seen': captured_at,
+                'last_seen': captured_at,
+            }
+            print(f"错误页面已保存到 {base}.html.gz")
+
+        tmp_path = base + '.json.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, base + '.json')
+
+
+# 同一进程中的所有抓取线程共用，由爬虫按配置调用 configure
+error_pages = ErrorPageWriter()
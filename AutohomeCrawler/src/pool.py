@@ -0,0 +1,180 @@
+# pool.py
+
+import queue
+import random
+import threading
+import time
+
+from src.metrics import metrics
+
+
+class RateLimiter:
+    """站点级的请求间隔限制，所有 worker 共享
+
+    保证任意两次页面请求的开始时间至少相隔 min_interval 秒。
+    """
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_time)
+            self._next_time = start + self.min_interval
+        if start > now:
+            with metrics.timer('sleep'):
+                time.sleep(start - now)
+
+
+class DriverPool:
+    """由多个 WebDriver 组成的 worker 池
+
+    每个 worker 线程持有自己的浏览器，从共享队列中取任务执行，
+    结果统一交回调用方所在的线程处理（单一写入者），因此保存数据和进度不需要加锁。
+    任务也可以由生成器边产生边提交（见 imap 的 max_pending），用于链接发现和详情抓取的流水线。
+
+    Args:
+        create_driver: 创建一个已加载 cookies 的 WebDriver 的函数
+        num_workers (int): worker 数量
+        first_driver: 可选，已有的（已登录的）WebDriver，作为第一个 worker 使用，不会被池关闭
+        rate_limiter (RateLimiter, optional): 站点级请求间隔
+        delay_range (tuple, optional): 每个 worker 处理完一个任务后的随机等待时间
+    """
+
+    _DONE = object()
+
+    def __init__(self, create_driver, num_workers, first_driver=None, rate_limiter=None, delay_range=None):
+        self.create_driver = create_driver
+        self.num_workers = max(1, num_workers)
+        self.first_driver = first_driver
+        self.rate_limiter = rate_limiter
+        self.delay_range = delay_range
+        self._stop = threading.Event()
+        self._drivers = {}  # worker_id -> 池创建的 WebDriver，多次 imap 之间复用
+        self._lock = threading.Lock()
+
+    def _get_driver(self, worker_id):
+        if worker_id == 0 and self.first_driver is not None:
+            return self.first_driver
+        with self._lock:
+            driver = self._drivers.get(worker_id)
+        if driver is None:
+            driver = self.create_driver()
+            with self._lock:
+                self._drivers[worker_id] = driver
+        return driver
+
+    def _worker(self, worker_id, work, tasks, results):
+        try:
+            driver = self._get_driver(worker_id)
+        except Exception as e:
+            print(f"worker {worker_id} 初始化WebDriver失败: {e}")
+            results.put(self._DONE)
+            return
+
+        while True:
+            task = self._get(tasks)
+            if task is self._DONE:
+                break
+            if self.rate_limiter:
+                self.rate_limiter.wait()
+            try:
+                result = work(driver, task)
+            except Exception as e:
+                print(f"worker {worker_id} 处理任务失败: {e}")
+                result = None
+            results.put((task, result))
+            if self.delay_range:
+                with metrics.timer('sleep'):
+                    time.sleep(random.uniform(*self.delay_range))
+        results.put(self._DONE)
+
+    def _get(self, tasks):
+        """取下一个任务，池停止时返回 _DONE"""
+        while not self._stop.is_set():
+            try:
+                return tasks.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return self._DONE
+
+    def _put(self, tasks, task):
+        """放入任务，队列满时阻塞直到有空位；池停止时放弃并返回 False"""
+        while not self._stop.is_set():
+            try:
+                tasks.put(task, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _feed(self, tasks, task_queue, num_workers):
+        """在单独的线程中迭代任务生成器，逐个放入有界队列"""
+        try:
+            for task in tasks:
+                if not self._put(task_queue, task):
+                    return
+        except Exception as e:
+            print(f"生成任务失败: {e}")
+        finally:
+            for _ in range(num_workers):
+                self._put(task_queue, self._DONE)
+
+    def imap(self, tasks, work, max_pending=None):
+        """并行执行 work(driver, task)，按完成顺序逐个返回 (task, result)
+
+        Args:
+            tasks: 任务列表，或 max_pending 不为 None 时的任务生成器
+            work: work(driver, task) -> result，在 worker 线程中执行
+            max_pending (int, optional): 为 None 时一次性把全部任务放入队列；
+                否则由一个生产线程迭代 tasks，等待中的任务最多 max_pending 个，
+                队列满时生成器暂停（背压），第一个任务产生后 worker 就开始工作
+        """
+        threads = []
+        if max_pending is None:
+            task_queue = queue.Queue()
+            for task in tasks:
+                task_queue.put(task)
+            num_workers = min(self.num_workers, task_queue.qsize()) or 1
+            for _ in range(num_workers):
+                task_queue.put(self._DONE)
+        else:
+            task_queue = queue.Queue(maxsize=max(1, max_pending))
+            num_workers = self.num_workers
+            feeder = threading.Thread(target=self._feed, args=(tasks, task_queue, num_workers), daemon=True)
+            feeder.start()
+            threads.append(feeder)
+        results = queue.Queue()
+
+        for worker_id in range(num_workers):
+            thread = threading.Thread(target=self._worker, args=(worker_id, work, task_queue, results), daemon=True)
+            thread.start()
+            threads.append(thread)
+        print(f"已启动 {num_workers} 个 worker。")
+
+        try:
+            running = num_workers
+            while running:
+                item = results.get()
+                if item is self._DONE:
+                    running -= 1
+                    continue
+                yield item
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            self._stop.clear()
+
+    def close(self):
+        """关闭池创建的浏览器"""
+        with self._lock:
+            drivers, self._drivers = list(self._drivers.values()), {}
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception as e:
+                print(f"关闭WebDriver失败: {e}")
@@ -0,0 +1,99 @@
+# reply_pages.py
+
+import contextvars
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+
+from src.page_cache import page_cache
+from src.metrics import metrics
+
+
+# 帖子的分页链接：/bbs/thread/<hash>/<id>-<page>.html
+_THREAD_PAGE = re.compile(r'^(/bbs/thread/\w+/\d+)-(\d+)\.html$')
+
+
+def reply_page_urls(html, url, max_pages=50):
+    """从帖子页面中的分页链接找出总页数，返回当前页之后各页的链接（按页码顺序，最多到第 max_pages 页）
+
+    分页条通常只显示前几页和最后一页，所以取所有指向同一帖子的链接中最大的页码。
+    """
+    parts = urlsplit(url)
+    match = _THREAD_PAGE.match(parts.path)
+    if not match or not html:
+        return []
+    base, current = match.group(1), int(match.group(2))
+    page_numbers = [int(n) for n in re.findall(re.escape(base) + r'-(\d+)\.html', html)]
+    last = min(max(page_numbers, default=current), max_pages)
+    return [urlunsplit((parts.scheme, parts.netloc, f"{base}-{n}.html", '', '')) for n in range(current + 1, last + 1)]
+
+
+class ReplyPageFetcher:
+    """不经过浏览器，用 HTTP 并发抓取帖子的其余回复页
+
+    请求带上浏览器登录后的 cookies 和 User-Agent，每个请求开始前经过站点级的 RateLimiter，
+    所以并发只是让各页的等待时间重叠，不会超过设置的请求频率。
+    record 模式下页面写入页面缓存，replay 模式下从缓存读取。
+
+    Args:
+        cookies (list): driver.get_cookies() 的结果
+        user_agent (str, optional): 与浏览器相同的 User-Agent
+        max_workers (int): 同时进行的请求数
+        rate_limiter (RateLimiter, optional): 站点级请求间隔
+    """
+
+    def __init__(self, cookies=(), user_agent=None, max_workers=4, rate_limiter=None, time_out=10):
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = rate_limiter
+        self.time_out = time_out
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie['name'], cookie['value'],
+                domain=cookie.get('domain', ''), path=cookie.get('path', '/')
+            )
+
+    def fetch_one(self, url):
+        """返回页面 HTML，请求失败或被重定向到帖子以外的页面时返回 None"""
+        if page_cache.replaying:
+            return page_cache.get(url)
+        if self.rate_limiter:
+            self.rate_limiter.wait()
+        try:
+            with metrics.timer('navigate'):
+                response = self.session.get(url, timeout=self.time_out)
+        except requests.RequestException as e:
+            print(f"回复页请求失败 {url}: {e}")
+            return None
+        if response.status_code != 200:
+            print(f"回复页 HTTP 状态码 {response.status_code}: {url}")
+            return None
+        # 被重定向到验证页或登录页时页面里没有回复，不能当作空页，交给浏览器重新打开
+        if response.url != url and not _THREAD_PAGE.match(urlsplit(response.url).path):
+            print(f"回复页被重定向到 {response.url}: {url}")
+            return None
+        # 响应头没有声明编码时先看页面的 <meta charset>，再按内容判断，避免按 ISO-8859-1 解码中文
+        if 'charset' not in response.headers.get('Content-Type', '').lower():
+            declared = requests.utils.get_encodings_from_content(response.content[:2048].decode('ascii', 'ignore'))
+            response.encoding = declared[0] if declared else response.apparent_encoding
+        html = response.text
+        metrics.inc('pages')
+        metrics.inc('bytes', len(response.content))
+        page_cache.put(url, html)
+        return html
+
+    def fetch(self, urls):
+        """并发抓取 urls，按输入顺序返回 HTML 列表，失败的页面为 None"""
+        if len(urls) <= 1 or page_cache.replaying:
+            return [self.fetch_one(url) for url in urls]
+        # Worker threads start with an empty context, each request carries a copy of the caller's (community label)
+        contexts = [contextvars.copy_context() for _ in urls]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls))) as executor:
+            return list(executor.map(lambda context, url: context.run(self.fetch_one, url), contexts, urls))
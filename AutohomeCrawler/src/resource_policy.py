@@ -0,0 +1,109 @@
+# resource_policy.py
+
+import json
+import threading
+
+
+# Network.setBlockedURLs 只能按 URL 匹配，资源类型按扩展名展开
+RESOURCE_TYPE_EXTENSIONS = {
+    'image': ('jpg', 'jpeg', 'png', 'gif', 'webp', 'svg', 'ico', 'bmp', 'avif'),
+    'font': ('woff', 'woff2', 'ttf', 'otf', 'eot'),
+    'media': ('mp4', 'm3u8', 'flv', 'webm', 'mp3', 'm4a'),
+    'stylesheet': ('css',),
+}
+
+# 与抽取无关的常见广告和统计服务
+TRACKER_PATTERNS = [
+    '*hm.baidu.com*',
+    '*cnzz.com*',
+    '*google-analytics.com*',
+    '*googletagmanager.com*',
+    '*googlesyndication.com*',
+    '*doubleclick.net*',
+]
+
+
+def blocked_url_patterns(resource_types=(), url_patterns=()):
+    """把资源类型和 URL 规则合并成 setBlockedURLs 用的通配符列表"""
+    patterns = []
+    for resource_type in resource_types:
+        for extension in RESOURCE_TYPE_EXTENSIONS.get(resource_type, ()):
+            # 带查询参数和不带查询参数的都要匹配
+            patterns.append(f'*.{extension}')
+            patterns.append(f'*.{extension}?*')
+    patterns.extend(url_patterns)
+    return list(dict.fromkeys(patterns))
+
+
+def enable_resource_log(options):
+    """打开 Chrome 的 performance 日志，ResourceStats 从中统计每个页面的请求"""
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    resource_stats.enabled = True
+
+
+def apply_resource_policy(driver, resource_types=(), url_patterns=()):
+    """通过 DevTools 协议拦截不需要的请求，对这个浏览器之后的所有页面生效"""
+    patterns = blocked_url_patterns(resource_types, url_patterns)
+    if not patterns:
+        return
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+        print(f"已设置资源拦截规则 {len(patterns)} 条。")
+    except Exception as e:
+        print(f"设置资源拦截失败: {e}")
+
+
+class ResourceStats:
+    """从 performance 日志统计每个页面被拦截的请求数、实际加载的请求数和传输字节数
+
+    日志每读一次就清空，所以每次 collect 得到的是上次 collect 之后的请求。
+    多个 worker 共用一个实例，累计值加锁更新。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.pages = 0
+        self.blocked = 0
+        self.loaded = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def collect(self, driver, url=''):
+        """读取并清空 driver 的 performance 日志，返回 (拦截数, 加载数, 字节数)"""
+        if not self.enabled:
+            return None
+        try:
+            entries = driver.get_log('performance')
+        except Exception as e:
+            print(f"读取 performance 日志失败: {e}")
+            return None
+
+        blocked = loaded = size = 0
+        for entry in entries:
+            message = json.loads(entry['message'])['message']
+            method = message.get('method')
+            if method == 'Network.loadingFailed' and message['params'].get('blockedReason'):
+                blocked += 1
+            elif method == 'Network.loadingFinished':
+                loaded += 1
+                size += message['params'].get('encodedDataLength', 0)
+
+        with self._lock:
+            self.pages += 1
+            self.blocked += blocked
+            self.loaded += loaded
+            self.bytes += size
+        print(f"资源: 拦截 {blocked} 个请求，加载 {loaded} 个请求共 {size / 1024:.0f} KB {url}")
+        return blocked, loaded, size
+
+    def summary(self):
+        if not self.pages:
+            return
+        print(f"资源统计: {self.pages} 个页面，拦截 {self.blocked} 个请求，"
+              f"加载 {self.loaded} 个请求共 {self.bytes / 1024 / 1024:.1f} MB，"
+              f"平均每页 {self.bytes / self.pages / 1024:.0f} KB")
+
+
+# 同一进程中的所有浏览器共用
+resource_stats = ResourceStats()
@@ -4,27 +4,37 @@ import time
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
 
 # Use absolute import for utils and settings
-# from .utils import to_timestamp, scroll_to_bottom, save_error_page # Import necessary utils functions
-# from ..config.settings import BASE_URL, WAIT_TIME, SCROLL_WAIT_TIME # Import necessary settings
-from src.utils import to_timestamp, scroll_to_bottom, save_error_page # Import necessary utils functions
-from config.settings import BASE_URL, WAIT_TIME, SCROLL_WAIT_TIME # Import necessary settings
+# from .utils import scroll_to_bottom, save_error_page # Import necessary utils functions
+from src.utils import scroll_to_bottom, save_error_page # Import necessary utils functions
+from src.time_parser import TimeParser
+from src.resource_policy import resource_stats
+from src.page_cache import page_cache
+from src.metrics import metrics
+from src.html_parser import parse_html
+from src.reply_pages import reply_page_urls
+from config.settings import BASE_URL, WAIT_TIME, SCROLL_QUIET_TIME, SCROLL_MAX_WAIT, HTML_PARSER, MAX_REPLY_PAGES # Import necessary settings
 
 
 def get_post_detail_links(driver, url, page_num, time_out=WAIT_TIME):
     """抓取单页的帖子详情链接"""
     links = []
     try:
-        driver.get(url)
+        with metrics.timer('navigate'):
+            driver.get(url)
         wait = WebDriverWait(driver, time_out)
         print(f"正在抓取页面链接: {url}")
         
         # 等待页面基本元素加载完成
-        wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+        with metrics.timer('wait'):
+            wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
         
-        scroll_to_bottom(driver, wait_time=SCROLL_WAIT_TIME)
+        # The list is paginated, stop as soon as the post list has rendered
+        with metrics.timer('scroll'):
+            scroll_to_bottom(driver, SCROLL_QUIET_TIME, SCROLL_MAX_WAIT, selectors=["ul.post-list li"])
+        resource_stats.collect(driver, url)
+        metrics.inc('pages')
         
         max_retries = 3
         retries = 0
@@ -61,102 +71,194 @@ def get_post_detail_links(driver, url, page_num, time_out=WAIT_TIME):
                 print(f"获取页面 {url} 链接失败 (重试 {retries + 1}/{max_retries}):\n{e}")
                 retries += 1
                 time.sleep(random.uniform(1, 3)) # Wait before retry
-                scroll_to_bottom(driver, SCROLL_WAIT_TIME)  # Retry by scrolling again
+                scroll_to_bottom(driver, SCROLL_QUIET_TIME, SCROLL_MAX_WAIT)  # Retry by scrolling again
         else:
             print(f"尝试 {max_retries} 次后仍无法获取页面 {url} 的链接。")
-            save_error_page(driver, url)
+            metrics.inc('errors')
+            save_error_page(driver, url, f"重试 {max_retries} 次后仍未找到帖子列表")
             
     except Exception as e:
         print(f'获取页面 {url} 链接失败:\n{e}')
+        metrics.inc('errors')
         if driver:
-            save_error_page(driver, url)
+            save_error_page(driver, url, str(e))
 
     finally:
         return links
 
 
-def get_post_detail(driver, url, time_out=WAIT_TIME):
-    """抓取单个帖子详情（包括回复）"""
-    post_detail = None
-    try:
+def parse_replies(soup, times):
+    """从解析好的页面中抽取回复列表"""
+    # Use more specific selectors if necessary, based on your observation of AutoHome HTML
+    # The original script used: .reply-detail and .reply-static-text.fn-fl:not(.fn-hide)
+    reply_elements = soup.select('.reply-detail')
+    reply_time_elements = soup.select('.reply-static-text.fn-fl:not(.fn-hide)')
+
+    replies = []
+    # Ensure both lists have the same length before zipping to avoid errors
+    min_replies_count = min(len(reply_elements), len(reply_time_elements))
+
+    for i in range(min_replies_count):
+         reply_elem = reply_elements[i]
+         reply_time_elem = reply_time_elements[i]
+
+         reply_content = reply_elem.text.strip()
+         reply_time_str = reply_time_elem.text.strip()
+         reply_time = times.parse(reply_time_str)
+         
+         if reply_content:
+             replies.append({
+                 "content": reply_content,
+                 "timestamp": reply_time
+             })
+    return replies
+
+
+def parse_reply_page(html, backend=HTML_PARSER):
+    """从帖子第二页及之后的页面源码中解析回复"""
+    times = TimeParser()
+    replies = parse_replies(parse_html(html, backend), times)
+    metrics.observe('time_parse', times.seconds)
+    return replies
+
+
+def parse_post_detail(html, url, backend=HTML_PARSER):
+    """从帖子页面源码中解析帖子详情（包括回复），无有效内容时返回 None"""
+    soup = parse_html(html, backend)
+    # Relative times on one page share a reference time, repeated strings are parsed once
+    times = TimeParser()
+
+    # Extract post details
+    username_element = soup.select_one(".user-name")
+    timestamp_element = soup.select_one(".post-handle-publish")
+    title_element = soup.select_one(".post-title")
+    content_elements = soup.select(".tz-paragraph")
+    
+    username = username_element.text.strip() if username_element else '无用户名'
+    
+    timestamp_str = timestamp_element.text.strip() if timestamp_element else '无时间戳'
+    timestamp = times.parse(timestamp_str)
+
+    title = title_element.text.strip() if title_element else '无标题'
+    content = '\n'.join([elem.text.strip() for elem in content_elements]) if content_elements else '无内容'
+    
+    # Combine title and content if needed, based on original script's approach
+    full_content = f"{title}\n{content}" if title and content != '无内容' else content if content != '无内容' else title
+    if full_content == '无内容' and title == '无标题':
+         full_content = '无内容或标题'
+    elif full_content == '无内容' and title != '无标题':
+         full_content = title
+
+
+    if not full_content or full_content == '无内容或标题':
+        print(f"帖子 {url} 未抓取到有效内容，跳过。")
+        metrics.observe('time_parse', times.seconds)
+        return None # Skip if no content
+
+    post_detail = {
+        'url': url,
+        "timestamp": timestamp,
+        "username": username,
+        "content": full_content,
+        "replies": []
+    }
+
+    post_detail['replies'] = parse_replies(soup, times)
+    metrics.observe('time_parse', times.seconds)
+    return post_detail
+
+
+def _load_page(driver, url, time_out=WAIT_TIME):
+    """用浏览器打开页面并滚动到底部，返回页面源码"""
+    with metrics.timer('navigate'):
         driver.get(url)
-        wait = WebDriverWait(driver, time_out)
-        print(f"正在抓取帖子详情: {url}")
-        
-        # 等待页面基本元素加载完成
+    wait = WebDriverWait(driver, time_out)
+
+    # 等待页面基本元素加载完成
+    with metrics.timer('wait'):
         wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-        
-        scroll_to_bottom(driver, wait_time=SCROLL_WAIT_TIME) # Scroll to load all content/replies
-        
-        # Use BeautifulSoup for parsing after scrolling
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-
-        # Extract post details
-        username_element = soup.select_one(".user-name")
-        timestamp_element = soup.select_one(".post-handle-publish")
-        title_element = soup.select_one(".post-title")
-        content_elements = soup.select(".tz-paragraph")
-        
-        username = username_element.text.strip() if username_element else '无用户名'
-        
-        timestamp_str = timestamp_element.text.strip() if timestamp_element else '无时间戳'
-        timestamp = to_timestamp(timestamp_str)
 
-        title = title_element.text.strip() if title_element else '无标题'
-        content = '\n'.join([elem.text.strip() for elem in content_elements]) if content_elements else '无内容'
-        
-        # Combine title and content if needed, based on original script's approach
-        full_content = f"{title}\n{content}" if title and content != '无内容' else content if content != '无内容' else title
-        if full_content == '无内容' and title == '无标题':
-             full_content = '无内容或标题'
-        elif full_content == '无内容' and title != '无标题':
-             full_content = title
-
-
-        if not full_content or full_content == '无内容或标题':
-            print(f"帖子 {url} 未抓取到有效内容，跳过。")
-            # save_error_page(driver, url) # Optionally save page if content is missing
-            return None # Skip if no content
-
-        post_detail = {
-            'url': url,
-            "timestamp": timestamp,
-            "username": username,
-            "content": full_content,
-            "replies": []
-        }
-
-        # Extract replies
-        # Use more specific selectors if necessary, based on your observation of AutoHome HTML
-        # The original script used: .reply-detail and .reply-static-text.fn-fl:not(.fn-hide)
-        reply_elements = soup.select('.reply-detail')
-        reply_time_elements = soup.select('.reply-static-text.fn-fl:not(.fn-hide)')
-
-        replies = []
-        # Ensure both lists have the same length before zipping to avoid errors
-        min_replies_count = min(len(reply_elements), len(reply_time_elements))
-
-        for i in range(min_replies_count):
-             reply_elem = reply_elements[i]
-             reply_time_elem = reply_time_elements[i]
-
-             reply_content = reply_elem.text.strip()
-             reply_time_str = reply_time_elem.text.strip()
-             reply_time = to_timestamp(reply_time_str)
-             
-             if reply_content:
-                 replies.append({
-                     "content": reply_content,
-                     "timestamp": reply_time
-                 })
-
-        post_detail['replies'] = replies
-        print(f"帖子 {url} 抓取到 {len(replies)} 条回复。")
+    with metrics.timer('scroll'):
+        scroll_to_bottom(driver, SCROLL_QUIET_TIME, SCROLL_MAX_WAIT) # Scroll to load all content/replies
+    resource_stats.collect(driver, url)
+
+    with metrics.timer('page_source'):
+        html = driver.page_source
+    metrics.inc('pages')
+    metrics.inc('bytes', len(html.encode('utf-8')))
+    page_cache.put(url, html)
+    return html
+
+
+def get_more_replies(driver, url, html, reply_fetcher=None, time_out=WAIT_TIME):
+    """抓取帖子第一页之后各页的回复，按页码顺序返回
+
+    各页先由 reply_fetcher 通过 HTTP 并发抓取；请求失败（包括被重定向到帖子以外的页面）的页再用浏览器逐页打开，
+    抓到了但没有回复的页按空页处理。重放模式下只从页面缓存读取。
+    """
+    page_urls = reply_page_urls(html, url, MAX_REPLY_PAGES)
+    if not page_urls:
+        return []
+    if page_cache.replaying:
+        pages = [page_cache.get(page_url) for page_url in page_urls]
+    elif reply_fetcher:
+        pages = reply_fetcher.fetch(page_urls)
+    else:
+        pages = [None] * len(page_urls)
+
+    replies = []
+    for page_url, page_html in zip(page_urls, pages):
+        page_replies = []
+        if page_html is not None:
+            with metrics.timer('parse'):
+                page_replies = parse_reply_page(page_html)
+        elif driver is not None and not page_cache.replaying:
+            try:
+                if reply_fetcher and reply_fetcher.rate_limiter:
+                    reply_fetcher.rate_limiter.wait()
+                page_html = _load_page(driver, page_url, time_out)
+                with metrics.timer('parse'):
+                    page_replies = parse_reply_page(page_html)
+            except Exception as e:
+                print(f'抓取回复页失败 {page_url}:\n{e}')
+                metrics.inc('errors')
+                save_error_page(driver, page_url, str(e))
+        replies.extend(page_replies)
+    return replies
+
+
+def get_post_detail(driver, url, time_out=WAIT_TIME, reply_fetcher=None):
+    """抓取单个帖子详情（包括各页回复），重放模式下从页面缓存读取，不使用 driver
+
+    Args:
+        reply_fetcher (ReplyPageFetcher, optional): 用于并发抓取第二页及之后的回复页，为 None 时用浏览器逐页抓取
+    """
+    if page_cache.replaying:
+        html = page_cache.get(url)
+        if html is None:
+            return None
+        post_detail = parse_post_detail(html, url)
+        if post_detail:
+            post_detail['replies'].extend(get_more_replies(None, url, html))
+        return post_detail
+
+    post_detail = None
+    try:
+        print(f"正在抓取帖子详情: {url}")
+        html = _load_page(driver, url, time_out)
+        with metrics.timer('parse'):
+            post_detail = parse_post_detail(html, url)
+        if post_detail:
+            post_detail['replies'].extend(get_more_replies(driver, url, html, reply_fetcher, time_out))
+            metrics.inc('posts')
+            metrics.inc('replies', len(post_detail['replies']))
+            print(f"帖子 {url} 抓取到 {len(post_detail['replies'])} 条回复。")
 
     except Exception as e:
         print(f'抓取帖子详情失败 {url}:\n{e}')
-        save_error_page(driver, url) # Save page on error
+        metrics.inc('errors')
+        save_error_page(driver, url, str(e)) # Hands the page to the background writer
         return None
 
     finally:
-        return post_detail 
\ No newline at end of file
+        return post_detail
@@ -0,0 +1,360 @@
+# sqlite_store.py
+
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from src.storage import PostStore, JsonlPostStore, read_legacy_json
+from src.progress import ProgressStore, ProgressSet, ITEMS
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,  -- 帖子链接；没有 id 的帖子为 NULL，SQLite 中多个 NULL 主键互不冲突
+    grp TEXT,
+    timestamp INTEGER,
+    data TEXT NOT NULL    -- 除 replies 以外的字段
+);
+CREATE INDEX IF NOT EXISTS posts_grp ON posts (grp);
+CREATE INDEX IF NOT EXISTS posts_timestamp ON posts (timestamp);
+
+CREATE TABLE IF NOT EXISTS replies (
+    post_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    timestamp INTEGER,
+    data TEXT NOT NULL,
+    PRIMARY KEY (post_id, idx)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS replies_timestamp ON replies (timestamp);
+
+CREATE TABLE IF NOT EXISTS links (
+    grp TEXT NOT NULL,
+    url TEXT NOT NULL,
+    PRIMARY KEY (grp, url)
+);
+CREATE INDEX IF NOT EXISTS links_url ON links (url);
+
+-- scope 是原来的进度文件名，同一个数据库中保存进度、链接索引和增量标记
+CREATE TABLE IF NOT EXISTS progress (
+    scope TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (scope, name, value)
+);
+CREATE TABLE IF NOT EXISTS fields (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (scope, key)
+);
+
+-- 已经从旧的 JSON/JSONL 文件导入过的数据
+CREATE TABLE IF NOT EXISTS imports (
+    name TEXT PRIMARY KEY
+);
+"""
+
+# 帖子和回复的时间字段：Autohome/Dongchedi 用 timestamp，flyert 的回复用 comment_time
+_TIME_FIELDS = ('timestamp', 'comment_time')
+
+
+def _timestamp(record):
+    for field in _TIME_FIELDS:
+        value = record.get(field)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+class SqliteDatabase:
+    """WAL 模式的 SQLite 数据库，帖子、回复、链接和进度都保存在同一个文件中
+
+    写操作先在内存中排队，攒够 batch_size 条或距第一条超过 max_delay 秒时在一个
+    BEGIN IMMEDIATE 事务中一起执行，写锁只在提交时持有，多个爬虫进程可以同时写同一个文件。
+    同一进程中的帖子和进度共用一个队列，按调用顺序在同一个事务中提交，崩溃时不会出现
+    进度已记录而帖子没保存的情况。
+
+    Args:
+        path (str): 数据库文件
+        batch_size (int): 每个事务最多包含的写操作数
+        max_delay (float): 写操作在队列中最多等待的秒数
+    """
+
+    def __init__(self, path, batch_size=100, max_delay=2.0):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        # 事务由 flush 显式开始和提交；busy timeout 内等待其他进程释放写锁
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        # 抓取线程和写入线程可能同时使用
+        self.lock = threading.RLock()
+        self._queue = []
+        self._queued_at = None
+        self._listeners = []
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def write(self, sql, params=(), many=False):
+        """把写操作加入队列，满足条件时提交"""
+        with self.lock:
+            self._queue.append((sql, params, many))
+            if self._queued_at is None:
+                self._queued_at = time.monotonic()
+            if len(self._queue) >= self.batch_size or time.monotonic() - self._queued_at >= self.max_delay:
+                self.flush()
+
+    def on_flush(self, callback):
+        """注册提交之后的回调，用于清空各存储在内存中的未提交修改"""
+        self._listeners.append(callback)
+
+    def flush(self):
+        """在一个事务中执行队列中的全部写操作"""
+        with self.lock:
+            if not self._queue:
+                return
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                for sql, params, many in self._queue:
+                    if many:
+                        self.connection.executemany(sql, params)
+                    else:
+                        self.connection.execute(sql, params)
+                self.connection.execute('COMMIT')
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self._queue = []
+            self._queued_at = None
+            for callback in self._listeners:
+                callback()
+
+    def imported(self, name):
+        return bool(self.query('SELECT 1 FROM imports WHERE name = ?', (name,)))
+
+    def mark_imported(self, name):
+        self.write('INSERT OR IGNORE INTO imports (name) VALUES (?)', (name,))
+
+    def load_links(self, seed=None):
+        """读取 {分组: [链接, ...]}，seed() 返回的旧链接文件内容只在第一次时导入"""
+        if seed is not None and not self.imported('links'):
+            self.save_links(seed() or {})
+            self.mark_imported('links')
+            self.flush()
+        links = {}
+        for group, url in self.query('SELECT grp, url FROM links ORDER BY rowid'):
+            links.setdefault(group, []).append(url)
+        return links
+
+    def save_links(self, links):
+        """导入整个 {分组: [链接, ...]}，只在第一次使用时从旧的链接文件导入"""
+        rows = [(group, url) for group, urls in links.items() if isinstance(urls, list) for url in urls if url]
+        self.write('INSERT OR IGNORE INTO links (grp, url) VALUES (?, ?)', rows, many=True)
+        self.flush()
+
+    def add_links(self, group, urls):
+        """在一次批量插入中追加一个分组新发现的链接（LinkIndex.ingest 返回的链接）"""
+        rows = [(group, url) for url in urls if url]
+        if rows:
+            self.write('INSERT OR IGNORE INTO links (grp, url) VALUES (?, ?)', rows, many=True)
+            self.flush()
+
+    def close(self):
+        with self.lock:
+            if self.connection is None:
+                return
+            self.flush()
+            self.connection.close()
+            self.connection = None
+            _databases.pop(os.path.abspath(self.path), None)
+
+
+_databases = {}
+
+
+def open_database(path, batch_size=100):
+    """返回 path 对应的数据库，同一进程中共用一个连接，退出时自动提交并关闭"""
+    key = os.path.abspath(path)
+    if key not in _databases:
+        _databases[key] = SqliteDatabase(path, batch_size)
+        atexit.register(_databases[key].close)
+    return _databases[key]
+
+
+class SqlitePostStore(PostStore):
+    """保存在 SQLite 中的帖子，按 id upsert，回复拆到 replies 表中"""
+
+    def __init__(self, db, id_field='url'):
+        self.db = db
+        self.id_field = id_field
+
+    def load(self):
+        self.db.flush()
+        replies = {}
+        for post_id, data in self.db.query('SELECT post_id, data FROM replies ORDER BY post_id, idx'):
+            replies.setdefault(post_id, []).append(json.loads(data))
+        posts = {}
+        for post_id, group, data in self.db.query('SELECT id, grp, data FROM posts ORDER BY rowid'):
+            post = json.loads(data)
+            if post_id is not None:
+                post['replies'] = replies.get(post_id, [])
+            posts.setdefault(group, []).append(post)
+        return posts
+
+    def append(self, group, post):
+        post_id = post.get(self.id_field)
+        # 没有 id 的帖子无法关联回复，整个帖子保存在 data 中
+        data = {key: value for key, value in post.items() if key != 'replies'} if post_id is not None else post
+        self.db.write(
+            'INSERT INTO posts (id, grp, timestamp, data) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (id) DO UPDATE SET grp = excluded.grp, timestamp = excluded.timestamp, data = excluded.data',
+            (post_id, group, _timestamp(post), json.dumps(data, ensure_ascii=False))
+        )
+        if post_id is not None:
+            self.db.write('DELETE FROM replies WHERE post_id = ?', (post_id,))
+            rows = [(post_id, i, _timestamp(reply), json.dumps(reply, ensure_ascii=False))
+                    for i, reply in enumerate(post.get('replies') or [])]
+            if rows:
+                self.db.write('INSERT INTO replies (post_id, idx, timestamp, data) VALUES (?, ?, ?, ?)', rows, many=True)
+
+    def flush(self):
+        self.db.flush()
+
+    def import_legacy(self, json_file, jsonl_file, group_field=None):
+        """第一次使用时导入旧的 JSONL 日志（不存在时导入 JSON 文件）"""
+        if self.db.imported('posts'):
+            return
+        if os.path.exists(jsonl_file):
+            posts = JsonlPostStore(jsonl_file, id_field=self.id_field).load()
+        else:
+            posts = read_legacy_json(json_file, group_field)
+        count = 0
+        for group, group_posts in posts.items():
+            for post in group_posts:
+                self.append(group, post)
+                count += 1
+        self.db.mark_imported('posts')
+        self.db.flush()
+        if count:
+            print(f"已将 {count} 个帖子导入 {self.db.path}")
+
+
+class SqliteProgressStore:
+    """接口与 ProgressStore 相同、保存在 SQLite 中的进度
+
+    查找是主键上的索引查询，不需要把整个进度读进内存；本进程还未提交的修改记在内存中，提交后清空。
+
+    Args:
+        scope (str): 区分同一数据库中不同进度的名称（原来的进度文件名）
+        import_file (str, optional): 第一次使用时从这个进度文件（及其日志）导入
+    """
+
+    def __init__(self, db, scope, sets=(ITEMS,), fields=None, import_file=None):
+        self.db = db
+        self.scope = scope
+        self.set_names = tuple(sets)
+        self.list_layout = self.set_names == (ITEMS,)
+        self.defaults = dict(fields or {})
+        self._members = {}  # (name, value) -> 是否在集合中
+        self._fields = {}
+        db.on_flush(self._clear_pending)
+        if import_file and not db.imported('progress:' + scope):
+            self._import(ProgressStore(import_file, sets=self.set_names, fields=fields))
+
+    def _clear_pending(self):
+        self._members.clear()
+        self._fields.clear()
+
+    def _import(self, legacy):
+        for name, values in legacy.sets.items():
+            self.db.write('INSERT OR IGNORE INTO progress (scope, name, value) VALUES (?, ?, ?)',
+                          [(self.scope, name, value) for value in values], many=True)
+        for key, value in legacy.fields.items():
+            self.set(key, value)
+        self.db.mark_imported('progress:' + self.scope)
+        self.db.flush()
+
+    def contains(self, name, value):
+        with self.db.lock:
+            member = self._members.get((name, value))
+            if member is not None:
+                return member
+            return bool(self.db.query(
+                'SELECT 1 FROM progress WHERE scope = ? AND name = ? AND value = ?', (self.scope, name, value)))
+
+    def add(self, name, value):
+        """加入集合，返回是否为新元素"""
+        with self.db.lock:
+            if self.contains(name, value):
+                return False
+            self._members[(name, value)] = True
+            self.db.write('INSERT OR IGNORE INTO progress (scope, name, value) VALUES (?, ?, ?)', (self.scope, name, value))
+            return True
+
+    def discard(self, name, value):
+        with self.db.lock:
+            if self.contains(name, value):
+                self._members[(name, value)] = False
+                self.db.write('DELETE FROM progress WHERE scope = ? AND name = ? AND value = ?', (self.scope, name, value))
+
+    def get(self, key, default=None):
+        with self.db.lock:
+            if key in self._fields:
+                return self._fields[key]
+            rows = self.db.query('SELECT value FROM fields WHERE scope = ? AND key = ?', (self.scope, key))
+        if rows:
+            return json.loads(rows[0][0])
+        return self.defaults.get(key, default)
+
+    def set(self, key, value):
+        with self.db.lock:
+            if self.get(key) == value:
+                return
+            self._fields[key] = value
+            self.db.write(
+                'INSERT INTO fields (scope, key, value) VALUES (?, ?, ?) '
+                'ON CONFLICT (scope, key) DO UPDATE SET value = excluded.value',
+                (self.scope, key, json.dumps(value, ensure_ascii=False))
+            )
+
+    def view(self, name=ITEMS):
+        return ProgressSet(self, name)
+
+    def size(self, name):
+        self.db.flush()
+        return self.db.query('SELECT COUNT(*) FROM progress WHERE scope = ? AND name = ?', (self.scope, name))[0][0]
+
+    def values(self, name):
+        self.db.flush()
+        return [row[0] for row in self.db.query(
+            'SELECT value FROM progress WHERE scope = ? AND name = ? ORDER BY rowid', (self.scope, name))]
+
+    def to_data(self):
+        if self.list_layout:
+            return self.values(ITEMS)
+        self.db.flush()
+        data = dict(self.defaults)
+        for key, value in self.db.query('SELECT key, value FROM fields WHERE scope = ?', (self.scope,)):
+            data[key] = json.loads(value)
+        for name in self.set_names:
+            data[name] = self.values(name)
+        return data
+
+    def snapshot(self):
+        self.db.flush()
+
+    def flush(self):
+        self.db.flush()
+
+    def close(self):
+        self.db.flush()
@@ -0,0 +1,249 @@
+# storage.py
+
+import json
+import os
+
+
+class PostStore:
+    """帖子存储的基类
+
+    数据在内存中的形式与旧的 JSON 文件一致：{分组名: [帖子, ...]}，
+    分组是社区（Autohome/Dongchedi）或酒店（flyert）。
+    """
+
+    def load(self):
+        """读取全部帖子，返回 {分组名: [帖子, ...]}"""
+        raise NotImplementedError
+
+    def append(self, group, post):
+        """保存一个新的或已更新的帖子（以 id 字段判断是否为同一帖子）"""
+        raise NotImplementedError
+
+    def flush(self):
+        """把缓冲的数据写到磁盘，爬虫在每个检查点调用"""
+
+    def close(self):
+        self.flush()
+
+
+class JsonPostStore(PostStore):
+    """旧的存储方式：每次 flush 都重写整个 JSON 文件"""
+
+    def __init__(self, file_path, id_field='url', group_field=None):
+        self.file_path = file_path
+        self.id_field = id_field
+        self.group_field = group_field
+        self.posts = {}
+
+    def load(self):
+        self.posts = read_legacy_json(self.file_path, self.group_field)
+        return self.posts
+
+    def append(self, group, post):
+        posts = self.posts.setdefault(group, [])
+        post_id = post.get(self.id_field)
+        for i, existing in enumerate(posts):
+            if post_id is not None and existing.get(self.id_field) == post_id:
+                posts[i] = post
+                break
+        else:
+            posts.append(post)
+
+    def flush(self):
+        write_legacy_json(self.posts, self.file_path, self.group_field)
+
+
+class JsonlPostStore(PostStore):
+    """追加写的 JSONL 存储
+
+    每保存一个帖子就在日志末尾追加一行 {"group": ..., "post": ...}，
+    同一个 id 的帖子以最后一行为准。当被覆盖的旧行过多时自动压缩日志，
+    所以每次保存的开销是常数，与已有数据量无关。
+    """
+
+    def __init__(self, file_path, id_field='url', compact_min_lines=1000, compact_ratio=2.0):
+        self.file_path = file_path
+        self.id_field = id_field
+        self.compact_min_lines = compact_min_lines
+        self.compact_ratio = compact_ratio
+        self._file = None
+        self._ids = set()
+        self._anonymous = 0  # 没有 id 的记录，永远不会被覆盖
+        self._lines = 0
+
+    def _live_count(self):
+        return len(self._ids) + self._anonymous
+
+    def load(self):
+        posts = {}
+        index = {}  # post_id -> (group, position)
+        self._ids = set()
+        self._anonymous = 0
+        self._lines = 0
+
+        for group, post in iter_jsonl_records(self.file_path):
+            self._lines += 1
+            post_id = post.get(self.id_field)
+            if post_id is None:
+                posts.setdefault(group, []).append(post)
+                self._anonymous += 1
+                continue
+            if post_id in index:
+                old_group, position = index[post_id]
+                if old_group == group:
+                    posts[group][position] = post
+                    continue
+                # 帖子换了分组：旧位置留空，稍后过滤
+                posts[old_group][position] = None
+            group_posts = posts.setdefault(group, [])
+            index[post_id] = (group, len(group_posts))
+            group_posts.append(post)
+            self._ids.add(post_id)
+
+        return {group: [p for p in group_posts if p is not None] for group, group_posts in posts.items()}
+
+    def _open(self):
+        if self._file is None:
+            folder = os.path.dirname(self.file_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._file = open(self.file_path, 'a', encoding='utf-8')
+        return self._file
+
+    def append(self, group, post):
+        f = self._open()
+        f.write(json.dumps({'group': group, 'post': post}, ensure_ascii=False) + '\n')
+        f.flush()
+        self._lines += 1
+        post_id = post.get(self.id_field)
+        if post_id is None:
+            self._anonymous += 1
+        else:
+            self._ids.add(post_id)
+        if self._lines > max(self.compact_min_lines, self.compact_ratio * self._live_count()):
+            self.compact()
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def compact(self):
+        """重写日志，每个帖子只保留最新的一行"""
+        self.close()
+        posts = self.load()
+        tmp_path = self.file_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for group, group_posts in posts.items():
+                for post in group_posts:
+                    f.write(json.dumps({'group': group, 'post': post}, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.file_path)
+        self._lines = self._live_count()
+        print(f"已压缩 {self.file_path}，保留 {self._lines} 条记录。")
+
+
+def iter_jsonl_records(file_path):
+    """逐行读取 JSONL 日志，跳过写了一半的坏行"""
+    if not os.path.exists(file_path):
+        return
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line_num, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"跳过损坏的记录: {file_path} 第 {line_num} 行")
+                continue
+            yield record.get('group'), record.get('post') or {}
+
+
+def read_legacy_json(file_path, group_field=None):
+    """读取旧的 JSON 数据文件，统一转换为 {分组名: [帖子, ...]}
+
+    group_field 为 None 时文件格式是 {分组名: [帖子, ...]}；
+    否则是 [{group_field: 分组名, 'posts': [帖子, ...]}, ...]（flyert 的格式）。
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+    if group_field is None:
+        if not isinstance(data, dict):
+            return {}
+        return {group: posts for group, posts in data.items() if isinstance(posts, list)}
+
+    posts = {}
+    if isinstance(data, list):
+        for item in data:
+            posts.setdefault(item.get(group_field), []).extend(item.get('posts', []))
+    return posts
+
+
+def write_legacy_json(posts, file_path, group_field=None):
+    """按旧的 JSON 格式写出全部帖子"""
+    if group_field is None:
+        data = posts
+    else:
+        data = [{group_field: group, 'posts': group_posts} for group, group_posts in posts.items()]
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+
+
+def convert_json_to_jsonl(json_file, jsonl_file, group_field=None):
+    """一次性把旧的 JSON 数据文件转换为 JSONL 日志，返回转换的帖子数"""
+    posts = read_legacy_json(json_file, group_field)
+    count = 0
+    tmp_path = jsonl_file + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for group, group_posts in posts.items():
+            for post in group_posts:
+                f.write(json.dumps({'group': group, 'post': post}, ensure_ascii=False) + '\n')
+                count += 1
+    os.replace(tmp_path, jsonl_file)
+    print(f"已将 {json_file} 中的 {count} 个帖子转换到 {jsonl_file}")
+    return count
+
+
+def open_post_store(backend, json_file, jsonl_file, id_field='url', group_field=None, db=None, shards=None):
+    """根据配置创建帖子存储
+
+    使用 jsonl 时，如果日志还不存在而旧的 JSON 文件存在，会先自动转换一次；
+    使用 sqlite 时帖子保存在 db（见 sqlite_store.py）中，第一次使用时导入已有的 JSONL 日志或 JSON 文件；
+    使用 shards 时写压缩的 JSONL 分片（见 shards.py），shards 是 ShardedPostStore 的参数，同样在第一次使用时导入已有数据。
+    """
+    if backend == 'json':
+        return JsonPostStore(json_file, id_field=id_field, group_field=group_field)
+    if backend == 'jsonl':
+        if not os.path.exists(jsonl_file) and os.path.exists(json_file):
+            convert_json_to_jsonl(json_file, jsonl_file, group_field)
+        return JsonlPostStore(jsonl_file, id_field=id_field)
+    if backend == 'sqlite':
+        from src.sqlite_store import SqlitePostStore
+        store = SqlitePostStore(db, id_field=id_field)
+        store.import_legacy(json_file, jsonl_file, group_field)
+        return store
+    if backend == 'shards':
+        from src.shards import ShardedPostStore
+        store = ShardedPostStore(id_field=id_field, **shards)
+        store.import_legacy(json_file, jsonl_file, group_field)
+        return store
+    raise ValueError(f"未知的存储方式: {backend}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="把旧的 JSON 帖子文件转换为 JSONL 日志")
+    parser.add_argument('json_file')
+    parser.add_argument('jsonl_file')
+    parser.add_argument('--group-field', default=None, help="flyert 格式的分组字段，例如 hotel")
+    args = parser.parse_args()
+    convert_json_to_jsonl(args.json_file, args.jsonl_file, args.group_field)
@@ -3,10 +3,8 @@ import os
 import pickle
 import time
 import random
-from datetime import datetime, timedelta
-import re
 
-from bs4 import BeautifulSoup
+from src.error_capture import error_pages
 
 # File read/write functions
 def read_json(file_path):
@@ -34,34 +32,6 @@ def write_json(data, file_path):
     except IOError as e:
         print(f"写入文件时出错: {e}")
 
-# Time parsing function
-def to_timestamp(time_str):
-    """将汽车之家的各种时间字符串转换为时间戳"""
-    # 匹配 "x小时前"，不限定位置，取最后一个匹配项
-    hour_matches = list(re.finditer(r'(\d+)小时前', time_str))
-    if hour_matches:
-        hours_ago = int(hour_matches[-1].group(1))  # 取最后一个匹配
-        return int((datetime.now() - timedelta(hours=hours_ago)).timestamp())
-
-    # 匹配 "x天前"
-    day_matches = list(re.finditer(r'(\d+)天前', time_str))
-    if day_matches:
-        days_ago = int(day_matches[-1].group(1))
-        return int((datetime.now() - timedelta(days=days_ago)).timestamp())
-
-    # 匹配标准时间格式 yyyy-mm-dd hh:mm:ss（必须出现在字符串结尾）
-    date_match = re.search(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})$', time_str)
-    if date_match:
-        dt_str = date_match.group(1)
-        try:
-            dt = datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S")
-            return int(dt.timestamp())
-        except ValueError:
-            pass  # 如果转换失败，则继续到下一步
-
-    # 都不匹配则返回原字符串或者None，取决于需求。这里返回原字符串以便调试。
-    return time_str
-
 # Cookie handling functions
 def save_cookies(driver, cookies_file):
     """保存cookie到文件"""
@@ -109,49 +79,91 @@ def manual_login(driver, cookies_file, user_profile_url):
     print("程序正在继续运行")
 
 # Scrolling function
-def scroll_to_bottom(driver, wait_time=1):
-    """渐进式滚动到页面底部，模拟真实用户行为"""
-    print("正在滚动页面...")
+# 在页面中滚动到底部，并用 MutationObserver / PerformanceObserver 监听 DOM 变化和网络请求，
+# 页面在 quiet 毫秒内既没有 DOM 变化也没有新请求、高度不再增长，或目标元素都已出现时立即返回
+SCROLL_SCRIPT = """
+const [maxWait, quiet, selectors, done] = arguments;
+const start = performance.now();
+let lastChange = start;
+let lastHeight = -1;
+const touch = () => { lastChange = performance.now(); };
+const mutations = new MutationObserver(touch);
+mutations.observe(document.documentElement, {childList: true, subtree: true});
+let resources = null;
+try {
+    resources = new PerformanceObserver(touch);
+    resources.observe({type: 'resource'});
+} catch (e) {}
+function finish(reason) {
+    mutations.disconnect();
+    if (resources) resources.disconnect();
+    done({elapsed: (performance.now() - start) / 1000, reason: reason});
+}
+function tick() {
+    const now = performance.now();
+    const height = document.body.scrollHeight;
+    if (height !== lastHeight) {
+        lastHeight = height;
+        lastChange = now;
+        window.scrollTo(0, height);
+    }
+    if (selectors.length && selectors.every(s => document.querySelector(s))) return finish('selectors');
+    if (now - lastChange >= quiet) return finish('settled');
+    if (now - start >= maxWait) return finish('timeout');
+    setTimeout(tick, 100);
+}
+tick();
+"""
+
+
+def scroll_to_bottom(driver, quiet_time=0.5, max_wait=10, selectors=None):
+    """滚动到页面底部，懒加载内容稳定后立即返回
+
+    Args:
+        driver: webdriver
+        quiet_time (float): 页面连续这么多秒没有 DOM 变化和网络请求即认为加载完成
+        max_wait (float): 最长等待时间（秒）
+        selectors (list, optional): 目标元素的 CSS 选择器，全部出现后立即返回
+
+    Returns:
+        float: 本页实际用于滚动和等待的秒数
+    """
+    start_time = time.perf_counter()
+    try:
+        driver.set_script_timeout(max_wait + 5)
+        result = driver.execute_async_script(SCROLL_SCRIPT, max_wait * 1000, quiet_time * 1000, list(selectors or []))
+        reason = result.get('reason') if result else 'unknown'
+    except Exception as e:
+        print(f"事件驱动滚动失败，改用逐段滚动: {e}")
+        _scroll_step_by_step(driver, max_wait)
+        reason = 'fallback'
+    elapsed = time.perf_counter() - start_time
+    print(f"滚动完成，用时 {elapsed:.2f} 秒 ({reason})。")
+    return elapsed
+
+
+def _scroll_step_by_step(driver, max_wait):
+    """渐进式滚动到页面底部，模拟真实用户行为（浏览器不支持异步脚本时使用）"""
+    deadline = time.perf_counter() + max_wait
     last_height = driver.execute_script("return document.body.scrollHeight")
     
-    while True:
+    while time.perf_counter() < deadline:
         # 滚动一小段距离
         for i in range(3):
             current_height = last_height // 3 * (i + 1)
             driver.execute_script(f"window.scrollTo(0, {current_height});")
             time.sleep(random.uniform(0.5, 1))
             
-        # 等待页面加载
-        # time.sleep(wait_time) # AutoHome might not need extra wait here based on original code
-        
         new_height = driver.execute_script("return document.body.scrollHeight")
         if new_height == last_height:
             break
         last_height = new_height
-    print("滚动完成。")
+
 
 # Error page saving
-def save_error_page(driver, url):
-    """保存错误页面源码的辅助函数"""
+def save_error_page(driver, url, reason=''):
+    """把出错页面的源码交给后台线程压缩保存（见 error_capture.py），不阻塞抓取"""
     try:
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        url_div = soup.new_tag("div", style="font-weight: bold; margin-bottom: 20px;")
-        url_div.string = f"Page URL: {url}"
-        
-        if soup.body:
-            soup.body.insert(0, url_div)
-        else:
-            soup.append(url_div)
-            
-        # Sanitize filename
-        filename_base = re.sub(r'[^a-zA-Z0-9_\-.]', '', url.rsplit('/', 1)[-1] if url else 'error')
-        output_folder = "error_pages"
-        os.makedirs(output_folder, exist_ok=True)
-        
-        file_path = os.path.join(output_folder, f'page_source_{filename_base}_{int(time.time())}.html')
-        with open(file_path, 'w', encoding='utf-8') as file:
-            file.write(str(soup.prettify())) # Use str() for compatibility with type hints
-        print(f"错误页面已保存到 {file_path}")
-            
+        error_pages.capture(url, driver.page_source, reason)
     except Exception as e:
-        print(f"保存错误页面失败: {e}") 
\ No newline at end of file
+        print(f"获取错误页面源码失败: {e}")
@@ -0,0 +1,72 @@
+# watermark.py
+
+import re
+from urllib.parse import urlsplit
+
+from src.progress import open_progress_store
+
+
+# 帖子链接末尾的数字 id：/ugc/article/<id>、/bbs/thread/<hash>/<id>-<page>.html
+_POST_ID = re.compile(r'/(\d+)(?:-\d+)?(?:\.html)?/?$')
+
+
+def post_id(url):
+    """从帖子链接中取出数字 id，取不到时返回 None"""
+    match = _POST_ID.search(urlsplit(url).path) if url else None
+    return int(match.group(1)) if match else None
+
+
+class HighWaterMarks:
+    """记录每个社区抓到过的最新帖子（id 和时间戳），用于增量抓取
+
+    列表页从新到旧遍历，某一页没有比标记更新的帖子时就可以停止翻页。
+    遍历中见到的最新帖子先记在内存里，commit 时才写入文件，
+    中途出错退出时标记保持不变，下次运行会重新走完这一段。
+
+    文件内容为 {社区: {"id": ..., "timestamp": ..., "page": ...}}，
+    page 是完整遍历模式下已完成的最后一页，用于断点续抓。
+    """
+
+    def __init__(self, marks_file, db=None):
+        self.store = open_progress_store(marks_file, sets=(), db=db)
+        self._pending = {}
+
+    def get(self, community):
+        return self.store.get(community) or {}
+
+    def is_new(self, community, url=None, timestamp=None):
+        """帖子是否比社区的标记更新；没有标记或无法比较时视为新帖子"""
+        mark = self.get(community)
+        pid = post_id(url)
+        if pid is not None and mark.get('id') is not None:
+            return pid > mark['id']
+        if isinstance(timestamp, int) and mark.get('timestamp') is not None:
+            return timestamp > mark['timestamp']
+        return True
+
+    def observe(self, community, url=None, timestamp=None):
+        """记下遍历中见到的帖子，commit 之前不会写入文件"""
+        pending = self._pending.setdefault(community, {})
+        pid = post_id(url)
+        if pid is not None:
+            pending['id'] = max(pid, pending.get('id', pid))
+        if isinstance(timestamp, int):
+            pending['timestamp'] = max(timestamp, pending.get('timestamp', timestamp))
+
+    def commit(self, community):
+        """社区遍历完成后把见到的最新帖子写入标记"""
+        pending = self._pending.pop(community, {})
+        mark = dict(self.get(community))
+        for key, value in pending.items():
+            if mark.get(key) is None or value > mark[key]:
+                mark[key] = value
+        self.store.set(community, mark)
+
+    def record_page(self, community, page):
+        """记录完整遍历模式下已完成的最后一页"""
+        mark = dict(self.get(community))
+        mark['page'] = page
+        self.store.set(community, mark)
+
+    def close(self):
+        self.store.close()
@@ -0,0 +1,16 @@
+# bench_parsers.py
+#
+# 在保存的社区列表页和帖子页上比较各 HTML 解析器的提取结果是否一致以及耗时
+# 用法: python bench_parsers.py [页面文件或目录 ...]，默认使用 samples/ 中保存的页面（也可以传入 error_pages/）
+# 任何解析器的结果与 html.parser 不一致时以退出码 1 结束
+
+import sys
+
+from src.html_parser import compare_backends, load_pages
+from src.scraper import parse_posts_on_page, parse_replies
+
+if __name__ == "__main__":
+    pages = load_pages(sys.argv[1:] or ['samples'])
+    results = compare_backends(pages, lambda html, backend: (parse_posts_on_page(html, backend), parse_replies(html, backend)))
+    if any(mismatches for _, mismatches in results.values()):
+        sys.exit("有解析器的提取结果与 html.parser 不一致")
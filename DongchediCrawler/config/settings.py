@@ -2,13 +2,33 @@
 
 # WebDriver settings
 CHROME_DRIVER_URL = "https://registry.npmmirror.com/-/binary/chromedriver"
+DRIVER_CACHE_FILE = "data/chromedriver.json" # resolved chromedriver path, refreshed through webdriver-manager once a week
+BROWSER_PROFILE_DIR = "data/chrome_profiles" # persistent Chrome user data per browser (cache, cookies), None for a fresh profile each run
 COOKIES_FILE = "data/dongchedi_cookies.pkl"
 USER_PROFILE_URL = "https://www.dongchedi.com/"
 BASE_URL = "https://www.dongchedi.com"
 
 # Data files
 POSTS_FILE = "data/dongchedi_posts.json"
+POSTS_LOG_FILE = "data/dongchedi_posts.jsonl"
 PROGRESS_FILE = "data/progress.json"
+WATERMARKS_FILE = "data/dongchedi_watermarks.json" # newest post seen per community, for incremental runs
+
+# Storage backend: 'jsonl' appends one line per post to POSTS_LOG_FILE (converted from POSTS_FILE on first run),
+# 'json' rewrites the whole POSTS_FILE on every save, 'sqlite' keeps posts, replies, progress and watermarks
+# in SQLITE_FILE (WAL mode, indexed upserts committed SQLITE_BATCH_SIZE writes at a time, safe for several processes;
+# existing files are imported on first use), 'shards' writes compressed JSONL shards to SHARD_DIR (see below)
+STORAGE_BACKEND = 'jsonl'
+SQLITE_FILE = "data/dongchedi.db"
+SQLITE_BATCH_SIZE = 100
+
+# Compressed shards: one community per shard, rotated after SHARD_MAX_MB (compressed) or SHARD_MAX_RECORDS posts,
+# listed with their community, time range and record count in SHARD_DIR/manifest.json.
+# 'gzip' needs nothing extra, 'zstd' needs the zstandard package
+SHARD_DIR = "data/dongchedi_shards"
+SHARD_COMPRESSION = 'gzip'
+SHARD_MAX_MB = 64
+SHARD_MAX_RECORDS = 10000
 
 # Community settings
 # Define communities to scrape in the format: {'community_name': {'url': 'community_url', 'total_pages': N, 'page_offset': M}}
@@ -26,11 +46,56 @@ COMMUNITIES = {
     # }
 }
 
+# Incremental mode: walk list pages newest-first and stop at the first page with nothing newer than the last run.
+# False walks every page up to total_pages, resuming after the last completed page.
+INCREMENTAL = True
+
 # Selenium settings
 WAIT_TIME = 10
-SCROLL_WAIT_TIME = 2
+SCROLL_QUIET_TIME = 1 # seconds without DOM changes or network requests before a page counts as loaded
+SCROLL_MAX_WAIT = 15 # upper bound for scrolling and waiting on lazy content, seconds
 RANDOM_DELAY_RANGE = (1, 3) # seconds
 
+# Worker pool settings
+NUM_WORKERS = 1 # Number of browser instances scraping pages in parallel
+MIN_REQUEST_INTERVAL = 1 # Minimum seconds between two page requests to the site, shared by all workers
+
+# HTML parser backend: 'html.parser' (default, pure Python), 'lxml' or 'selectolax' (fastest, optional dependency).
+# python bench_parsers.py checks that a backend extracts the same as html.parser on the pages in samples/
+HTML_PARSER = 'html.parser'
+
+# Replies: 'api' reads them from the JSON comment endpoint with cursor pagination, sending the logged-in browser's
+# cookies (posts the endpoint cannot serve fall back to the browser); 'browser' loads each post page and scrolls
+REPLY_FETCH_MODE = 'api'
+COMMENT_API_URL = "https://www.dongchedi.com/motor/pc/ugc/comment/list" # see CommentApiClient for the expected request/response
+COMMENT_API_PAGE_SIZE = 20
+
+# Page cache: 'record' stores every fetched page source compressed in PAGE_CACHE_DIR,
+# 'replay' re-extracts everything from the cached pages without starting a browser, 'off' disables the cache
+PAGE_CACHE_MODE = 'record'
+PAGE_CACHE_DIR = "data/page_cache"
+
+# Metrics: per-phase timings and page/post/reply/error/byte counters in Prometheus text format.
+# METRICS_TEXTFILE is rewritten at every checkpoint (point node_exporter's textfile collector at it, or None to disable);
+# METRICS_PORT serves the same data at http://127.0.0.1:<port>/metrics while the crawler runs (None to disable)
+METRICS_TEXTFILE = "data/metrics.prom"
+METRICS_PORT = None
+
+# Resource policy: requests for these resource types and URL patterns are blocked through the DevTools protocol,
+# extraction only needs the page text. RESOURCE_STATS logs blocked and loaded requests per page (off by default:
+# it turns on Chrome's performance log, which is parsed after every page).
+BLOCKED_RESOURCE_TYPES = ['image', 'font', 'media'] # see RESOURCE_TYPE_EXTENSIONS in resource_policy.py
+BLOCKED_URL_PATTERNS = [
+    '*hm.baidu.com*',
+    '*cnzz.com*',
+    '*google-analytics.com*',
+    '*googletagmanager.com*',
+    '*googlesyndication.com*',
+    '*doubleclick.net*',
+    '*mcs.snssdk.com*', # ByteDance analytics
+]
+RESOURCE_STATS = False
+
 # Chrome options (adjust as needed)
 CHROME_OPTIONS = [
     '--disable-plugins-discovery',
@@ -0,0 +1,198 @@
+# comment_api.py
+#
+# 不渲染页面、直接请求懂车帝的评论接口抓取帖子回复
+# 自检（本地假接口，不访问网站）: python -m src.comment_api
+
+import json
+import re
+
+import requests
+
+from .time_parser import TimeParser
+from .page_cache import page_cache
+from .metrics import metrics
+
+
+# 帖子链接中的文章 id：/ugc/article/<id>
+_ARTICLE_ID = re.compile(r'/ugc/article/(\d+)')
+
+
+class CommentApiError(Exception):
+    """评论接口请求失败或返回了无法识别的内容"""
+
+
+def parse_comment(comment, times):
+    """把接口返回的一条评论转换为与 parse_replies 相同的 {'content', 'timestamp'}，没有内容时返回 None"""
+    content = (comment.get('text') or comment.get('content') or '').strip()
+    if not content:
+        return None
+    created = comment.get('create_time')
+    if isinstance(created, (int, float)) or (isinstance(created, str) and created.isdigit()):
+        timestamp = int(created)
+    else:
+        timestamp = times.parse(created)
+    return {'content': content, 'timestamp': timestamp}
+
+
+class CommentApiClient:
+    """按游标翻页请求评论接口，返回帖子的全部回复
+
+    请求: GET api_url?group_id=<文章 id>&cursor=<游标>&count=<每页条数>
+    响应: {"status": 0, "data": {"comments": [...], "has_more": true, "cursor": <下一页游标>}}
+    每条评论取 text（或 content）和 create_time（秒级时间戳或时间字符串）；响应中没有 comments 列表时视为接口不可用。
+    请求带上浏览器登录后的 cookies；record 模式下响应写入页面缓存，replay 模式下从缓存读取。
+
+    Args:
+        api_url (str): 评论接口地址
+        cookies (list): driver.get_cookies() 的结果
+        user_agent (str, optional): 与浏览器相同的 User-Agent
+        page_size (int): 每页条数
+        max_pages (int): 每个帖子最多翻的页数
+        rate_limiter (RateLimiter, optional): 与浏览器共用的站点级请求间隔
+    """
+
+    def __init__(self, api_url, cookies=(), user_agent=None, page_size=20, max_pages=500, rate_limiter=None, time_out=10):
+        self.api_url = api_url
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.rate_limiter = rate_limiter
+        self.time_out = time_out
+        self.session = requests.Session()
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie['name'], cookie['value'],
+                domain=cookie.get('domain', ''), path=cookie.get('path', '/')
+            )
+
+    def _get_page(self, article_id, cursor):
+        """请求一页评论，返回响应中的 data"""
+        params = {'group_id': article_id, 'cursor': cursor, 'count': self.page_size}
+        url = requests.Request('GET', self.api_url, params=params).prepare().url
+        if page_cache.replaying:
+            body = page_cache.get(url)
+            if body is None:
+                raise CommentApiError(f"页面缓存中没有 {url}")
+        else:
+            if self.rate_limiter:
+                self.rate_limiter.wait()
+            try:
+                with metrics.timer('navigate'):
+                    response = self.session.get(url, timeout=self.time_out)
+            except requests.RequestException as e:
+                raise CommentApiError(f"请求失败: {e}") from e
+            if response.status_code != 200:
+                raise CommentApiError(f"HTTP 状态码 {response.status_code}")
+            body = response.content
+            metrics.inc('pages')
+            metrics.inc('bytes', len(body))
+            page_cache.put(url, body)
+
+        try:
+            payload = json.loads(body)
+        except ValueError as e:
+            raise CommentApiError("接口返回的不是 JSON") from e
+        if not isinstance(payload, dict) or payload.get('status', 0) != 0 or not isinstance(payload.get('data'), dict):
+            message = payload.get('message') or payload.get('status') if isinstance(payload, dict) else payload
+            raise CommentApiError(f"接口返回错误: {message}")
+        return payload['data']
+
+    def iter_replies(self, article_id):
+        """逐页请求并逐条返回回复；请求失败或响应格式不对时抛出 CommentApiError"""
+        times = TimeParser()
+        cursor = 0
+        seen = set()
+        try:
+            for _ in range(self.max_pages):
+                data = self._get_page(article_id, cursor)
+                comments = data.get('comments')
+                # 接口地址和字段名变了时不能当作没有回复，否则帖子会被记为已处理而丢掉回复
+                if not isinstance(comments, list) or not all(isinstance(comment, dict) for comment in comments):
+                    raise CommentApiError(f"响应中没有评论列表: {sorted(data)}")
+                with metrics.timer('parse'):
+                    replies = [parse_comment(comment, times) for comment in comments]
+                for reply in replies:
+                    if reply:
+                        yield reply
+                # 游标不前进时停止，避免接口异常时无限翻页
+                seen.add(cursor)
+                cursor = data.get('cursor')
+                if not data.get('has_more') or cursor is None or cursor in seen:
+                    break
+        finally:
+            metrics.observe('time_parse', times.seconds)
+
+    def fetch_replies(self, url):
+        """返回帖子的全部回复，接口不可用时返回 None，由调用方改用浏览器抓取
+
+        任何一页失败都返回 None，不返回已经取到的部分回复，所以这里先收集完所有页。
+        """
+        match = _ARTICLE_ID.search(url or '')
+        if not match:
+            return None
+        article_id = match.group(1)
+        try:
+            replies = list(self.iter_replies(article_id))
+        except CommentApiError as e:
+            print(f"评论接口抓取失败 {url}: {e}")
+            metrics.inc('errors')
+            return None
+        metrics.inc('replies', len(replies))
+        print(f"帖子 {url} 通过评论接口抓取到 {len(replies)} 条回复。")
+        return replies
+
+
+def _serve_stub(comments, page_size):
+    """启动一个本地的假评论接口，group_id 为 0 时返回错误，为 1 时返回没有 comments 的 data，返回 (server, api_url)"""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlsplit, parse_qs
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = {key: values[0] for key, values in parse_qs(urlsplit(self.path).query).items()}
+            if query.get('group_id') == '0':
+                payload = {'status': 1, 'message': 'invalid group_id'}
+            elif query.get('group_id') == '1':
+                payload = {'status': 0, 'data': {'list': [], 'has_more': False}}
+            else:
+                cursor = int(query.get('cursor', 0))
+                count = int(query.get('count', page_size))
+                page = comments[cursor:cursor + count]
+                payload = {'status': 0, 'data': {
+                    'comments': page, 'has_more': cursor + count < len(comments), 'cursor': cursor + count}}
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/comment/list"
+
+
+def main():
+    comments = [{'text': f'回复 {i}', 'create_time': 1700000000 + i} for i in range(45)]
+    comments.append({'text': '', 'create_time': 1})  # 没有内容的评论会被跳过
+    server, api_url = _serve_stub(comments, page_size=20)
+    try:
+        client = CommentApiClient(api_url, page_size=20)
+        replies = client.fetch_replies('https://www.dongchedi.com/ugc/article/123')
+        assert replies == [{'content': f'回复 {i}', 'timestamp': 1700000000 + i} for i in range(45)], replies
+        assert client.fetch_replies('https://www.dongchedi.com/ugc/article/0') is None
+        # 响应格式不对时返回 None，由调用方改用浏览器，而不是当作没有回复
+        assert client.fetch_replies('https://www.dongchedi.com/ugc/article/1') is None
+        assert client.fetch_replies('https://www.dongchedi.com/community/6095') is None
+        print("评论接口自检通过")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,70 +1,107 @@
 # crawler.py
 
+import itertools
 import time
-import json
-import os
 import random
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
 
 # Change relative imports to absolute imports based on the package structure
-from src.utils import load_cookies, manual_login, load_progress, save_progress
+from src.utils import load_cookies, manual_login
 from src.scraper import get_posts_on_page, get_replies_for_post # Add scraper import
+from src.comment_api import CommentApiClient
+from src.storage import open_post_store
+from src.progress import open_progress_store
+from src.sqlite_store import open_database
+from src.watermark import HighWaterMarks
+from src.pool import DriverPool, RateLimiter
+from src.driver_setup import start_chrome, use_profile
+from src.page_cache import page_cache
+from src.metrics import metrics
+from src.resource_policy import apply_resource_policy, enable_resource_log, resource_stats
 from config.settings import (
-    CHROME_DRIVER_URL, COOKIES_FILE, USER_PROFILE_URL, POSTS_FILE,
-    PROGRESS_FILE, COMMUNITIES, 
-    WAIT_TIME, RANDOM_DELAY_RANGE, CHROME_OPTIONS, CHROME_PREFS
+    CHROME_DRIVER_URL, DRIVER_CACHE_FILE, BROWSER_PROFILE_DIR, COOKIES_FILE, USER_PROFILE_URL, POSTS_FILE,
+    POSTS_LOG_FILE, STORAGE_BACKEND, SQLITE_FILE, SQLITE_BATCH_SIZE, SHARD_DIR, SHARD_COMPRESSION, SHARD_MAX_MB,
+    SHARD_MAX_RECORDS, PROGRESS_FILE, WATERMARKS_FILE, COMMUNITIES,
+    INCREMENTAL, WAIT_TIME, RANDOM_DELAY_RANGE, NUM_WORKERS, MIN_REQUEST_INTERVAL,
+    BLOCKED_RESOURCE_TYPES, BLOCKED_URL_PATTERNS, RESOURCE_STATS, PAGE_CACHE_MODE, PAGE_CACHE_DIR,
+    METRICS_TEXTFILE, METRICS_PORT, REPLY_FETCH_MODE, COMMENT_API_URL, COMMENT_API_PAGE_SIZE, CHROME_OPTIONS, CHROME_PREFS
 )
 
 class DongchediCrawler:
     def __init__(self):
         self.driver = None
         self.posts = {}
+        # sqlite 存储时帖子、回复、进度和增量标记都在同一个数据库中
+        self.db = open_database(SQLITE_FILE, SQLITE_BATCH_SIZE) if STORAGE_BACKEND == 'sqlite' else None
+        shards = dict(folder=SHARD_DIR, site='dongchedi', compression=SHARD_COMPRESSION,
+                      max_bytes=SHARD_MAX_MB * 1024 * 1024, max_records=SHARD_MAX_RECORDS)
+        self.store = open_post_store(STORAGE_BACKEND, POSTS_FILE, POSTS_LOG_FILE, db=self.db, shards=shards)
         # 进度现在存储所有已处理回复的帖子URL，不按社区区分
-        self.processed_post_urls = []
+        self.progress = None
+        self.processed_post_urls = set()
+        self.marks = None
+        self.pool = None
+        self.rate_limiter = None
+        # Each browser needs a profile directory of its own, workers are numbered in creation order
+        self._worker_ids = itertools.count(1)
+        page_cache.configure(PAGE_CACHE_DIR, PAGE_CACHE_MODE)
+        metrics.configure('dongchedi', METRICS_TEXTFILE, METRICS_PORT)
 
-    def _init_driver(self):
-        """初始化WebDriver"""
-        print("正在初始化WebDriver...")
+    def _create_driver(self, profile='main'):
+        """创建一个WebDriver实例，profile 为 BROWSER_PROFILE_DIR 下的用户目录名"""
         options = Options()
         for arg in CHROME_OPTIONS:
             options.add_argument(arg)
         if CHROME_PREFS:
             options.add_experimental_option("prefs", CHROME_PREFS)
+        if RESOURCE_STATS:
+            enable_resource_log(options)
+        use_profile(options, BROWSER_PROFILE_DIR, profile)
             
-        service = Service(ChromeDriverManager(url=CHROME_DRIVER_URL).install())
-        self.driver = webdriver.Chrome(service=service, options=options)
-        self.driver.set_window_size(1920, 1080)
+        # The driver path is resolved once and cached, startup does not need the network
+        driver = start_chrome(options, CHROME_DRIVER_URL, DRIVER_CACHE_FILE)
+        apply_resource_policy(driver, BLOCKED_RESOURCE_TYPES, BLOCKED_URL_PATTERNS)
+        driver.set_window_size(1920, 1080)
+        return driver
+
+    def _create_worker_driver(self):
+        """为 worker 创建WebDriver，并加载主浏览器登录时保存的cookies"""
+        driver = self._create_driver(f"worker-{next(self._worker_ids)}")
+        driver.get(USER_PROFILE_URL)
+        load_cookies(driver, COOKIES_FILE)
+        driver.get(USER_PROFILE_URL)
+        return driver
+
+    def _init_driver(self):
+        """初始化WebDriver"""
+        print("正在初始化WebDriver...")
+        self.driver = self._create_driver()
+        # 浏览器和评论接口的请求共用同一个站点级间隔
+        self.rate_limiter = RateLimiter(MIN_REQUEST_INTERVAL)
+        # 已登录的主浏览器作为第一个 worker，其余 worker 共享它保存的cookies
+        self.pool = DriverPool(
+            self._create_worker_driver, NUM_WORKERS, first_driver=self.driver,
+            rate_limiter=self.rate_limiter, delay_range=RANDOM_DELAY_RANGE
+        )
 
     def _load_data_and_progress(self):
         """加载已有的数据和进度"""
-        if os.path.exists(POSTS_FILE):
-            with open(POSTS_FILE, 'r', encoding='utf-8') as f:
-                try:
-                    self.posts = json.load(f)
-                except json.JSONDecodeError:
-                    self.posts = {} # Initialize if file is empty or corrupted
-        else:
-             # Create dummy file if it doesn't exist so json.load doesn't fail
-             with open(POSTS_FILE, 'w', encoding='utf-8') as f:
-                 json.dump({}, f)
-
-        self.processed_post_urls = load_progress(PROGRESS_FILE)
-        # Create dummy file if it doesn't exist so json.load doesn't fail
-        if not os.path.exists(PROGRESS_FILE):
-             with open(PROGRESS_FILE, 'w', encoding='utf-8') as f:
-                 json.dump([], f)
+        self.posts = self.store.load()
+
+        # 用带索引的进度记录，查找是 O(1)，每次修改只追加一行日志（sqlite 存储时是主键查询）
+        self.progress = open_progress_store(PROGRESS_FILE, db=self.db)
+        self.processed_post_urls = self.progress.view()
+        # 每个社区见过的最新帖子，以及完整遍历时已完成的页数
+        self.marks = HighWaterMarks(WATERMARKS_FILE, db=self.db)
 
     def _save_data(self):
-        """保存抓取到的数据"""
-        with open(POSTS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.posts, f, ensure_ascii=False, indent=4)
+        """保存抓取到的数据，同时更新指标文件"""
+        self.store.flush()
+        metrics.write_textfile()
 
     def _save_progress(self):
         """保存抓取进度"""
-        save_progress(PROGRESS_FILE, self.processed_post_urls)
+        self.progress.flush()
 
     def _ensure_login(self):
         """确保用户登录"""
@@ -74,8 +111,13 @@ class DongchediCrawler:
         self.driver.get(USER_PROFILE_URL) # Navigate back after loading cookies
         time.sleep(2) # Give some time for cookies to be applied
 
-    def scrape_posts(self):
-        """抓取帖子列表"""
+    def scrape_posts(self, incremental=INCREMENTAL):
+        """抓取帖子列表
+
+        Args:
+            incremental (bool): 从第一页（最新）开始，遇到一整页都不比上次见过的最新帖子更新时停止；
+                否则从上次完成的页之后继续，直到 total_pages
+        """
         print("开始抓取所有社区的帖子列表...")
         
         for community_key, community_info in COMMUNITIES.items():
@@ -88,64 +130,171 @@ class DongchediCrawler:
             # Initialize list for the community if it doesn't exist
             if community_key not in self.posts:
                 self.posts[community_key] = []
+            # 已保存的帖子不再重复追加，否则会用没有回复的新记录覆盖它
+            known_urls = {post.get('url') for post in self.posts[community_key]}
 
-            # Determine starting page based on existing data for this community
-            # Assuming each entry in self.posts[community_key] corresponds to one page of posts
-            # This might need refinement if your original script didn't save data page by page
-            # Let's assume for simplicity here that the number of collected post lists corresponds to pages scraped
-            start_page_for_community = page_offset + len(self.posts[community_key])
-
-            if start_page_for_community > total_pages + page_offset:
-                 print(f"社区 {community_key} 的帖子列表已全部抓取。")
-                 continue
+            mark = self.marks.get(community_key)
+            if incremental:
+                start_page_for_community = page_offset
+                if mark:
+                    print(f"社区 {community_key} 上次见过的最新帖子: id {mark.get('id')}, 时间 {mark.get('timestamp')}")
+            else:
+                # Resume after the last page completed by a previous full walk
+                start_page_for_community = max(page_offset, mark.get('page', 0))
+                if start_page_for_community >= total_pages + page_offset:
+                     print(f"社区 {community_key} 的帖子列表已全部抓取。")
+                     continue
 
             print(f"从社区 {community_key} 的第 {start_page_for_community + 1} 页开始抓取...")
 
             for i in range(start_page_for_community, total_pages + page_offset):
                 # Assuming URL format is base_url/page_number
                 page_url = f"{community_url}/{i + 1}"
-                posts_on_page = get_posts_on_page(self.driver, page_url, WAIT_TIME)
-                
-                # Append posts from this page as a new list entry for this community
-                # This assumes you want to keep track of posts per page. 
-                # If you just want a flat list of all posts for the community, 
-                # change extend logic here.
-                # Let's stick to the original structure of appending list of posts
-                self.posts[community_key].extend(posts_on_page)
+                with metrics.context(community_key):
+                    posts_on_page = get_posts_on_page(self.driver, page_url, WAIT_TIME)
+
+                if incremental and mark and posts_on_page and not any(
+                        self.marks.is_new(community_key, post['url'], post['timestamp']) for post in posts_on_page):
+                    print(f"社区 {community_key} 的第 {i + 1} 页没有新帖子，停止翻页。")
+                    break
+
+                new_posts = [post for post in posts_on_page if post['url'] not in known_urls]
+                for post in posts_on_page:
+                    self.marks.observe(community_key, post['url'], post['timestamp'])
                 
-                self._save_data()
-                print(f"社区 {community_key} 的第 {i + 1} 页数据已抓取并保存。")
-                time.sleep(random.uniform(*RANDOM_DELAY_RANGE))
+                self.posts[community_key].extend(new_posts)
+                with metrics.context(community_key), metrics.timer('persist'):
+                    for post in new_posts:
+                        known_urls.add(post['url'])
+                        self.store.append(community_key, post)
+                    self._save_data()
+                if not incremental:
+                    self.marks.record_page(community_key, i + 1)
+                print(f"社区 {community_key} 的第 {i + 1} 页数据已抓取并保存，新帖子 {len(new_posts)}/{len(posts_on_page)}。")
+                with metrics.timer('sleep'):
+                    time.sleep(random.uniform(*RANDOM_DELAY_RANGE))
+
+            # 遍历完成后才更新最新帖子标记，中途出错时下次会重新检查这些页
+            self.marks.commit(community_key)
 
     def scrape_replies(self):
         """抓取帖子回复"""
         print("开始抓取所有帖子的回复...")
         
         # Iterate through all communities and their posts
+        tasks = []
         for community_key, posts_list in self.posts.items():
             if not isinstance(posts_list, list):
                 print(f"警告: 社区 {community_key} 的数据格式不正确，跳过抓取回复。")
                 continue
 
-            print(f"抓取社区 {community_key} 的帖子回复...")
             for post in posts_list:
                 url = post.get('url')
                 # Check if the URL has already been processed for replies
                 if url and url not in self.processed_post_urls:
-                    replies = get_replies_for_post(self.driver, url, WAIT_TIME)
-                    post['replies'].extend(replies)
-                    print(f"帖子 {url} 的回复已抓取。")
-                    self.processed_post_urls.append(url)
-                    self._save_data()
-                    self._save_progress()
-                    time.sleep(random.uniform(*RANDOM_DELAY_RANGE))
+                    tasks.append((community_key, post))
                 elif url and url in self.processed_post_urls:
                     print(f"帖子 {url} 的回复已跳过 (已在进度中)。")
                 elif not url:
                     print(f"警告: 发现一个没有URL的帖子，跳过抓取回复。")
 
+        print(f"共有 {len(tasks)} 个帖子待抓取回复。")
+        if REPLY_FETCH_MODE == 'api':
+            tasks = self._scrape_replies_api(tasks)
+            if tasks:
+                print(f"{len(tasks)} 个帖子无法通过评论接口抓取，改用浏览器。")
+        # worker 只负责抓取页面，数据和进度由当前线程统一写入
+        for (community_key, post), replies in self.pool.imap(tasks, self._fetch_replies):
+            self._save_replies(community_key, post, replies)
+
+    def _create_comment_client(self):
+        """创建评论接口客户端，带上主浏览器当前的cookies和User-Agent"""
+        cookies, user_agent = (), None
+        if self.driver:
+            cookies = self.driver.get_cookies()
+            user_agent = self.driver.execute_script("return navigator.userAgent")
+        return CommentApiClient(
+            COMMENT_API_URL, cookies, user_agent, page_size=COMMENT_API_PAGE_SIZE, rate_limiter=self.rate_limiter
+        )
+
+    def _scrape_replies_api(self, tasks):
+        """通过评论接口抓取回复，返回接口无法处理、需要用浏览器抓取的任务"""
+        client = self._create_comment_client()
+        fallback = []
+        for community_key, post in tasks:
+            with metrics.context(community_key):
+                replies = client.fetch_replies(post['url'])
+            if replies is None:
+                fallback.append((community_key, post))
+            else:
+                self._save_replies(community_key, post, replies)
+        return fallback
+
+    def _save_replies(self, community_key, post, replies):
+        """保存一个帖子的回复并记录进度"""
+        url = post['url']
+        post['replies'].extend(replies or [])
+        # 追加一条更新后的记录，读取时以最后一条为准
+        with metrics.context(community_key), metrics.timer('persist'):
+            self.store.append(community_key, post)
+            print(f"帖子 {url} 的回复已抓取。")
+            self.processed_post_urls.add(url)
+            self._save_data()
+            self._save_progress()
+
+    @staticmethod
+    def _fetch_replies(driver, task):
+        """在 worker 线程中抓取单个帖子的回复"""
+        community_key, post = task
+        with metrics.context(community_key):
+            return get_replies_for_post(driver, post['url'], WAIT_TIME)
+
+    def replay(self):
+        """不启动浏览器，用页面缓存重新抽取所有帖子列表和回复
+
+        先重放 COMMUNITIES 中各列表页，再重放其余已保存帖子的回复页；
+        回复页没有缓存时保留原来的回复。结果按 url 覆盖原来的记录，不读取也不修改进度。
+        """
+        print("开始从页面缓存重新抽取帖子和回复...")
+        self.posts = self.store.load()
+        existing = {post.get('url'): (community_key, post)
+                    for community_key, posts_list in self.posts.items() for post in posts_list}
+        replayed = 0
+        start_time = time.perf_counter()
+        client = self._create_comment_client() if REPLY_FETCH_MODE == 'api' else None
+
+        def replay_post(community_key, post):
+            old_post = existing.pop(post['url'], (None, {}))[1]
+            # 评论接口的响应也在页面缓存中，没有时再看帖子页
+            replies = client.fetch_replies(post['url']) if client else None
+            if replies is not None:
+                post['replies'] = replies
+            elif page_cache.get(post['url']) is not None:
+                post['replies'] = get_replies_for_post(None, post['url'])
+            else:
+                post['replies'] = old_post.get('replies', [])
+            self.store.append(community_key, post)
+
+        for community_key, community_info in COMMUNITIES.items():
+            page_offset = community_info.get('page_offset', 0)
+            for i in range(page_offset, community_info.get('total_pages', 1) + page_offset):
+                for post in get_posts_on_page(None, f"{community_info['url']}/{i + 1}"):
+                    replay_post(community_key, post)
+                    replayed += 1
+        for url, (community_key, post) in list(existing.items()):
+            if url and (client or page_cache.get(url) is not None):
+                replay_post(community_key, dict(post))
+                replayed += 1
+
+        self.store.close()
+        print(f"重放完成：重新抽取 {replayed} 个帖子，用时 {time.perf_counter() - start_time:.1f} 秒。")
+
     def run(self):
         """运行爬虫"""
+        if page_cache.replaying:
+            self.replay()
+            return
+
         self._load_data_and_progress()
         self._init_driver()
         self._ensure_login()
@@ -156,6 +305,18 @@ class DongchediCrawler:
         except Exception as e:
             print(f"爬虫运行出错: {e}")
         finally:
+            if self.pool:
+                self.pool.close()
             if self.driver:
                 self.driver.quit()
+            resource_stats.summary()
+            metrics.summary()
+            metrics.write_textfile()
+            self.store.close()
+            if self.progress:
+                self.progress.close()
+            if self.marks:
+                self.marks.close()
+            if self.db:
+                self.db.close()
             print("爬虫运行结束。") 
\ No newline at end of file
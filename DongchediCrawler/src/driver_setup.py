@@ -0,0 +1,132 @@
+# driver_setup.py
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+from selenium import webdriver
+from selenium.common.exceptions import SessionNotCreatedException
+from selenium.webdriver.chrome.service import Service
+
+
+# 解析出的 chromedriver 路径和当时的 Chrome 主版本号缓存在这里，有效期内且 Chrome 没有升级时启动不需要联网
+DRIVER_CACHE_FILE = 'data/chromedriver.json'
+DRIVER_CACHE_DAYS = 7
+
+_resolved = {}
+_lock = threading.Lock()
+
+
+def chrome_major_version():
+    """返回本机 Chrome 的主版本号，取不到时返回 None"""
+    try:
+        from webdriver_manager.core.os_manager import OperationSystemManager, ChromeType
+        version = OperationSystemManager().get_browser_version_from_os(ChromeType.GOOGLE)
+    except Exception:
+        version = None
+    match = re.match(r'(\d+)', version or '')
+    return int(match.group(1)) if match else None
+
+
+def _read_cache(cache_file):
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        return cache.get('path'), cache.get('resolved_at', 0), cache.get('browser_version')
+    except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+        return None, 0, None
+
+
+def _write_cache(cache_file, path, browser_version):
+    folder = os.path.dirname(cache_file)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        json.dump({'path': path, 'resolved_at': time.time(), 'browser_version': browser_version},
+                  f, ensure_ascii=False, indent=4)
+
+
+def invalidate_driver_cache(cache_file=DRIVER_CACHE_FILE):
+    """删除缓存的 chromedriver 路径，下次解析时重新下载"""
+    with _lock:
+        _resolved.pop(cache_file, None)
+        try:
+            os.remove(cache_file)
+        except FileNotFoundError:
+            pass
+
+
+def resolve_driver_path(download_url=None, cache_file=DRIVER_CACHE_FILE, max_age_days=DRIVER_CACHE_DAYS):
+    """返回 chromedriver 的路径，同一进程中只解析一次
+
+    依次使用：环境变量 CHROMEDRIVER_PATH、未过期的缓存路径、webdriver_manager 下载（会联网）、
+    过期的缓存路径、PATH 中的 chromedriver。都不可用时返回 None，由 Selenium 自带的 Selenium Manager 处理。
+    缓存的路径只在记录的 Chrome 主版本号与本机一致（或取不到本机版本）时使用。
+    """
+    with _lock:
+        if cache_file in _resolved:
+            return _resolved[cache_file]
+
+        path = os.environ.get('CHROMEDRIVER_PATH')
+        source = '环境变量'
+        cached_path, resolved_at, cached_version = _read_cache(cache_file)
+        browser_version = chrome_major_version()
+        if cached_path and browser_version and cached_version != browser_version:
+            print(f"Chrome 已更新到 {browser_version}（缓存的 chromedriver 对应 {cached_version}），重新获取 chromedriver")
+            cached_path = None
+        cached_path = cached_path if cached_path and os.path.exists(cached_path) else None
+
+        if not path and cached_path and time.time() - resolved_at < max_age_days * 86400:
+            path, source = cached_path, '缓存'
+        if not path:
+            try:
+                from webdriver_manager.chrome import ChromeDriverManager
+                path = ChromeDriverManager(url=download_url).install() if download_url else ChromeDriverManager().install()
+                source = 'webdriver_manager'
+                _write_cache(cache_file, path, browser_version)
+            except Exception as e:
+                print(f"webdriver_manager 获取 chromedriver 失败: {e}")
+        if not path and cached_path:
+            path, source = cached_path, '过期的缓存'
+        if not path:
+            path, source = shutil.which('chromedriver'), 'PATH'
+
+        print(f"chromedriver: {path or '交给 Selenium Manager'} ({source if path else '未找到'})")
+        _resolved[cache_file] = path
+        return path
+
+
+def create_service(download_url=None, cache_file=DRIVER_CACHE_FILE):
+    """创建使用缓存的 chromedriver 的 Service"""
+    path = resolve_driver_path(download_url, cache_file)
+    return Service(path) if path else Service()
+
+
+def start_chrome(options, download_url=None, cache_file=DRIVER_CACHE_FILE):
+    """用缓存的 chromedriver 启动 Chrome
+
+    chromedriver 与浏览器版本不匹配时 Selenium 抛出 SessionNotCreatedException，
+    这时清除缓存、重新解析 chromedriver 后再试一次。
+    """
+    try:
+        return webdriver.Chrome(service=create_service(download_url, cache_file), options=options)
+    except SessionNotCreatedException as e:
+        print(f"启动 Chrome 失败，清除 chromedriver 缓存后重试: {e}")
+        invalidate_driver_cache(cache_file)
+        return webdriver.Chrome(service=create_service(download_url, cache_file), options=options)
+
+
+def use_profile(options, profile_dir, name='main'):
+    """让浏览器使用 profile_dir/name 下的持久化用户目录
+
+    缓存、cookies 和本地存储跨运行保留，之后启动时页面资源大多来自磁盘缓存。
+    同一用户目录同时只能被一个 Chrome 使用，所以每个浏览器用不同的 name。
+    """
+    if not profile_dir:
+        return
+    path = os.path.abspath(os.path.join(profile_dir, name))
+    os.makedirs(path, exist_ok=True)
+    options.add_argument(f'--user-data-dir={path}')
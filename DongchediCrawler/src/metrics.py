@@ -0,0 +1,177 @@
+# metrics.py
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# 各阶段耗时的直方图分桶（秒）
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# 计数器名称和说明，都带 site 和 community 标签
+COUNTERS = {
+    'pages': '抓取的页面数',
+    'posts': '抽取到的帖子数',
+    'replies': '抽取到的回复数',
+    'errors': '抓取或解析失败的次数',
+    'bytes': '抓取的页面源码字节数',
+}
+
+# 当前任务所属的社区（或酒店）；worker 线程和 asyncio.to_thread 中都各自独立
+_community = contextvars.ContextVar('community', default='')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """按站点和社区统计各阶段耗时和抓取计数，导出为 Prometheus 文本格式
+
+    阶段包括 navigate（driver.get / HTTP 请求）、wait、scroll、page_source、parse、
+    time_parse（parse 中解析时间字符串的部分）、persist 和 sleep（礼貌性等待）。
+    导出方式：write_textfile 写到 node_exporter 的 textfile 目录，或 serve 启动本地的 /metrics 接口。
+    """
+
+    def __init__(self, site=''):
+        self.site = site
+        self.textfile = None
+        self._server = None
+        self._histograms = {}  # (phase, community) -> [各分桶计数..., +Inf 计数], 总和
+        self._counters = {}  # (name, community) -> value
+        self._lock = threading.Lock()
+
+    def configure(self, site, textfile=None, port=None):
+        """设置站点名和导出方式，port 不为 None 时在本地启动 /metrics 接口"""
+        self.site = site
+        self.textfile = textfile
+        if port is not None and self._server is None:
+            self.serve(port)
+
+    @contextmanager
+    def context(self, community):
+        """在 with 块内把之后记录的指标归到 community"""
+        token = _community.set(community or '')
+        try:
+            yield
+        finally:
+            _community.reset(token)
+
+    def observe(self, phase, seconds):
+        community = _community.get()
+        with self._lock:
+            entry = self._histograms.get((phase, community))
+            if entry is None:
+                entry = self._histograms[(phase, community)] = [[0] * (len(BUCKETS) + 1), 0.0]
+            counts = entry[0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            entry[1] += seconds
+
+    @contextmanager
+    def timer(self, phase):
+        """记录 with 块的耗时，出异常时也记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start)
+
+    def inc(self, name, value=1):
+        key = (name, _community.get())
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def render(self):
+        """返回 Prometheus 文本格式的全部指标"""
+        with self._lock:
+            histograms = {key: (list(counts), total) for key, (counts, total) in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = [
+            '# HELP crawler_phase_seconds 各抓取阶段的耗时',
+            '# TYPE crawler_phase_seconds histogram',
+        ]
+        for (phase, community), (counts, total) in sorted(histograms.items()):
+            labels = f'site="{_escape(self.site)}",community="{_escape(community)}",phase="{_escape(phase)}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS, counts):
+                cumulative += count
+                lines.append(f'crawler_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'crawler_phase_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f'crawler_phase_seconds_sum{{{labels}}} {total:.6f}')
+            lines.append(f'crawler_phase_seconds_count{{{labels}}} {cumulative}')
+
+        for name, description in COUNTERS.items():
+            lines.append(f'# HELP crawler_{name}_total {description}')
+            lines.append(f'# TYPE crawler_{name}_total counter')
+            for (counter, community), value in sorted(counters.items()):
+                if counter == name:
+                    labels = f'site="{_escape(self.site)}",community="{_escape(community)}"'
+                    lines.append(f'crawler_{name}_total{{{labels}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path=None):
+        """把指标写到文件（先写临时文件再替换，读取方不会读到一半的内容）"""
+        path = path or self.textfile
+        if not path:
+            return
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def serve(self, port, host='127.0.0.1'):
+        """在后台线程中提供 http://host:port/metrics"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            print(f"启动指标接口失败: {e}")
+            return
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"指标接口: http://{host}:{port}/metrics")
+
+    def summary(self):
+        """按阶段打印总耗时，不区分社区"""
+        totals = {}
+        with self._lock:
+            for (phase, _), (counts, total) in self._histograms.items():
+                seconds, count = totals.get(phase, (0.0, 0))
+                totals[phase] = (seconds + total, count + sum(counts))
+        if totals:
+            print("阶段耗时: " + "，".join(
+                f"{phase} {seconds:.1f} 秒/{count} 次" for phase, (seconds, count) in
+                sorted(totals.items(), key=lambda item: -item[1][0])))
+
+
+# 同一进程中的所有浏览器和线程共用，由爬虫按配置调用 configure
+metrics = Metrics()
@@ -0,0 +1,120 @@
+# page_cache.py
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urldefrag
+
+
+# off: 不缓存；record: 抓取的每个页面都写入缓存；replay: 不启动浏览器，只从缓存中读取页面重新抽取
+CACHE_MODES = ('off', 'record', 'replay')
+
+
+class PageCache:
+    """内容寻址的页面缓存，用于在不访问网站的情况下重新抽取
+
+    页面内容 gzip 压缩后按 sha256 保存在 objects/<前两位>/<sha256>.gz，相同内容只存一份；
+    index.jsonl 每行记录一次抓取 {"url", "fetched_at", "sha256", "encoding"}，
+    url 去掉了 #片段，同一 URL 的多次抓取都保留，读取时默认取最新的一次。
+    encoding 为 None 表示保存的是原始字节（HTTP 响应体），否则保存的是按该编码编码的文本（page_source）。
+
+    Args:
+        cache_dir (str): 缓存目录
+        mode (str): CACHE_MODES 之一
+    """
+
+    def __init__(self, cache_dir='data/page_cache', mode='off'):
+        self._lock = threading.Lock()
+        self.configure(cache_dir, mode)
+
+    def configure(self, cache_dir, mode):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"未知的页面缓存模式: {mode}，可选: {', '.join(CACHE_MODES)}")
+        with self._lock:
+            self.cache_dir = cache_dir
+            self.mode = mode
+            self.index_file = os.path.join(cache_dir, 'index.jsonl')
+            self._index = None
+
+    @property
+    def recording(self):
+        return self.mode == 'record'
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    def _object_path(self, digest):
+        return os.path.join(self.cache_dir, 'objects', digest[:2], digest + '.gz')
+
+    def _load_index(self):
+        """读取索引：{url: [(fetched_at, sha256, encoding), ...]}，按抓取时间排序"""
+        if self._index is None:
+            self._index = {}
+            if os.path.exists(self.index_file):
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue  # 写了一半的最后一行
+                        self._index.setdefault(entry['url'], []).append(
+                            (entry['fetched_at'], entry['sha256'], entry.get('encoding')))
+            for fetches in self._index.values():
+                fetches.sort()
+        return self._index
+
+    def put(self, url, body, fetched_at=None):
+        """record 模式下保存一次抓取，body 为 str（page_source）或 bytes（HTTP 响应体），返回 sha256"""
+        if not self.recording or body is None:
+            return None
+        encoding = None
+        if isinstance(body, str):
+            encoding = 'utf-8'
+            body = body.encode(encoding)
+        digest = hashlib.sha256(body).hexdigest()
+        fetched_at = fetched_at or time.time()
+        url = urldefrag(url)[0]
+
+        with self._lock:
+            path = self._object_path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = path + '.tmp'
+                with gzip.open(tmp_path, 'wb') as f:
+                    f.write(body)
+                os.replace(tmp_path, path)
+            entry = {'url': url, 'fetched_at': fetched_at, 'sha256': digest, 'encoding': encoding}
+            with open(self.index_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            if self._index is not None:
+                self._index.setdefault(url, []).append((fetched_at, digest, encoding))
+        return digest
+
+    def get(self, url, before=None):
+        """返回 url 最近一次（或 before 之前最近一次）抓取的内容，没有时返回 None"""
+        with self._lock:
+            fetches = self._load_index().get(urldefrag(url)[0], [])
+        if before is not None:
+            fetches = [fetch for fetch in fetches if fetch[0] <= before]
+        if not fetches:
+            return None
+        _, digest, encoding = fetches[-1]
+        try:
+            with gzip.open(self._object_path(digest), 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            print(f"缓存对象缺失: {digest} ({url})")
+            return None
+        return body.decode(encoding) if encoding else body
+
+    def urls(self):
+        with self._lock:
+            return list(self._load_index())
+
+
+# 同一进程中的所有抓取函数共用，由爬虫按配置调用 configure
+page_cache = PageCache()
@@ -0,0 +1,179 @@
+# progress.py
+
+import json
+import os
+import threading
+
+
+# 进度文件是一个 JSON 列表时（Autohome/Dongchedi），其中的链接放在这个集合里
+ITEMS = 'items'
+
+
+class ProgressStore:
+    """带内存索引和追加日志的进度记录
+
+    进度文件的格式保持不变：要么是一个链接列表，要么是
+    {"current_hotel": "", "processed_links": [...], ...} 这样的字典（flyert）。
+    内存中每个列表都是一个有序的 dict，查找和删除都是 O(1)；
+    每次修改只往 <进度文件>.journal 追加一行，
+    累计 snapshot_every 次修改后才重写一次进度文件并清空日志。
+    """
+
+    def __init__(self, progress_file, sets=(ITEMS,), fields=None, snapshot_every=1000):
+        self.progress_file = progress_file
+        self.journal_file = progress_file + '.journal'
+        self.set_names = tuple(sets)
+        self.list_layout = self.set_names == (ITEMS,)
+        self.fields = dict(fields or {})
+        self.sets = {name: {} for name in self.set_names}
+        self.snapshot_every = snapshot_every
+        self._journal = None
+        self._pending = 0
+        # 抓取线程和写入线程可能同时修改进度
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.progress_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = None
+
+        if isinstance(data, list) and self.list_layout:
+            self.sets[ITEMS] = dict.fromkeys(data)
+        elif isinstance(data, dict):
+            for key, value in data.items():
+                if key in self.sets and isinstance(value, list):
+                    self.sets[key] = dict.fromkeys(value)
+                else:
+                    self.fields[key] = value
+
+        # 重放上次快照之后的修改，所有操作都是幂等的
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        op, name, value = json.loads(line)
+                    except ValueError:
+                        continue  # 写了一半的最后一行
+                    self._apply(op, name, value)
+                    self._pending += 1
+
+    def _apply(self, op, name, value):
+        if op == 'add':
+            self.sets.setdefault(name, {})[value] = None
+        elif op == 'discard':
+            self.sets.setdefault(name, {}).pop(value, None)
+        elif op == 'set':
+            self.fields[name] = value
+
+    def _log(self, op, name, value):
+        with self._lock:
+            self._apply(op, name, value)
+            if self._journal is None:
+                folder = os.path.dirname(self.journal_file)
+                if folder:
+                    os.makedirs(folder, exist_ok=True)
+                self._journal = open(self.journal_file, 'a', encoding='utf-8')
+            self._journal.write(json.dumps([op, name, value], ensure_ascii=False) + '\n')
+            self._journal.flush()
+            self._pending += 1
+            if self._pending >= self.snapshot_every:
+                self.snapshot()
+
+    def contains(self, name, value):
+        return value in self.sets[name]
+
+    def add(self, name, value):
+        """加入集合，返回是否为新元素"""
+        if value in self.sets[name]:
+            return False
+        self._log('add', name, value)
+        return True
+
+    def discard(self, name, value):
+        if value in self.sets[name]:
+            self._log('discard', name, value)
+
+    def get(self, key, default=None):
+        return self.fields.get(key, default)
+
+    def set(self, key, value):
+        if self.fields.get(key) != value:
+            self._log('set', key, value)
+
+    def view(self, name=ITEMS):
+        """返回一个可以当作 set 使用的视图，修改会自动写入日志"""
+        return ProgressSet(self, name)
+
+    def size(self, name):
+        return len(self.sets[name])
+
+    def values(self, name):
+        return iter(self.sets[name])
+
+    def to_data(self):
+        """按进度文件原来的格式返回全部进度"""
+        if self.list_layout:
+            return list(self.sets[ITEMS])
+        data = dict(self.fields)
+        for name, values in self.sets.items():
+            data[name] = list(values)
+        return data
+
+    def snapshot(self):
+        """重写进度文件并清空日志"""
+        with self._lock:
+            tmp_path = self.progress_file + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_data(), f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, self.progress_file)
+            if self._journal is not None:
+                self._journal.close()
+            # 以 'w' 重新打开即清空日志
+            self._journal = open(self.journal_file, 'w', encoding='utf-8')
+            self._pending = 0
+
+    def flush(self):
+        if self._journal is not None:
+            self._journal.flush()
+
+    def close(self):
+        with self._lock:
+            if self._pending:
+                self.snapshot()
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+
+class ProgressSet:
+    """ProgressStore 中一个集合的 set 风格视图"""
+
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+
+    def __contains__(self, value):
+        return self.store.contains(self.name, value)
+
+    def __len__(self):
+        return self.store.size(self.name)
+
+    def __iter__(self):
+        return iter(self.store.values(self.name))
+
+    def add(self, value):
+        return self.store.add(self.name, value)
+
+    def discard(self, value):
+        self.store.discard(self.name, value)
+
+
+def open_progress_store(progress_file, sets=(ITEMS,), fields=None, db=None):
+    """创建进度记录，db 不为 None 时保存在 SQLite 中（以文件名区分），第一次使用时导入已有的进度文件"""
+    if db is None:
+        return ProgressStore(progress_file, sets=sets, fields=fields)
+    from src.sqlite_store import SqliteProgressStore
+    return SqliteProgressStore(db, os.path.basename(progress_file), sets=sets, fields=fields, import_file=progress_file)
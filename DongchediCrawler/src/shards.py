@@ -0,0 +1,358 @@
+# shards.py
+
+import json
+import os
+import re
+import zlib
+from collections import OrderedDict
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional, only needed for compression = 'zstd'
+    zstandard = None
+
+from src.storage import PostStore, JsonlPostStore, read_legacy_json
+
+
+MANIFEST_FILE = 'manifest.json'
+EXTENSIONS = {'gzip': '.jsonl.gz', 'zstd': '.jsonl.zst'}
+_SHARD_NAME = re.compile(r'^part-(\d+)\.jsonl\.(gz|zst)$')
+_CHUNK_SIZE = 1 << 20
+_ERRORS = (zlib.error,) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+def _compressor(compression, level=None):
+    """返回 (compress(data), sync(), finish())，sync 之后已写出的数据可以单独解压"""
+    if compression == 'gzip':
+        c = zlib.compressobj(6 if level is None else level, zlib.DEFLATED, 31)
+        return c.compress, lambda: c.flush(zlib.Z_SYNC_FLUSH), c.flush
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError("zstd 压缩需要 zstandard，请先运行 pip install zstandard，或改用 gzip")
+        c = zstandard.ZstdCompressor(level=3 if level is None else level).compressobj()
+        return c.compress, lambda: c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK), c.flush
+    raise ValueError(f"未知的压缩方式: {compression}")
+
+
+def _decompressor(compression):
+    if compression == 'gzip':
+        return zlib.decompressobj(31)
+    if zstandard is None:
+        raise ValueError("读取 .zst 分片需要 zstandard，请先运行 pip install zstandard")
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+def iter_shard_records(path):
+    """逐行读取一个分片，返回 (分组, 帖子)
+
+    崩溃时还没写完的分片没有结尾标记，只读出最后一次 sync 之前的完整行。
+    """
+    compression = 'gzip' if path.endswith('.gz') else 'zstd'
+    decompressor = _decompressor(compression)
+    pending = b''
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            try:
+                data = decompressor.decompress(chunk)
+            except _ERRORS as e:
+                print(f"分片损坏，只读取前面的记录: {path}: {e}")
+                break
+            lines = (pending + data).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record.get('group'), record.get('post') or {}
+            if compression == 'gzip' and decompressor.eof:
+                break
+
+
+def read_manifest(folder):
+    """读取分片目录的清单，不存在时返回 None"""
+    try:
+        with open(os.path.join(folder, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class _Shard:
+    """正在写入的分片，ids 为已写入的帖子 id，drop 为已被其他分片中更新的一份取代的 id"""
+
+    def __init__(self, path, entry, compression, level):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.entry = entry
+        self.ids = set()
+        self.duplicates = False  # 同一 id 写入了不止一次
+        self.drop = set()
+        self._file = open(path, 'wb')
+        self._compress, self._sync, self._finish = _compressor(compression, level)
+
+    def write(self, data):
+        self._file.write(self._compress(data))
+        self.entry['bytes'] = self._file.tell()
+
+    def sync(self):
+        self._file.write(self._sync())
+        self._file.flush()
+        self.entry['bytes'] = self._file.tell()
+
+    def close(self):
+        self._file.write(self._finish())
+        self._file.close()
+        self.entry['bytes'] = os.path.getsize(self.path)
+
+
+class ShardedPostStore(PostStore):
+    """压缩的、按大小或条数轮换的 JSONL 分片
+
+    每个分片只包含一个分组（社区/酒店）的帖子，每行 {"group": ..., "post": ...}，与 JSONL 日志相同。
+    分片写满 max_bytes 字节（压缩后）或 max_records 条后关闭，同一分组接着写下一个分片；
+    同时打开的分片超过 max_open 个时关闭最久没有写入的一个。每次 flush 做一次压缩流的 sync，
+    已保存的帖子在崩溃后仍然可以读出。
+
+    清单 manifest.json 按分片序号列出每个已关闭分片的站点、分组、帖子时间范围和记录数，
+    下游可以直接按清单并行处理。同一帖子以序号最大的分片中的为准：分片关闭时只保留每个帖子的最后一份，
+    records 就是分片中不同帖子的数量；在之后的分片中有更新的一份的帖子 id 列在 superseded 中，
+    下游跳过这些 id 即可。上次崩溃时没有关闭的分片在下次打开时补上结尾并加入清单。
+    同一目录只能由一个进程写入。
+
+    Args:
+        folder (str): 分片目录
+        site (str): 站点名，写入清单
+        compression (str): 'gzip' 或 'zstd'（需要 zstandard）
+        max_bytes (int): 单个分片压缩后的大小上限
+        max_records (int): 单个分片的记录数上限
+    """
+
+    def __init__(self, folder, site, id_field='url', compression='gzip', max_bytes=64 * 1024 * 1024,
+                 max_records=10000, max_open=8, level=None):
+        if compression not in EXTENSIONS:
+            raise ValueError(f"未知的压缩方式: {compression}")
+        self.folder = folder
+        self.site = site
+        self.id_field = id_field
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.max_records = max_records
+        self.max_open = max(1, max_open)
+        self.level = level
+        self._open_shards = OrderedDict()  # group -> _Shard，最近写入的在最后
+        self._where = None  # post_id -> 保存最新一份的分片文件名，第一次写入前扫描已有分片建立
+        self._manifest_changed = False  # 已关闭分片的 superseded 有变化，下次 flush 时写入清单
+        os.makedirs(folder, exist_ok=True)
+        manifest = read_manifest(folder)
+        self.exists = manifest is not None
+        self.shards = manifest['shards'] if manifest else []
+        self._recover()
+
+    def _recover(self):
+        """把目录中不在清单里的分片（上次崩溃时正在写入）补全并加入清单"""
+        listed = {entry['file'] for entry in self.shards}
+        orphans = sorted(name for name in os.listdir(self.folder) if _SHARD_NAME.match(name) and name not in listed)
+        for name in orphans:
+            entry = self._rewrite(name)
+            if entry is None:
+                os.remove(os.path.join(self.folder, name))
+                continue
+            self.shards.append(entry)
+            print(f"已恢复未关闭的分片 {os.path.join(self.folder, name)}，{entry['records']} 条记录。")
+        if orphans:
+            self.shards.sort(key=lambda entry: entry['file'])
+            self._write_manifest()
+
+    def _rewrite(self, name, drop=()):
+        """重写一个分片：每个帖子只保留最后一份并去掉 drop 中的 id，同时补全压缩流的结尾
+
+        返回重新统计的清单条目，分片中没有剩下的记录时返回 None。
+        """
+        path = os.path.join(self.folder, name)
+        last = {}
+        for position, (group, post) in enumerate(iter_shard_records(path)):
+            post_id = post.get(self.id_field)
+            if post_id is not None:
+                last[post_id] = position
+        tmp_path = path + '.tmp'
+        compress, _, finish = _compressor('gzip' if name.endswith('.gz') else 'zstd', self.level)
+        entry = self._new_entry(name, None)
+        with open(tmp_path, 'wb') as f:
+            for position, (group, post) in enumerate(iter_shard_records(path)):
+                post_id = post.get(self.id_field)
+                if post_id is not None and (last[post_id] != position or post_id in drop):
+                    continue
+                entry['community'] = group
+                f.write(compress(self._encode(group, post)))
+                self._count(entry, post)
+            f.write(finish())
+        if not entry['records']:
+            os.remove(tmp_path)
+            return None
+        os.replace(tmp_path, path)
+        entry['bytes'] = os.path.getsize(path)
+        return entry
+
+    def _new_entry(self, name, group):
+        return {'file': name, 'site': self.site, 'community': group, 'records': 0, 'bytes': 0,
+                'start': None, 'end': None, 'superseded': []}
+
+    @staticmethod
+    def _count(entry, post):
+        entry['records'] += 1
+        timestamp = post.get('timestamp')
+        if isinstance(timestamp, int):
+            entry['start'] = timestamp if entry['start'] is None else min(entry['start'], timestamp)
+            entry['end'] = timestamp if entry['end'] is None else max(entry['end'], timestamp)
+
+    @staticmethod
+    def _encode(group, post):
+        return (json.dumps({'group': group, 'post': post}, ensure_ascii=False) + '\n').encode('utf-8')
+
+    def _write_manifest(self):
+        tmp_path = os.path.join(self.folder, MANIFEST_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'site': self.site, 'shards': self.shards}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, os.path.join(self.folder, MANIFEST_FILE))
+        self.exists = True
+        self._manifest_changed = False
+
+    def _next_name(self):
+        numbers = [int(_SHARD_NAME.match(entry['file']).group(1)) for entry in self.shards]
+        numbers += [int(_SHARD_NAME.match(shard.name).group(1)) for shard in self._open_shards.values()]
+        return f"part-{max(numbers, default=0) + 1:05d}{EXTENSIONS[self.compression]}"
+
+    def _shard(self, group):
+        shard = self._open_shards.get(group)
+        if shard is not None:
+            self._open_shards.move_to_end(group)
+            return shard
+        if len(self._open_shards) >= self.max_open:
+            self._close_shard(next(iter(self._open_shards)))
+        name = self._next_name()
+        shard = _Shard(os.path.join(self.folder, name), self._new_entry(name, group), self.compression, self.level)
+        self._open_shards[group] = shard
+        return shard
+
+    def _close_shard(self, group):
+        shard = self._open_shards.pop(group)
+        shard.close()
+        entry = shard.entry
+        if shard.duplicates or shard.drop:
+            entry = self._rewrite(shard.name, shard.drop)
+            if entry is None:
+                os.remove(shard.path)
+                self._write_manifest()
+                return
+        self.shards.append(entry)
+        self.shards.sort(key=lambda entry: entry['file'])
+        self._write_manifest()
+
+    def _scan(self):
+        """按序号读取所有已关闭的分片，同时重建 id 索引和各分片的 superseded"""
+        where = {}
+        superseded = {entry['file']: {} for entry in self.shards}
+        for entry in self.shards:
+            for group, post in iter_shard_records(os.path.join(self.folder, entry['file'])):
+                post_id = post.get(self.id_field)
+                if post_id is not None:
+                    old = where.get(post_id)
+                    if old is not None and old != entry['file']:
+                        superseded[old][post_id] = None
+                    where[post_id] = entry['file']
+                yield group, post
+        changed = False
+        for entry in self.shards:
+            ids = list(superseded[entry['file']])
+            if entry.get('superseded') != ids:
+                entry['superseded'] = ids
+                changed = True
+        self._where = where
+        if changed:
+            self._write_manifest()
+
+    def _supersede(self, post_id, name):
+        """post_id 有了更新的一份，在原来所在的分片中标记"""
+        for shard in self._open_shards.values():
+            if shard.name == name:
+                shard.drop.add(post_id)
+                return
+        for entry in self.shards:
+            if entry['file'] == name:
+                superseded = entry.setdefault('superseded', [])
+                if post_id not in superseded:
+                    superseded.append(post_id)
+                    self._manifest_changed = True
+                return
+
+    def load(self):
+        self.close()
+        posts = {}
+        index = {}  # post_id -> (group, position)
+        for group, post in self._scan():
+            post_id = post.get(self.id_field)
+            if post_id is not None and post_id in index:
+                old_group, position = index[post_id]
+                if old_group == group:
+                    posts[group][position] = post
+                    continue
+                posts[old_group][position] = None
+            group_posts = posts.setdefault(group, [])
+            if post_id is not None:
+                index[post_id] = (group, len(group_posts))
+            group_posts.append(post)
+        return {group: [p for p in group_posts if p is not None] for group, group_posts in posts.items()}
+
+    def append(self, group, post):
+        if self._where is None:
+            for _ in self._scan():
+                pass
+        shard = self._shard(group)
+        post_id = post.get(self.id_field)
+        if post_id is not None:
+            if post_id in shard.ids:
+                shard.duplicates = True
+            shard.ids.add(post_id)
+            shard.drop.discard(post_id)
+            old = self._where.get(post_id)
+            if old is not None and old != shard.name:
+                self._supersede(post_id, old)
+            self._where[post_id] = shard.name
+        shard.write(self._encode(group, post))
+        self._count(shard.entry, post)
+        if shard.entry['records'] >= self.max_records or shard.entry['bytes'] >= self.max_bytes:
+            self._close_shard(group)
+
+    def flush(self):
+        for group, shard in list(self._open_shards.items()):
+            shard.sync()
+            if shard.entry['bytes'] >= self.max_bytes:
+                self._close_shard(group)
+        if self._manifest_changed:
+            self._write_manifest()
+
+    def close(self):
+        for group in list(self._open_shards):
+            self._close_shard(group)
+
+    def import_legacy(self, json_file, jsonl_file, group_field=None):
+        """目录还没有清单时导入旧的 JSONL 日志（不存在时导入 JSON 文件）"""
+        if self.exists:
+            return
+        if os.path.exists(jsonl_file):
+            posts = JsonlPostStore(jsonl_file, id_field=self.id_field).load()
+        else:
+            posts = read_legacy_json(json_file, group_field)
+        count = 0
+        for group, group_posts in posts.items():
+            for post in group_posts:
+                self.append(group, post)
+                count += 1
+            # 每个分组导入完就关闭分片，不必等到同时打开的分片过多
+            if group in self._open_shards:
+                self._close_shard(group)
+        self._write_manifest()
+        if count:
+            print(f"已将 {count} 个帖子导入 {self.folder}")
@@ -0,0 +1,197 @@
+# time_parser.py
+
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+
+# 所有支持的格式合并成一个预编译的正则，一次扫描即可确定格式
+_TIME_PATTERN = re.compile(r"""
+    (?P<just_now>刚刚)
+  | (?P<minutes>\d+)\s*分钟前
+  | (?P<hours>\d+)\s*小时前
+  | (?P<relative_day>昨天|前天)\s*(?:(?P<rd_hour>\d{1,2}):(?P<rd_minute>\d{1,2}))?
+  | (?P<days>\d+)\s*天前
+  | (?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})
+        (?:\s+(?P<hour>\d{1,2}):(?P<minute>\d{1,2})(?::(?P<second>\d{1,2}))?)?
+  | (?P<md_month>\d{1,2})-(?P<md_day>\d{1,2})
+        (?:\s+(?P<md_hour>\d{1,2}):(?P<md_minute>\d{1,2}))?
+""", re.VERBOSE)
+
+# 绝对时间的解析结果与参考时间无关，可以在所有页面之间共享
+_absolute_cache = {}
+_CACHE_LIMIT = 10000
+
+
+class TimeParser:
+    """把三个站点上出现的各种时间字符串统一解析为秒级时间戳
+
+    支持 刚刚 / x分钟前 / x小时前 / 昨天 hh:mm / 前天 hh:mm / x天前 / mm-dd [hh:mm] /
+    yyyy-mm-dd [hh:mm[:ss]]。相对时间以 now 为参考，通常每个页面创建一个实例，
+    同一页面上重复出现的字符串只解析一次。字符串中有多个时间时取最后一个。
+
+    Args:
+        now (datetime, optional): 参考时间，默认为创建实例的时刻
+    """
+
+    def __init__(self, now=None):
+        self.now = now or datetime.now()
+        self._cache = {}
+        self.seconds = 0.0  # 累计解析耗时，用于按页面统计
+
+    def parse(self, time_str):
+        """返回 int 时间戳，无法解析时返回 None"""
+        start = time.perf_counter()
+        try:
+            return self._parse(time_str)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def _parse(self, time_str):
+        if not time_str:
+            return None
+        if time_str in self._cache:
+            return self._cache[time_str]
+        if time_str in _absolute_cache:
+            return _absolute_cache[time_str]
+
+        match = None
+        for match in _TIME_PATTERN.finditer(time_str):
+            pass
+        timestamp, absolute = self._convert(match) if match else (None, True)
+
+        if absolute:
+            if len(_absolute_cache) >= _CACHE_LIMIT:
+                _absolute_cache.clear()
+            _absolute_cache[time_str] = timestamp
+        else:
+            self._cache[time_str] = timestamp
+        return timestamp
+
+    def _convert(self, match):
+        """返回 (时间戳, 是否与参考时间无关)"""
+        groups = match.groupdict()
+        absolute = groups['year'] is not None
+        now = self.now
+        try:
+            if groups['just_now']:
+                return int(now.timestamp()), False
+            if groups['minutes']:
+                return int((now - timedelta(minutes=int(groups['minutes']))).timestamp()), False
+            if groups['hours']:
+                return int((now - timedelta(hours=int(groups['hours']))).timestamp()), False
+            if groups['relative_day']:
+                days = 1 if groups['relative_day'] == '昨天' else 2
+                dt = (now - timedelta(days=days)).replace(
+                    hour=int(groups['rd_hour'] or 0), minute=int(groups['rd_minute'] or 0), second=0, microsecond=0)
+                return int(dt.timestamp()), False
+            if groups['days']:
+                return int((now - timedelta(days=int(groups['days']))).timestamp()), False
+            if absolute:
+                dt = datetime(int(groups['year']), int(groups['month']), int(groups['day']),
+                              int(groups['hour'] or 0), int(groups['minute'] or 0), int(groups['second'] or 0))
+                return int(dt.timestamp()), True
+            if groups['md_month']:
+                dt = now.replace(month=int(groups['md_month']), day=int(groups['md_day']),
+                                 hour=int(groups['md_hour'] or 0), minute=int(groups['md_minute'] or 0),
+                                 second=0, microsecond=0)
+                # 没有年份的日期如果比现在还晚，说明是去年的
+                if dt > now:
+                    dt = dt.replace(year=dt.year - 1)
+                return int(dt.timestamp()), False
+        except ValueError:
+            # 例如 02-30 这样的非法日期
+            pass
+        return None, absolute
+
+
+def parse_time(time_str, now=None):
+    """不需要复用实例时的便捷函数"""
+    return TimeParser(now).parse(time_str)
+
+
+def check_caches(now):
+    """检查两级缓存：相对时间只进实例缓存，绝对时间进共享缓存，共享缓存满了清空后仍然解析正确，返回失败项数"""
+    failed = 0
+
+    def check(label, ok):
+        nonlocal failed
+        failed += not ok
+        print(f"{'OK' if ok else 'FAIL'} {label}")
+
+    # 相对时间（包括没有年份的 mm-dd）依赖参考时间，只能在同一个实例内复用
+    parser = TimeParser(now)
+    later = TimeParser(now + timedelta(hours=1))
+    for time_str in ('5分钟前', '昨天 08:30', '03-01'):
+        parser.parse(time_str)
+        check(f"{time_str!r} 只进实例缓存", time_str in parser._cache and time_str not in _absolute_cache)
+    check("新实例按自己的参考时间解析相对时间",
+          later.parse('5分钟前') == int((now + timedelta(minutes=55)).timestamp()) != parser.parse('5分钟前'))
+    check("mm-dd 跨年时按新实例的参考时间解析",
+          TimeParser(datetime(2025, 1, 15)).parse('03-01') == int(datetime(2024, 3, 1).timestamp())
+          and parser.parse('03-01') == int(datetime(2025, 3, 1).timestamp()))
+
+    # 绝对时间和无法解析的字符串与参考时间无关，所有实例共享
+    for time_str in ('发表于 2024-5-1 9:07', '无时间戳'):
+        parser.parse(time_str)
+        check(f"{time_str!r} 进共享缓存", time_str in _absolute_cache and time_str not in parser._cache)
+    check("共享缓存的结果在其他实例中可用", later.parse('发表于 2024-5-1 9:07') == parser.parse('发表于 2024-5-1 9:07'))
+
+    # 共享缓存达到上限后清空，之后的字符串照常解析和缓存
+    _absolute_cache.clear()
+    for i in range(_CACHE_LIMIT):
+        parser.parse(f"#{i} 2024-05-01 12:34:56")
+    check(f"共享缓存填满 {_CACHE_LIMIT} 条", len(_absolute_cache) == _CACHE_LIMIT)
+    result = parser.parse('发布于 2023-12-31 23:59:59')
+    check("超过上限时清空共享缓存", list(_absolute_cache) == ['发布于 2023-12-31 23:59:59'])
+    check("清空后解析结果正确", result == int(datetime(2023, 12, 31, 23, 59, 59).timestamp()))
+    check("清空前缓存过的字符串重新解析正确",
+          parser.parse('#0 2024-05-01 12:34:56') == int(datetime(2024, 5, 1, 12, 34, 56).timestamp())
+          and len(_absolute_cache) == 2)
+    return failed
+
+
+def main():
+    now = datetime(2025, 3, 15, 12, 0, 0)
+    parser = TimeParser(now)
+    test_table = [
+        ('刚刚', now),
+        ('5分钟前', now - timedelta(minutes=5)),
+        ('3 小时前', now - timedelta(hours=3)),
+        ('昨天 08:30', datetime(2025, 3, 14, 8, 30)),
+        ('前天 23:05', datetime(2025, 3, 13, 23, 5)),
+        ('3 天前', now - timedelta(days=3)),
+        ('03-01', datetime(2025, 3, 1)),
+        ('12-31', datetime(2024, 12, 31)),
+        ('2024-05-01', datetime(2024, 5, 1)),
+        ('发表于 2024-5-1 9:07', datetime(2024, 5, 1, 9, 7)),
+        ('发布于 2024-05-01 12:34:56', datetime(2024, 5, 1, 12, 34, 56)),
+        ('5小时前回复', now - timedelta(hours=5)),
+        ('无时间戳', None),
+    ]
+    failed = 0
+    for time_str, expected in test_table:
+        expected = int(expected.timestamp()) if expected else None
+        result = parser.parse(time_str)
+        status = 'OK' if result == expected else 'FAIL'
+        failed += status == 'FAIL'
+        print(f"{status} {time_str!r}: {result} (期望 {expected})")
+    failed += check_caches(now)
+
+    # micro-benchmark：每 50 条（约一页）新建一个实例，与一直复用同一个实例对比
+    strings = [s for s, _ in test_table] * 1000
+    for label, make_parser in (('每页新实例', lambda: TimeParser(now)), ('同一实例', lambda: parser)):
+        start_time = time.perf_counter()
+        for i in range(0, len(strings), 50):
+            page_parser = make_parser()
+            for time_str in strings[i:i + 50]:
+                page_parser.parse(time_str)
+        elapsed = time.perf_counter() - start_time
+        print(f"{label}: 解析 {len(strings)} 条用时 {elapsed * 1000:.1f} 毫秒")
+    return failed
+
+
+if __name__ == "__main__":
+    if main():
+        sys.exit("有时间解析检查未通过")
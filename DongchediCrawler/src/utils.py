@@ -1,89 +1,9 @@
 # utils.py
 
-import json
 import os
 import pickle
 import time
 import random
-from datetime import datetime, timedelta
-import re
-
-
-def parse_time_string(time_str):
-    # 去除结尾的“回复”
-    time_str = time_str.strip().rstrip("回复").strip()
-
-    now = datetime.now()
-
-    # 匹配 "刚刚"
-    if time_str == "刚刚":
-        return int((now - timedelta(minutes=1)).timestamp())
-
-    # 匹配 x分钟前
-    minute_match = re.search(r'(\d+)分钟前', time_str)
-    if minute_match:
-        minutes_ago = int(minute_match.group(1))
-        return int((now - timedelta(minutes=minutes_ago)).timestamp())
-
-    # 匹配 x小时前
-    hour_match = re.search(r'(\d+)小时前', time_str)
-    if hour_match:
-        hours_ago = int(hour_match.group(1))
-        return int((now - timedelta(hours=hours_ago)).timestamp())
-
-    # 匹配 昨天 hh:mm
-    yesterday_match = re.search(r'昨天 (\d{2}:\d{2})', time_str)
-    if yesterday_match:
-        hour, minute = map(int, yesterday_match.group(1).split(':'))
-        yesterday = (now - timedelta(days=1)).replace(hour=hour, minute=minute, second=0, microsecond=0)
-        return int(yesterday.timestamp())
-
-    # 匹配 前天 hh:mm
-    day_before_yesterday_match = re.search(r'前天 (\d{2}:\d{2})', time_str)
-    if day_before_yesterday_match:
-        hour, minute = map(int, day_before_yesterday_match.group(1).split(':'))
-        day_before = (now - timedelta(days=2)).replace(hour=hour, minute=minute, second=0, microsecond=0)
-        return int(day_before.timestamp())
-
-    # 匹配 x天前
-    day_match = re.search(r'(\d+)天前', time_str)
-    if day_match:
-        days_ago = int(day_match.group(1))
-        return int((now - timedelta(days=days_ago)).timestamp())
-
-    # 匹配 mm-dd
-    md_match = re.search(r'(\d{2})-(\d{2})', time_str)
-    if md_match:
-        month, day = map(int, md_match.groups())
-        try:
-            dt = now.replace(month=month, day=day, hour=0, minute=0, second=0, microsecond=0)
-            # 如果日期比现在还大（比如12月解析成当前年份的1月），则自动减一年
-            if dt > now:
-                dt = dt.replace(year=dt.year - 1)
-            return int(dt.timestamp())
-        except ValueError:
-            pass  # 比如 02-30 是非法日期
-
-    # 匹配 yyyy-mm-dd
-    ymd_match = re.search(r'(\d{4}-\d{2}-\d{2})', time_str)
-    if ymd_match:
-        try:
-            dt = datetime.strptime(ymd_match.group(1), "%Y-%m-%d")
-            return int(dt.timestamp())
-        except ValueError:
-            pass
-
-    # 匹配 yyyy-mm-dd HH:MM:SS
-    ymdhms_match = re.search(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})', time_str)
-    if ymdhms_match:
-        try:
-            dt = datetime.strptime(ymdhms_match.group(1), "%Y-%m-%d %H:%M:%S")
-            return int(dt.timestamp())
-        except ValueError:
-            pass
-
-    # 都不匹配就返回原字符串
-    return time_str
 
 
 def save_cookies(driver, cookies_file):
@@ -110,35 +30,82 @@ def manual_login(driver, cookies_file, user_profile_url):
     print("程序正在继续运行")
 
 
-def scroll_to_bottom(driver, wait_time=2):
-    """渐进式滚动到页面底部，模拟真实用户行为"""
+# 在页面中滚动到底部，并用 MutationObserver / PerformanceObserver 监听 DOM 变化和网络请求，
+# 页面在 quiet 毫秒内既没有 DOM 变化也没有新请求、高度不再增长，或目标元素都已出现时立即返回
+SCROLL_SCRIPT = """
+const [maxWait, quiet, selectors, done] = arguments;
+const start = performance.now();
+let lastChange = start;
+let lastHeight = -1;
+const touch = () => { lastChange = performance.now(); };
+const mutations = new MutationObserver(touch);
+mutations.observe(document.documentElement, {childList: true, subtree: true});
+let resources = null;
+try {
+    resources = new PerformanceObserver(touch);
+    resources.observe({type: 'resource'});
+} catch (e) {}
+function finish(reason) {
+    mutations.disconnect();
+    if (resources) resources.disconnect();
+    done({elapsed: (performance.now() - start) / 1000, reason: reason});
+}
+function tick() {
+    const now = performance.now();
+    const height = document.body.scrollHeight;
+    if (height !== lastHeight) {
+        lastHeight = height;
+        lastChange = now;
+        window.scrollTo(0, height);
+    }
+    if (selectors.length && selectors.every(s => document.querySelector(s))) return finish('selectors');
+    if (now - lastChange >= quiet) return finish('settled');
+    if (now - start >= maxWait) return finish('timeout');
+    setTimeout(tick, 100);
+}
+tick();
+"""
+
+
+def scroll_to_bottom(driver, quiet_time=0.5, max_wait=10, selectors=None):
+    """滚动到页面底部，懒加载内容稳定后立即返回
+
+    Args:
+        driver: webdriver
+        quiet_time (float): 页面连续这么多秒没有 DOM 变化和网络请求即认为加载完成
+        max_wait (float): 最长等待时间（秒）
+        selectors (list, optional): 目标元素的 CSS 选择器，全部出现后立即返回
+
+    Returns:
+        float: 本页实际用于滚动和等待的秒数
+    """
+    start_time = time.perf_counter()
+    try:
+        driver.set_script_timeout(max_wait + 5)
+        result = driver.execute_async_script(SCROLL_SCRIPT, max_wait * 1000, quiet_time * 1000, list(selectors or []))
+        reason = result.get('reason') if result else 'unknown'
+    except Exception as e:
+        print(f"事件驱动滚动失败，改用逐段滚动: {e}")
+        _scroll_step_by_step(driver, max_wait)
+        reason = 'fallback'
+    elapsed = time.perf_counter() - start_time
+    print(f"滚动完成，用时 {elapsed:.2f} 秒 ({reason})。")
+    return elapsed
+
+
+def _scroll_step_by_step(driver, max_wait):
+    """渐进式滚动到页面底部，模拟真实用户行为（浏览器不支持异步脚本时使用）"""
+    deadline = time.perf_counter() + max_wait
     last_height = driver.execute_script("return document.body.scrollHeight")
     
-    while True:
+    while time.perf_counter() < deadline:
         # 滚动一小段距离
         for i in range(3):
             current_height = last_height // 3 * (i + 1)
             driver.execute_script(f"window.scrollTo(0, {current_height});")
             time.sleep(random.uniform(0.5, 1))
             
-        # 等待页面加载
-        time.sleep(wait_time)
-        
         new_height = driver.execute_script("return document.body.scrollHeight")
         if new_height == last_height:
             break
         last_height = new_height
-
-
-def load_progress(progress_file):
-    """加载爬取进度"""
-    if os.path.exists(progress_file):
-        with open(progress_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
-
-
-def save_progress(progress_file, progress_data):
-    """保存爬取进度"""
-    with open(progress_file, 'w', encoding='utf-8') as f:
-        json.dump(progress_data, f, ensure_ascii=False, indent=4) 
\ No newline at end of file
@@ -0,0 +1,350 @@
+# bench_crawlers.py
+#
+# 不访问真实网站的端到端性能测试：用页面缓存（page_cache.py，PAGE_CACHE_MODE = 'record' 时录制）中保存的页面
+# 启动一个本地的假论坛服务器，让三个爬虫通过它抓取，统计每秒页面数、CPU 时间、峰值内存和写入的字节数。
+#
+# 假服务器是一个 HTTP 代理：爬虫的站点 URL 改成 http://，浏览器用 --proxy-server、requests 用 HTTP_PROXY 把请求发给它，
+# 它按原来的 https:// URL 从缓存中取出页面返回，并把页面中的 https:// 链接改成 http://，这样后续请求也会经过它。
+# 每个爬虫在一个空的临时目录下以子进程运行（与 run_all.py 一样，三个项目的 src/config 包不能在同一进程中导入），
+# 请求间隔和随机延时设为 0，网络延时由 --latency/--jitter 模拟。
+#
+# 用法: python bench_crawlers.py [site ...] [--latency 秒] [--jitter 秒] [--output 结果.json]
+#                                [--baseline 上次结果.json] [--tolerance 0.2]
+# 指定 --baseline 时，任何站点的每秒页面数比基线低 tolerance 以上就以退出码 1 结束。
+
+import argparse
+import json
+import os
+import pickle
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# site name -> (project directory, page cache directory inside the project)
+CRAWLERS = {
+    'autohome': ('AutohomeCrawler', 'data/page_cache'),
+    'dongchedi': ('DongchediCrawler', 'data/page_cache'),
+    'flyert': ('flyertCrawler', 'data/page_cache'),
+}
+
+# 子进程在最后一行输出的结果前缀
+RESULT_PREFIX = 'BENCH_RESULT '
+
+
+def to_http(value):
+    """把设置中的 https:// URL 改成 http://，让请求经过假服务器"""
+    if isinstance(value, str):
+        return value.replace('https://', 'http://')
+    if isinstance(value, dict):
+        return {key: to_http(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_http(item) for item in value]
+    return value
+
+
+class FakeForumServer(ThreadingHTTPServer):
+    """从页面缓存回放录制页面的本地 HTTP 代理
+
+    Args:
+        cache: PageCache 实例，按原始 https:// URL 取页面
+        latency (float): 每个请求返回前等待的秒数
+        jitter (float): 在 latency 之上再随机等待 0~jitter 秒
+    """
+
+    daemon_threads = True
+
+    def __init__(self, cache, latency=0.0, jitter=0.0):
+        super().__init__(('127.0.0.1', 0), FakeForumHandler)
+        self.cache = cache
+        self.latency = latency
+        self.jitter = jitter
+        self.hits = 0
+        self.misses = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+    @property
+    def proxy_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = self.bytes_sent = 0
+
+    def lookup(self, url):
+        """按原始 URL 取缓存页面，返回 (bytes, content_type)，没有时返回 None"""
+        for candidate in (url.replace('http://', 'https://', 1), url):
+            body = self.cache.get(candidate)
+            if body is None:
+                continue
+            if isinstance(body, str):
+                return body.replace('https://', 'http://').encode('utf-8'), 'text/html; charset=utf-8'
+            # HTTP 响应体保持原来的编码，由页面的 meta 声明
+            return body.replace(b'https://', b'http://'), 'text/html'
+        return None
+
+    def record(self, hit, size=0):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.bytes_sent += size
+
+
+class FakeForumHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        # 代理请求的 path 是完整 URL，直接请求时用 Host 头拼出来
+        url = self.path if self.path.startswith('http') else f"http://{self.headers.get('Host', '')}{self.path}"
+        time.sleep(self.server.latency + random.uniform(0, self.server.jitter))
+        page = self.server.lookup(url)
+        if page is None:
+            self.server.record(False)
+            self.send_error(404)
+            return
+        body, content_type = page
+        self.server.record(True, len(body))
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def load_page_cache(site):
+    """只读地打开站点项目中录制的页面缓存"""
+    sys.path.insert(0, os.path.join(ROOT, 'flyertCrawler'))
+    from page_cache import PageCache
+    folder, cache_dir = CRAWLERS[site]
+    return PageCache(os.path.join(ROOT, folder, cache_dir), 'replay')
+
+
+def directory_size(path, exclude=('chrome_profiles',)):
+    total = 0
+    for folder, dirs, files in os.walk(path):
+        dirs[:] = [name for name in dirs if name not in exclude]
+        total += sum(os.path.getsize(os.path.join(folder, name)) for name in files)
+    return total
+
+
+def run_site(site, server):
+    """在临时目录下以子进程运行一个爬虫，返回这个站点的测试结果"""
+    server.reset()
+    work_dir = tempfile.mkdtemp(prefix=f'bench-{site}-')
+    try:
+        start_time = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, '-u', os.path.abspath(__file__), '--child', site, '--proxy', server.proxy_url],
+            cwd=work_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        )
+        usage = {}
+        for line in process.stdout:
+            line = line.decode('utf-8', errors='replace').rstrip()
+            if line.startswith(RESULT_PREFIX):
+                usage = json.loads(line[len(RESULT_PREFIX):])
+            else:
+                print(f"[{site}] {line}")
+        return_code = process.wait()
+        elapsed = time.perf_counter() - start_time
+        return {
+            'site': site,
+            'return_code': return_code,
+            'seconds': round(elapsed, 2),
+            'pages': server.hits,
+            'misses': server.misses,
+            'pages_per_sec': round(server.hits / elapsed, 3) if elapsed else 0,
+            'bytes_served': server.bytes_sent,
+            'bytes_written': directory_size(work_dir),
+            **usage,
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def print_results(results):
+    for r in results:
+        peak = r.get('peak_rss_mb')
+        print(f"{r['site']}: {r['pages']} 个页面（未命中 {r['misses']}），{r['pages_per_sec']:.2f} 页/秒，"
+              f"CPU {r.get('cpu_seconds', 0):.1f} 秒，峰值内存 {peak if peak is not None else '-'} MB"
+              f"（子进程 {r.get('children_peak_rss_mb', '-')} MB），写入 {r['bytes_written'] / 1024:.0f} KB，"
+              f"耗时 {r['seconds']:.1f} 秒，退出码 {r['return_code']}")
+
+
+def compare_baseline(results, baseline_file, tolerance):
+    """返回每秒页面数比基线低 tolerance 以上的站点"""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = {r['site']: r for r in json.load(f)['results']}
+    regressions = []
+    for r in results:
+        base = baseline.get(r['site'])
+        if not base or not base.get('pages_per_sec'):
+            continue
+        change = r['pages_per_sec'] / base['pages_per_sec'] - 1
+        print(f"{r['site']}: 每秒页面数 {base['pages_per_sec']} -> {r['pages_per_sec']} ({change:+.0%})")
+        if change < -tolerance:
+            regressions.append(r['site'])
+    return regressions
+
+
+# ---------------------------------------------------------------------------
+# 子进程：在临时目录中运行一个爬虫
+
+def _patch_settings(settings, folder, proxy):
+    """Autohome/Dongchedi：在导入爬虫之前修改设置模块"""
+    settings.COMMUNITIES = to_http(settings.COMMUNITIES)
+    settings.USER_PROFILE_URL = to_http(settings.USER_PROFILE_URL)
+    settings.BASE_URL = to_http(settings.BASE_URL)
+    settings.CHROME_OPTIONS = settings.CHROME_OPTIONS + [f'--proxy-server={proxy}', '--headless=new']
+    # 回复页和评论接口通过 requests 请求
+    os.environ['HTTP_PROXY'] = os.environ['http_proxy'] = proxy
+    settings.RANDOM_DELAY_RANGE = (0, 0)
+    settings.MIN_REQUEST_INTERVAL = 0
+    settings.PAGE_CACHE_MODE = 'off'
+    # Fresh browser profile, but reuse the project's resolved chromedriver
+    settings.BROWSER_PROFILE_DIR = None
+    settings.DRIVER_CACHE_FILE = os.path.join(folder, settings.DRIVER_CACHE_FILE)
+    with open(settings.COOKIES_FILE, 'wb') as f:
+        pickle.dump([], f)
+
+
+def _bench_autohome(folder, proxy):
+    from config import settings
+    _patch_settings(settings, folder, proxy)
+    from src.crawler import AutohomeCrawler
+    AutohomeCrawler().run(scrape_links=True, scrape_details=True)
+
+
+def _bench_dongchedi(folder, proxy):
+    from config import settings
+    _patch_settings(settings, folder, proxy)
+    from src.crawler import DongchediCrawler
+    DongchediCrawler().run()
+
+
+def _bench_flyert(folder, proxy):
+    # requests 从环境变量读取代理
+    os.environ['HTTP_PROXY'] = os.environ['http_proxy'] = proxy
+    import flyert_crawl
+    from driver_setup import start_chrome, DRIVER_CACHE_FILE
+
+    # 只抓取项目链接文件中已录制的文章
+    recorded = set(load_page_cache('flyert').urls())
+    with open(os.path.join(folder, flyert_crawl.LINKS_FILE), 'r', encoding='utf-8') as f:
+        hotel_links = [{'hotel': item['hotel'], 'links': [to_http(link) for link in item['links'] if link in recorded]}
+                       for item in json.load(f)]
+    flyert_crawl.save_hotel_links(hotel_links)
+    with open(flyert_crawl.cookies_file, 'wb') as f:
+        pickle.dump([], f)
+
+    flyert_crawl.REQUEST_INTERVAL = 0
+    flyert_crawl.REQUEST_JITTER = (0, 0)
+    flyert_crawl.REPLY_PAGE_INTERVAL = 0
+    flyert_crawl.REPLY_PAGE_JITTER = (0, 0)
+    chrome_options = flyert_crawl.create_chrome_options()
+    chrome_options.add_argument(f'--proxy-server={proxy}')
+    chrome_options.add_argument('--headless=new')
+    driver = start_chrome(chrome_options, flyert_crawl.CHROME_DRIVER_URL, os.path.join(folder, DRIVER_CACHE_FILE))
+    try:
+        flyert_crawl.get_all_contents(driver)
+    finally:
+        driver.quit()
+
+
+CHILD_RUNNERS = {
+    'autohome': _bench_autohome,
+    'dongchedi': _bench_dongchedi,
+    'flyert': _bench_flyert,
+}
+
+
+def _usage():
+    """本进程和已退出的子进程（chromedriver、Chrome）的 CPU 时间和峰值内存"""
+    if resource is None:
+        return {'cpu_seconds': round(time.process_time(), 2), 'peak_rss_mb': None}
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = self_usage.ru_utime + self_usage.ru_stime + children.ru_utime + children.ru_stime
+    # ru_maxrss 在 Linux 上是 KB，在 macOS 上是字节
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'cpu_seconds': round(cpu, 2),
+        'peak_rss_mb': round(self_usage.ru_maxrss / scale, 1),
+        'children_peak_rss_mb': round(children.ru_maxrss / scale, 1),
+    }
+
+
+def run_child(site, proxy):
+    folder = os.path.join(ROOT, CRAWLERS[site][0])
+    sys.path.insert(0, folder)
+    os.makedirs('data', exist_ok=True)
+    try:
+        CHILD_RUNNERS[site](folder, proxy)
+    finally:
+        print(RESULT_PREFIX + json.dumps(_usage()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='用本地假论坛服务器测试爬虫的吞吐量')
+    parser.add_argument('sites', nargs='*', help=f"默认全部站点: {', '.join(CRAWLERS)}")
+    parser.add_argument('--latency', type=float, default=0.05, help='每个请求的模拟延时（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='在延时之上的随机延时上限（秒）')
+    parser.add_argument('--output', help='把结果写入 JSON 文件，可作为之后的 --baseline')
+    parser.add_argument('--baseline', help='与之前 --output 保存的结果比较')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='每秒页面数允许下降的比例')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--proxy', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.proxy)
+        return
+
+    sites = args.sites or list(CRAWLERS)
+    unknown = [site for site in sites if site not in CRAWLERS]
+    if unknown:
+        sys.exit(f"未知的站点: {', '.join(unknown)}，可选: {', '.join(CRAWLERS)}")
+
+    results = []
+    for site in sites:
+        cache = load_page_cache(site)
+        if not cache.urls():
+            print(f"{site}: 页面缓存为空，先用 PAGE_CACHE_MODE = 'record' 运行一次爬虫，跳过。")
+            continue
+        server = FakeForumServer(cache, args.latency, args.jitter)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            print(f"{site}: 假服务器 {server.proxy_url}，{len(cache.urls())} 个录制页面，延时 {args.latency} 秒")
+            results.append(run_site(site, server))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'latency': args.latency, 'jitter': args.jitter, 'results': results}, f, ensure_ascii=False, indent=4)
+    if args.baseline:
+        regressions = compare_baseline(results, args.baseline, args.tolerance)
+        if regressions:
+            sys.exit(f"性能下降超过 {args.tolerance:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+# export_columnar.py
+#
+# 把三个爬虫保存的帖子导出为列式文件，供下游分析按列、按分区读取，不必把整个 JSON 读进内存。
+# 每个站点输出两张表：posts（一行一个帖子）和 replies（一行一条回复，以 post_url 关联帖子），
+# 按 Hive 风格分区写到 <输出目录>/<表>/site=<站点>/month=<帖子发布月份>/part-0.<parquet|arrow>，
+# 回复跟随所属帖子的月份分区。用户名、社区/酒店名用字典编码。
+#
+# 帖子从站点当前配置的存储方式（STORAGE_BACKEND）读取，也可以用 --source 指定，不看哪个文件存在，
+# 以免切换存储方式后读到不再更新的旧数据库或分片。sqlite 和 shards 还没有数据时与爬虫一样读 JSONL 日志或旧的 JSON 文件。
+# 数据库按帖子 id 顺序同时遍历 posts 和 replies 两张表；分片按清单顺序、JSONL 逐行流式读取
+# （同一帖子以最后一行为准，第一遍只记录每个 id 的最后行号）；每个分区攒够 --batch-size 行写一个 record batch。
+#
+# 用法: python export_columnar.py [site ...] [--source sqlite|shards|jsonl|json] [--output export]
+#                                 [--format parquet|arrow] [--batch-size 10000]
+# 需要 pyarrow（pip install pyarrow）。
+
+import argparse
+import ast
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, only this script needs it
+    pa = pq = None
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# site name -> (project directory, file with STORAGE_BACKEND, SQLite database, shard directory, JSONL log, legacy JSON file,
+#               post id field, legacy group field)
+SOURCES = {
+    'autohome': ('AutohomeCrawler', 'config/settings.py', 'data/autohome.db', 'data/autohome_shards',
+                 'data/autohome_posts.jsonl', 'data/autohome_posts.json', 'url', None),
+    'dongchedi': ('DongchediCrawler', 'config/settings.py', 'data/dongchedi.db', 'data/dongchedi_shards',
+                  'data/dongchedi_posts.jsonl', 'data/dongchedi_posts.json', 'url', None),
+    'flyert': ('flyertCrawler', 'flyert_crawl.py', 'data/flyert.db', 'data/flyert_shards', 'data/flyert-1.jsonl',
+               'data/flyert-1.json', 'link', 'hotel'),
+}
+BACKENDS = ('sqlite', 'shards', 'jsonl', 'json')
+
+# 各站点共用 flyert 项目中的 storage.py、shards.py 读取日志和分片（与 bench_crawlers.py 一样从 flyertCrawler 导入）
+sys.path.insert(0, os.path.join(ROOT, 'flyertCrawler'))
+from storage import iter_jsonl_records, read_legacy_json
+from shards import iter_shard_records, read_manifest
+
+
+def _schemas():
+    labels = pa.dictionary(pa.int32(), pa.string())
+    posts = pa.schema([
+        ('url', pa.string()),
+        ('group', labels),  # Autohome/Dongchedi 的社区，flyert 的酒店
+        ('timestamp', pa.timestamp('s')),
+        ('username', labels),
+        ('user_link', pa.string()),
+        ('title', pa.string()),
+        ('content', pa.string()),
+        ('reply_count', pa.int32()),
+    ])
+    replies = pa.schema([
+        ('post_url', pa.string()),
+        ('group', labels),
+        ('reply_index', pa.int32()),
+        ('timestamp', pa.timestamp('s')),
+        ('username', labels),
+        ('user_link', pa.string()),
+        ('content', pa.string()),
+    ])
+    return {'posts': posts, 'replies': replies}
+
+
+def _timestamp(value):
+    return value if isinstance(value, int) else None
+
+
+def post_rows(site, group, post, id_field):
+    """把一个帖子转换为 (posts 行, [replies 行])，各站点的字段统一为相同的列"""
+    url = post.get(id_field)
+    if site == 'flyert':
+        author = post.get('author') or {}
+        username, user_link, title = author.get('name'), author.get('link'), post.get('title')
+        replies = [
+            (reply.get('comment_time'), reply.get('commenter_name'), reply.get('commenter_link'), reply.get('comment_content'))
+            for reply in post.get('replies') or []
+        ]
+    else:
+        # Autohome 把标题拼在 content 的第一行，回复没有用户名
+        username, user_link, title = post.get('username'), None, None
+        replies = [(reply.get('timestamp'), None, None, reply.get('content')) for reply in post.get('replies') or []]
+
+    post_row = {
+        'url': url,
+        'group': group,
+        'timestamp': _timestamp(post.get('timestamp')),
+        'username': username,
+        'user_link': user_link,
+        'title': title,
+        'content': post.get('content'),
+        'reply_count': len(replies),
+    }
+    reply_rows = [
+        {
+            'post_url': url,
+            'group': group,
+            'reply_index': i,
+            'timestamp': _timestamp(timestamp),
+            'username': name,
+            'user_link': link,
+            'content': content,
+        }
+        for i, (timestamp, name, link, content) in enumerate(replies)
+    ]
+    return post_row, reply_rows
+
+
+def iter_sqlite_posts(db_path):
+    """按 id 顺序同时遍历 posts 和 replies，逐个返回 (分组, 帖子)"""
+    connection = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        replies = connection.execute('SELECT post_id, data FROM replies ORDER BY post_id, idx')
+        pending = next(replies, None)
+        for post_id, group, data in connection.execute('SELECT id, grp, data FROM posts ORDER BY id'):
+            post = json.loads(data)
+            if post_id is not None:
+                # 回复表中没有对应帖子的行（不应出现）直接跳过
+                while pending is not None and pending[0] < post_id:
+                    pending = next(replies, None)
+                post['replies'] = []
+                while pending is not None and pending[0] == post_id:
+                    post['replies'].append(json.loads(pending[1]))
+                    pending = next(replies, None)
+            yield group, post
+    finally:
+        connection.close()
+
+
+def iter_latest(records, id_field):
+    """records() 返回 (分组, 帖子) 的迭代器，同一 id 只输出最后一份
+
+    第一遍只记录每个 id 最后出现的位置，第二遍按位置输出，内存中只有 id。
+    """
+    last_seen = {}
+    for position, (group, post) in enumerate(records()):
+        post_id = post.get(id_field)
+        if post_id is not None:
+            last_seen[post_id] = position
+    for position, (group, post) in enumerate(records()):
+        post_id = post.get(id_field)
+        if post_id is None or last_seen.get(post_id) == position:
+            yield group, post
+
+
+def iter_shard_posts(shard_dir, manifest):
+    for entry in manifest['shards']:
+        yield from iter_shard_records(os.path.join(shard_dir, entry['file']))
+
+
+def storage_backend(site):
+    """读取站点配置中的 STORAGE_BACKEND（只解析文件，不导入爬虫模块）"""
+    folder, settings_file = SOURCES[site][:2]
+    with open(os.path.join(ROOT, folder, settings_file), 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(target, 'id', None) == 'STORAGE_BACKEND' for target in node.targets):
+            return ast.literal_eval(node.value)
+    return 'jsonl'
+
+
+def iter_posts(site, backend):
+    """逐个返回站点用 backend 保存的 (分组, 帖子)，同一帖子只返回最新的一份"""
+    folder, _, db_file, shard_dir, jsonl_file, json_file, id_field, group_field = SOURCES[site]
+    if backend == 'sqlite':
+        db_path = os.path.join(ROOT, folder, db_file)
+        if os.path.exists(db_path):
+            yield from iter_sqlite_posts(db_path)
+            return
+    if backend == 'shards':
+        shard_path = os.path.join(ROOT, folder, shard_dir)
+        manifest = read_manifest(shard_path)
+        if manifest is not None:
+            yield from iter_latest(lambda: iter_shard_posts(shard_path, manifest), id_field)
+            return
+    # sqlite、shards 还没有数据时，帖子还在爬虫第一次使用它们时才导入的 JSONL 日志或 JSON 文件中
+    jsonl_path = os.path.join(ROOT, folder, jsonl_file)
+    if backend != 'json' and os.path.exists(jsonl_path):
+        yield from iter_latest(lambda: iter_jsonl_records(jsonl_path), id_field)
+        return
+    # 旧的 JSON 文件只能整体读取
+    for group, posts in read_legacy_json(os.path.join(ROOT, folder, json_file), group_field).items():
+        for post in posts:
+            yield group, post
+
+
+def _month(timestamp):
+    return time.strftime('%Y-%m', time.localtime(timestamp)) if timestamp is not None else 'unknown'
+
+
+class PartitionedWriter:
+    """按 (表, 站点, 月份) 分区缓冲行，攒够 batch_size 行写一个 record batch，每个分区一个文件"""
+
+    def __init__(self, output, file_format='parquet', batch_size=10000):
+        self.output = output
+        self.file_format = file_format
+        self.batch_size = batch_size
+        self.schemas = _schemas()
+        self._buffers = {}  # (table, site, month) -> [row, ...]
+        self._writers = {}  # (table, site, month) -> (writer, sink)
+        self.rows = {table: 0 for table in self.schemas}
+
+    def add(self, table, site, month, row):
+        key = (table, site, month)
+        buffer = self._buffers.setdefault(key, [])
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self._write(key)
+
+    def _open(self, key):
+        table, site, month = key
+        folder = os.path.join(self.output, table, f'site={site}', f'month={month}')
+        os.makedirs(folder, exist_ok=True)
+        schema = self.schemas[table]
+        if self.file_format == 'parquet':
+            writer = pq.ParquetWriter(
+                os.path.join(folder, 'part-0.parquet'), schema, compression='zstd',
+                use_dictionary=['group', 'username']
+            )
+            return writer, None
+        sink = pa.OSFile(os.path.join(folder, 'part-0.arrow'), 'wb')
+        return pa.ipc.new_file(sink, schema, options=pa.ipc.IpcWriteOptions(compression='zstd')), sink
+
+    def _write(self, key):
+        rows = self._buffers.pop(key, None)
+        if not rows:
+            return
+        if key not in self._writers:
+            self._writers[key] = self._open(key)
+        writer = self._writers[key][0]
+        writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=self.schemas[key[0]]))
+        self.rows[key[0]] += len(rows)
+
+    def close(self):
+        for key in list(self._buffers):
+            self._write(key)
+        for writer, sink in self._writers.values():
+            writer.close()
+            if sink is not None:
+                sink.close()
+        self._writers = {}
+
+
+def export_site(site, writer, backend):
+    """导出一个站点，返回 (帖子数, 回复数)"""
+    id_field = SOURCES[site][6]
+    post_count = reply_count = 0
+    for group, post in iter_posts(site, backend):
+        post_row, reply_rows = post_rows(site, group, post, id_field)
+        month = _month(post_row['timestamp'])
+        writer.add('posts', site, month, post_row)
+        for reply_row in reply_rows:
+            writer.add('replies', site, month, reply_row)
+        post_count += 1
+        reply_count += len(reply_rows)
+    return post_count, reply_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把帖子和回复导出为按站点和月份分区的 Parquet/Arrow 文件')
+    parser.add_argument('sites', nargs='*', help=f"默认全部站点: {', '.join(SOURCES)}")
+    parser.add_argument('--source', choices=BACKENDS, default=None, help='读取哪种存储，默认为各站点配置的 STORAGE_BACKEND')
+    parser.add_argument('--output', default='export', help='输出目录，其中对应站点的旧分区会先删除')
+    parser.add_argument('--format', choices=('parquet', 'arrow'), default='parquet', help='arrow 为 Arrow IPC（Feather v2）文件')
+    parser.add_argument('--batch-size', type=int, default=10000, help='每个分区攒够多少行写一次')
+    args = parser.parse_args()
+
+    if pa is None:
+        sys.exit("导出需要 pyarrow，请先运行 pip install pyarrow")
+    sites = args.sites or list(SOURCES)
+    unknown = [site for site in sites if site not in SOURCES]
+    if unknown:
+        sys.exit(f"未知的站点: {', '.join(unknown)}，可选: {', '.join(SOURCES)}")
+
+    # 重新导出的站点整个替换，避免留下已经不存在的月份
+    for table in ('posts', 'replies'):
+        for site in sites:
+            shutil.rmtree(os.path.join(args.output, table, f'site={site}'), ignore_errors=True)
+
+    start_time = time.perf_counter()
+    writer = PartitionedWriter(args.output, args.format, args.batch_size)
+    try:
+        for site in sites:
+            backend = args.source or storage_backend(site)
+            if backend not in BACKENDS:
+                sys.exit(f"{site}: 未知的存储方式 {backend!r}")
+            post_count, reply_count = export_site(site, writer, backend)
+            print(f"{site}: 从 {backend} 导出 {post_count} 个帖子，{reply_count} 条回复")
+    finally:
+        writer.close()
+    print(f"已写入 {args.output}/，用时 {time.perf_counter() - start_time:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
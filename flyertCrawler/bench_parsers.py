@@ -0,0 +1,17 @@
+# 在保存的帖子页面上比较各 HTML 解析器的提取结果是否一致以及耗时
+# 用法: python bench_parsers.py [页面文件或目录 ...]，默认使用 samples/ 中保存的页面（也可以传入 error_pages/）
+# 任何解析器的结果与 html.parser 不一致时以退出码 1 结束
+
+import sys
+
+from html_parser import compare_backends, load_pages
+from http_fetch import parse_thread_page
+
+if __name__ == "__main__":
+    pages = load_pages(sys.argv[1:] or ['samples'])
+    url = 'https://www.flyert.com.cn/'
+    # 每个页面分别按首页和回复页解析，回复页只比较回复
+    results = compare_backends(pages, lambda html, backend: (
+        parse_thread_page(html, url, True, backend), parse_thread_page(html, url, False, backend)))
+    if any(mismatches for _, mismatches in results.values()):
+        sys.exit("有解析器的提取结果与 html.parser 不一致")
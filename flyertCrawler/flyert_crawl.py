@@ -1,35 +1,232 @@
-from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+import asyncio
 import json
 import time
+from datetime import datetime
 
 from utils import *
-from webdriver_manager.chrome import ChromeDriverManager
+from time_parser import TimeParser
+from storage import open_post_store
+from sqlite_store import open_database
+from link_index import LinkIndex
+from driver_setup import start_chrome, use_profile
+from resource_policy import TRACKER_PATTERNS, apply_resource_policy, enable_resource_log, resource_stats
+from http_fetch import create_session, get_page_content_http, get_reply_page_http, collect_thread, last_page_number, thread_page_urls
+from thread_checkpoint import ThreadCheckpoint
+from page_cache import page_cache
+from metrics import metrics
+from error_capture import error_pages
+from scheduler import HostScheduler
 
 
-# 创建 Chrome 选项对象
-chrome_options = Options()
+# 结果文件：jsonl 每抓取一篇文章追加一行（首次运行时从 POSTS_FILE 转换），json 每次重写整个 POSTS_FILE；
+# sqlite 把文章、回复、链接、进度和链接索引都保存在 SQLITE_FILE 中（WAL 模式，带索引的 upsert，每 SQLITE_BATCH_SIZE 个写操作提交一次，
+# 多个进程可以同时写入；首次使用时导入已有的文件）；shards 把文章写成压缩的 JSONL 分片，见下面的 SHARD_*
+POSTS_FILE = 'data/flyert-1.json'
+POSTS_LOG_FILE = 'data/flyert-1.jsonl'
+STORAGE_BACKEND = 'jsonl'
+SQLITE_FILE = 'data/flyert.db'
+SQLITE_BATCH_SIZE = 100
 
-chrome_options.add_argument('--disable-plugins-discovery')
-chrome_options.add_argument('--mute-audio')
-# 开启无头模式，禁用视频、音频、图片加载，开启无痕模式，减少内存占用
-# chrome_options.add_argument('--headless')   # 开启无头模式以节省内存占用，较低版本的浏览器可能不支持这一功能
-chrome_options.add_argument("--disable-plugins-discovery")
-chrome_options.add_argument("--mute-audio")
-chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
-chrome_options.add_argument("--incognito")
-# 禁用GPU加速，避免浏览器崩溃
-chrome_options.add_argument("--disable-gpu")
+# 压缩分片：每个分片只包含一家酒店的文章，压缩后超过 SHARD_MAX_MB 或满 SHARD_MAX_RECORDS 篇时换下一个分片，
+# SHARD_DIR/manifest.json 列出每个分片的酒店、时间范围和文章数；gzip 不需要额外的包，zstd 需要 zstandard
+SHARD_DIR = 'data/flyert_shards'
+SHARD_COMPRESSION = 'gzip'
+SHARD_MAX_MB = 64
+SHARD_MAX_RECORDS = 10000
 
+# 链接文件：[{"hotel": 酒店名, "links": [...]}]；链接索引保存所有酒店见过的规范化链接，跨运行去重
+LINKS_FILE = 'data/links.json'
+LINK_INDEX_FILE = 'data/link_index.json'
+
+# 文章抓取方式：http 先用 requests 直接请求页面，需要 JS 或遇到跳转提示时才回退到 Selenium；selenium 只用浏览器
+FETCH_MODE = 'http'
+
+# 请求调度：同一域名最多同时 MAX_CONCURRENCY 个请求，两次请求开始时间至少间隔 REQUEST_INTERVAL 秒，再加上 REQUEST_JITTER 范围内的随机秒数。
+# 这个间隔只用于文章首页；回复页另有 REPLY_PAGE_* 限制，否则 20 页的帖子仍要约 20 × 5.5 秒，与逐页抓取没有区别
+MAX_CONCURRENCY = 2
+REQUEST_INTERVAL = 5
+REQUEST_JITTER = (0, 1)
+# 所有帖子的回复页共用一个调度器：同一域名最多同时 REPLY_PAGE_CONCURRENCY 个请求，间隔 REPLY_PAGE_INTERVAL 秒加 REPLY_PAGE_JITTER。
+# 按默认值 20 页的帖子约 15 秒抓完；站点的总请求频率是首页和回复页两部分之和，间隔调小前需要确认站点能承受
+REPLY_PAGE_CONCURRENCY = 4
+REPLY_PAGE_INTERVAL = 0.5
+REPLY_PAGE_JITTER = (0, 0.5)
+
+# 回复分页：由帖子链接和分页条中的总页数直接算出各页链接，第二页起的各页都交给回复页调度器并发抓取，
+# 每抓完一页记录到 THREAD_CHECKPOINT_DIR，中途崩溃后只补抓没完成的页；超过 MAX_REPLY_PAGES 页的帖子只抓到那一页
+MAX_REPLY_PAGES = 200
+THREAD_CHECKPOINT_DIR = 'data/thread_pages'
+
+# 搜索结果页的定位方式：gallop 先按 1, 2, 4, 8... 探测页码再二分，找到第一个落入时间窗口的结果页后从那里开始抓取；
+# linear 从第 1 页开始逐页往后
+SEARCH_MODE = 'gallop'
+
+# 资源拦截：通过 DevTools 协议拦截这些类型和 URL 的请求，抽取只需要页面文本；RESOURCE_STATS 打印每个页面拦截和加载的请求
+# （默认关闭：它会打开 Chrome 的 performance 日志，每个页面之后都要读取解析）
+BLOCKED_RESOURCE_TYPES = ['image', 'font', 'media']
+BLOCKED_URL_PATTERNS = TRACKER_PATTERNS
+RESOURCE_STATS = False
+
+# 浏览器启动：chromedriver 路径解析一次后缓存（见 driver_setup.py）；BROWSER_PROFILE_DIR 下的用户目录跨运行保留缓存和 cookies，
+# 设为 None 时每次用全新的无痕窗口
+CHROME_DRIVER_URL = "https://registry.npmmirror.com/-/binary/chromedriver"
+BROWSER_PROFILE_DIR = 'data/chrome_profiles'
+
+# 页面缓存：record 把抓取到的每个页面（page_source 和 HTTP 响应）压缩保存到 PAGE_CACHE_DIR；
+# replay 不启动浏览器，直接用缓存的页面重新抽取所有文章；off 不缓存
+PAGE_CACHE_MODE = 'record'
+PAGE_CACHE_DIR = 'data/page_cache'
+
+# 指标：各阶段耗时直方图和页面/文章/回复/错误/字节计数，Prometheus 文本格式，按酒店分标签；
+# METRICS_TEXTFILE 每保存一篇文章重写一次（None 不写），METRICS_PORT 不为 None 时运行期间在 http://127.0.0.1:<端口>/metrics 提供
+METRICS_TEXTFILE = 'data/metrics.prom'
+METRICS_PORT = None
+
+# 出错页面：由后台线程压缩保存到 ERROR_PAGES_DIR，旁边的 .json 记录链接和原因；内容相同的页面只保存一份，
+# 超过页面数或大小上限（跨运行累计）后不再保存新页面
+ERROR_PAGES_DIR = 'error_pages'
+ERROR_PAGES_MAX_FILES = 200
+ERROR_PAGES_MAX_MB = 100
+
+
+def create_chrome_options():
+    """创建 Chrome 选项对象；持久化用户目录在这里才创建，导入本模块不会在磁盘上留下目录"""
+    chrome_options = Options()
+
+    chrome_options.add_argument('--disable-plugins-discovery')
+    chrome_options.add_argument('--mute-audio')
+    # 开启无头模式，禁用视频、音频、图片加载，开启无痕模式，减少内存占用
+    # chrome_options.add_argument('--headless')   # 开启无头模式以节省内存占用，较低版本的浏览器可能不支持这一功能
+    chrome_options.add_argument("--disable-plugins-discovery")
+    chrome_options.add_argument("--mute-audio")
+    chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    if BROWSER_PROFILE_DIR:
+        use_profile(chrome_options, BROWSER_PROFILE_DIR)
+    else:
+        chrome_options.add_argument("--incognito")
+    # 禁用GPU加速，避免浏览器崩溃
+    chrome_options.add_argument("--disable-gpu")
+    if RESOURCE_STATS:
+        enable_resource_log(chrome_options)
+    return chrome_options
+
+
+# 一次注入脚本取回整页的搜索结果，避免对每个结果逐个调用 find_element / get_attribute
+SEARCH_RESULTS_SCRIPT = """
+return Array.from(document.querySelectorAll('li.pbw')).map(function (li) {
+    var timeElem = li.querySelector('p:nth-of-type(3) span:first-of-type');
+    if (!timeElem) {
+        timeElem = document.evaluate(".//h3[@class='search_title']/following-sibling::*[last()]/descendant::span[1]",
+            li, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    }
+    var linkElem = li.querySelector('h3.search_title a');
+    return {
+        time_text: timeElem ? timeElem.innerText.trim() : null,
+        href: linkElem ? linkElem.href : null,
+        html: timeElem ? null : li.outerHTML
+    };
+});
+"""
+
+# 一次注入脚本取回当前页的所有回复，arguments[0] 为 true 时跳过第一个容器（楼主的正文）
+REPLIES_SCRIPT = """
+var containers = Array.from(document.querySelectorAll('.comiis_viewbox'));
+if (arguments[0]) containers = containers.slice(1);
+return containers.map(function (container) {
+    var name = '', link = '';
+    var links = container.querySelectorAll('.authi.l>a');
+    for (var i = 0; i < links.length; i++) {
+        var href = links[i].href;
+        if (href && href.indexOf('home.php?mod=space&uid=') !== -1) {
+            name = links[i].innerText.trim();
+            link = href;
+            break;
+        }
+    }
+    var content = container.querySelector('.post_message');
+    var time = container.querySelector("[id^='authorposton']");
+    return {
+        commenter_name: name,
+        commenter_link: link,
+        comment_content: content ? content.innerText.trim() : null,
+        comment_time: time ? time.innerText.trim() : null
+    };
+});
+"""
+
+# 取分页条中的链接和“共 N 页”，由 last_page_number 算出总页数
+PAGER_SCRIPT = """
+var total = document.querySelector('.pg span[title]');
+return {
+    hrefs: Array.from(document.querySelectorAll('.pg a[href]')).map(function (a) { return a.href; }),
+    total: total ? total.getAttribute('title') : ''
+};
+"""
+
+
+def load_search_page(driver, wait, search_result_link, page_num):
+    """打开一页搜索结果
+
+    Returns:
+        list: [(时间戳, 结果)]，时间无法解析时时间戳为 None；超出最后一页时为空列表
+    """
+    page_url = f"{search_result_link}&page={page_num}"
+    driver.get(page_url)
+    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, ".tl")))
+    scroll_to_bottom(driver, selectors=["li.pbw"])
+    resource_stats.collect(driver, page_url)
+    
+    try:
+        empty_elements = driver.find_elements(By.CSS_SELECTOR, "p.emp")
+        if empty_elements and any("抱歉" in elem.text for elem in empty_elements):
+            return []
+    except:
+        pass
+    
+    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "li.pbw p:nth-of-type(3) span:first-of-type")))
+    searchResults = driver.execute_script(SEARCH_RESULTS_SCRIPT)
+    times = TimeParser()
+    return [(times.parse(result['time_text']), result) for result in searchResults]
+
+
+def find_first_page(load_page, endTimestamp):
+    """找到第一个含有不晚于 endTimestamp 的结果的页码
+
+    搜索结果按发帖时间从新到旧排列，"该页最旧的结果不晚于 endTimestamp（或该页为空）" 随页码单调，
+    先按 1, 2, 4, 8... 倍增找到上界，再在最后一段里二分，只需加载 O(log n) 页。
+
+    Args:
+        load_page: load_page(page_num) -> [(时间戳, 结果)]
+        endTimestamp (float): 时间窗口的结束时间
+    """
+    def reached(page_num):
+        timestamps = [timestamp for timestamp, _ in load_page(page_num) if timestamp is not None]
+        return not timestamps or min(timestamps) <= endTimestamp
+
+    if reached(1):
+        return 1
+    low, high = 1, 2
+    while not reached(high):
+        low, high = high, high * 2
+    while high - low > 1:
+        mid = (low + high) // 2
+        if reached(mid):
+            high = mid
+        else:
+            low = mid
+    return high
 
 
 def get_article_links_by_page(hotel, search_result_link, driver, startTime = datetime.strptime('2024-3-1', "%Y-%m-%d"), endTime = datetime.strptime('2025-2-28', "%Y-%m-%d"), time_out=10):
-    """从搜索结果页中获取指定时间范围内的每篇文章的链接，并且获取一页的链接就直接写入json文件
+    """从搜索结果页中获取指定时间范围内的每篇文章的链接
+
+    SEARCH_MODE 为 gallop 时先定位第一个落入时间窗口的结果页，跳过前面所有更新的页面；
+    之后逐页抓取，遇到早于 startTime 的结果即停止。
 
     Args:
         hotel (str): 酒店名
@@ -44,74 +241,55 @@ def get_article_links_by_page(hotel, search_result_link, driver, startTime = dat
     """
     try:
         wait = WebDriverWait(driver, time_out)
+        startTimestamp = startTime.timestamp()
+        endTimestamp = endTime.timestamp()
+
+        # 探测过的页面不再重新加载
+        loaded_pages = {}
+        def load_page(page_num):
+            if page_num not in loaded_pages:
+                print(f'Scraping page {page_num} of {hotel}')
+                loaded_pages[page_num] = load_search_page(driver, wait, search_result_link, page_num)
+            return loaded_pages[page_num]
 
         more = True
         page_num = 1
+        page_url = search_result_link
         links = []
 
+        if SEARCH_MODE == 'gallop':
+            page_num = find_first_page(load_page, endTimestamp)
+            print(f"从第 {page_num} 页开始抓取，定位时加载了 {len(loaded_pages)} 页, hotel: {hotel}")
+
         # 获取所有分页下的文章链接
         while more:
-            print(f'Scraping page {page_num} of {hotel}')
             page_url = f"{search_result_link}&page={page_num}"
-            driver.get(page_url)
-            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, ".tl")))
-            scroll_to_bottom(driver)
-            
-            try:
-                empty_elements = driver.find_elements(By.CSS_SELECTOR, "p.emp")
-                if empty_elements and any("抱歉" in elem.text for elem in empty_elements):
-                    print(f"已到达最后一页或没有更多内容，hotel: {hotel}")
-                    more = False
-                    break
-            except:
-                pass
-            
-            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "li.pbw p:nth-of-type(3) span:first-of-type")))
-            searchResults = driver.find_elements(By.CSS_SELECTOR, "li.pbw")
+            searchResults = load_page(page_num)
+            if not searchResults:
+                print(f"已到达最后一页或没有更多内容，hotel: {hotel}")
+                break
             print(f"当前页面文章数量: {len(searchResults)}")
             
-            for result in searchResults:
-                try:
-                    timestampElem = result.find_element(By.CSS_SELECTOR, "p:nth-of-type(3) span:first-of-type")
-                    timeStr = parse_timestamp(timestampElem.text)
-                except:
-                    try:
-                        timestampElem = result.find_element(By.XPATH, ".//h3[@class='search_title']/following-sibling::*[last()]/descendant::span[1]")
-                        timeStr = parse_timestamp(timestampElem.text)
-                    except:
-                        timeStr = None
-                if timeStr is None:
-                    print(f"获取时间戳失败：{result.get_attribute('outerHTML')}, link: {page_url}")
+            for currentTimestamp, result in searchResults:
+                if currentTimestamp is None:
+                    print(f"获取时间戳失败：{result['html'] or result['time_text']}, link: {page_url}")
                     continue
-                currentTimestamp = datetime.strptime(timeStr, "%Y-%m-%d %H:%M")
 
-                if currentTimestamp > endTime:
+                if currentTimestamp > endTimestamp:
                     print(f"当前时间戳大于截止时间, link: {page_url}")
                     continue
                 
-                if currentTimestamp < startTime:
+                if currentTimestamp < startTimestamp:
                     print(f"当前时间戳小于开始时间, link: {page_url}")
                     more = False
                     break
                 
-                linkElem = result.find_element(By.CSS_SELECTOR, "h3.search_title a")
-                href = linkElem.get_attribute("href")
+                href = result['href']
                 if href is not None:
                     links.append(href)
             
             page_num += 1
             
-        with open('data/links.json', 'r', encoding='utf-8') as f:
-            existing_links = json.load(f)
-            
-        for existing_hotel in existing_links:
-            if existing_hotel['hotel'] == hotel:
-                unique_links = [link for link in links if link not in existing_hotel['links']]
-                print(f"新增链接数量: {len(unique_links)}")
-                existing_hotel['links'].extend(unique_links)
-                with open('data/links.json', 'w', encoding='utf-8') as f:
-                    json.dump(existing_links, f, ensure_ascii=False, indent=4)
-                break
         return links
             
             
@@ -119,9 +297,52 @@ def get_article_links_by_page(hotel, search_result_link, driver, startTime = dat
         print(f'Failed to get posts from page {page_url}:\n{e}')
 
 
+def database():
+    """sqlite 存储时返回共用的数据库，否则返回 None"""
+    return open_database(SQLITE_FILE, SQLITE_BATCH_SIZE) if STORAGE_BACKEND == 'sqlite' else None
+
+
+def shard_options():
+    """shards 存储方式的参数"""
+    return dict(folder=SHARD_DIR, site='flyert', compression=SHARD_COMPRESSION,
+                max_bytes=SHARD_MAX_MB * 1024 * 1024, max_records=SHARD_MAX_RECORDS)
+
+
+def _read_links_file():
+    try:
+        with open(LINKS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def load_hotel_links():
+    """读取链接 [{"hotel": 酒店名, "links": [...]}]，没有时返回空列表"""
+    db = database()
+    if db is None:
+        return _read_links_file()
+    links = db.load_links(seed=lambda: {item['hotel']: item['links'] for item in _read_links_file()})
+    return [{'hotel': hotel, 'links': hotel_links} for hotel, hotel_links in links.items()]
+
+
+def save_hotel_links(hotel_links):
+    with open(LINKS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(hotel_links, f, ensure_ascii=False, indent=4)
+
+
+def save_new_links(hotel_links, hotel, new_links):
+    """保存一家酒店新发现的链接：sqlite 存储时只插入这些新链接，否则重写链接文件"""
+    db = database()
+    if db is not None:
+        db.add_links(hotel, new_links)
+    else:
+        save_hotel_links(hotel_links)
+
+
 def get_all_links(driver):
     """
     调用get_article_links_by_page函数获取所有文章链接
+    新链接经过规范化和链接索引去重后追加到对应酒店，每处理完一个酒店写一次链接文件
     """
     hotels = [
         # '惠庭',
@@ -152,15 +373,54 @@ def get_all_links(driver):
         'https://www.flyert.com.cn/search.php?mod=forum&adv=&srchuname=&searchid=6375&srchtype=fulltext&attach=&srchfid=&before=0&srchfrom=0&srchfilter=all&src_sp=&searchsubmit=yes&kw=Fairfield+Inn&orderby=dateline&ascdesc=desc',
     ]
 
+    hotel_links = load_hotel_links()
+    link_index = LinkIndex(LINK_INDEX_FILE, seed=(link for item in hotel_links for link in item['links']), db=database())
+    hotel_entries = {item['hotel']: item for item in hotel_links}
+
     for hotel, search_result_link in zip(hotels, search_result_links):
         print(f"正在处理酒店：{hotel}")
         print(f"链接：{search_result_link}")
-        get_article_links_by_page(hotel, search_result_link, driver)
+        links = get_article_links_by_page(hotel, search_result_link, driver) or []
+        new_links = link_index.ingest(links)
+        print(f"新增链接数量: {len(new_links)}")
+        if hotel not in hotel_entries:
+            hotel_entries[hotel] = {'hotel': hotel, 'links': []}
+            hotel_links.append(hotel_entries[hotel])
+        hotel_entries[hotel]['links'].extend(new_links)
+        save_new_links(hotel_links, hotel, new_links)
+    link_index.close()
     driver.quit()
 
 
+def _collect_replies(driver, first_page, times):
+    """用 REPLIES_SCRIPT 取当前页的回复，首页的第一个容器是楼主正文，需要跳过"""
+    with metrics.timer('parse'):
+        page_replies = driver.execute_script(REPLIES_SCRIPT, first_page)
+    replies = []
+    for reply in page_replies:
+        # 与逐个 find_element 时一样，缺少回复内容或时间的容器视为页面异常
+        if reply['comment_content'] is None or reply['comment_time'] is None:
+            raise Exception(f"回复容器缺少内容或时间: {reply}")
+        replies.append({
+            'commenter_name': reply['commenter_name'],
+            'comment_content': reply['comment_content'],
+            'commenter_link': reply['commenter_link'],
+            'comment_time': times.parse(reply['comment_time'])
+        })
+    return replies
+
+
+def _record_page(driver, page_url):
+    metrics.inc('pages')
+    if page_cache.recording:
+        with metrics.timer('page_source'):
+            html = driver.page_source
+        metrics.inc('bytes', len(html.encode('utf-8')))
+        page_cache.put(page_url, html)
+
+
 def get_page_content(url, driver, progress_mgr, time_out=6):
-    """获取指定文章的内容及其回复内容
+    """获取指定文章的内容及首页的回复，其余回复页的链接放在 page_urls 中（重放时直接返回全部回复，没有 page_urls）
     返回：
         {
             'title': title,
@@ -170,13 +430,19 @@ def get_page_content(url, driver, progress_mgr, time_out=6):
                 'name': author_name,
                 'link': author_href
             },
-            'replies': replies
+            'replies': replies,
+            'page_urls': page_urls
         }
         或者None
     """
     
+    if page_cache.replaying:
+        # 重放时各页面按抓取时的链接从缓存读取，解析方式与 HTTP 模式相同
+        return collect_thread(url, page_cache.get, MAX_REPLY_PAGES)
+
     try:
-        driver.get(url)
+        with metrics.timer('navigate'):
+            driver.get(url)
         # 快速检测是否存在跳转提示
         short_wait = WebDriverWait(driver, 3)
         try:
@@ -192,73 +458,31 @@ def get_page_content(url, driver, progress_mgr, time_out=6):
             pass
         
         wait = WebDriverWait(driver, time_out)
-        title_elem = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "#thread_subject")))
-        timestamp_elem = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "[id^='authorposton']")))
-        content_elem = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, ".firstpost")))
-        author_link = wait.until(EC.presence_of_element_located((By.XPATH, "//span[starts-with(@id, 'comiis_authi_author_div')]//a[@class='kmxi2']")))
+        with metrics.timer('wait'):
+            title_elem = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "#thread_subject")))
+            timestamp_elem = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "[id^='authorposton']")))
+            content_elem = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, ".firstpost")))
+            author_link = wait.until(EC.presence_of_element_located((By.XPATH, "//span[starts-with(@id, 'comiis_authi_author_div')]//a[@class='kmxi2']")))
         
-        scroll_to_bottom(driver)
+        # 帖子是服务端渲染的，回复容器出现即可
+        with metrics.timer('scroll'):
+            scroll_to_bottom(driver, selectors=[".comiis_viewbox"])
         
         # 获取各元素的文本内容
         title = title_elem.text
-        timestamp = parse_timestamp(timestamp_elem.text)
+        times = TimeParser()
+        timestamp = times.parse(timestamp_elem.text)
         content = content_elem.text
         author_name = author_link.text
         author_href = author_link.get_attribute('href')
 
-        # 遍历每个回复容器，找到作者链接和回复内容
-        more_pages = True
-        first_page = True
-        replies = []
-        while more_pages:
-            if first_page:
-                reply_containers = driver.find_elements(By.CSS_SELECTOR, ".comiis_viewbox")[1:]
-            else:
-                reply_containers = driver.find_elements(By.CSS_SELECTOR, ".comiis_viewbox")
-                
-            for container in reply_containers:
-                commenter_name = ''
-                comment_content = ''
-                commenter_link = ''
-                comment_time = ''
-                
-                possible_links = container.find_elements(By.CSS_SELECTOR, ".authi.l>a")
-                for link in possible_links:
-                    href = link.get_attribute("href")
-                    if href and ('home.php?mod=space&uid=' in href):
-                        commenter_name = link.text
-                        commenter_link = link.get_attribute('href')
-                        break
-                    
-                content_element = container.find_element(By.CSS_SELECTOR, ".post_message")
-                if content_element:
-                    comment_content = content_element.text
-                    
-                comment_time_element = container.find_element(By.CSS_SELECTOR, "[id^='authorposton']")
-                if comment_time_element:
-                    comment_time = parse_timestamp(comment_time_element.text)
-                replies.append({
-                    'commenter_name': commenter_name,
-                    'comment_content': comment_content,
-                    'commenter_link': commenter_link,
-                    'comment_time': comment_time
-                })
-                
-            # 处理完当前页所有评论后再查找下一页按钮
-            possible_next_page_button = driver.find_elements(By.CSS_SELECTOR, ".nxt")
-            
-            for button in possible_next_page_button:
-                if 'page' in button.get_attribute("href"):
-                    # 使用 JavaScript 滚动到按钮位置
-                    driver.execute_script("arguments[0].scrollIntoView(true);", button)
-                    time.sleep(1)  # 等待滚动完成
-                    # 使用 JavaScript 点击按钮
-                    driver.execute_script("arguments[0].click();", button)
-                    first_page = False
-                    time.sleep(3)
-                    break
-            else:
-                more_pages = False
+        _record_page(driver, url)
+        replies = _collect_replies(driver, True, times)
+        # 其余各页的链接由分页条算出，交给调用方抓取
+        pager = driver.execute_script(PAGER_SCRIPT)
+        page_urls = thread_page_urls(url, last_page_number(url, pager['hrefs'], pager['total']), MAX_REPLY_PAGES)
+        resource_stats.collect(driver, url)
+        metrics.observe('time_parse', times.seconds)
         
         # 返回所有获取的内容
         return {
@@ -269,34 +493,117 @@ def get_page_content(url, driver, progress_mgr, time_out=6):
                 'name': author_name,
                 'link': author_href
             },
-            'replies': replies
+            'replies': replies,
+            'page_urls': page_urls
         }
         
     except Exception as e:
         print(f"Failed to find elements for {url}\n{e}")
+        metrics.inc('errors')
+        save_error_page(driver, url, reason=str(e))
         progress_mgr.mark_error_link(url)
         return None
     
 
-def get_all_contents(driver):
+def get_reply_page(url, driver, time_out=6):
+    """用浏览器直接打开第二页及之后的一页，返回该页的回复列表，失败时返回 None"""
+    try:
+        with metrics.timer('navigate'):
+            driver.get(url)
+        with metrics.timer('wait'):
+            WebDriverWait(driver, time_out).until(EC.presence_of_element_located((By.CSS_SELECTOR, ".comiis_viewbox")))
+        _record_page(driver, url)
+        times = TimeParser()
+        replies = _collect_replies(driver, False, times)
+        metrics.observe('time_parse', times.seconds)
+        return replies
+    except Exception as e:
+        print(f"Failed to find replies for {url}\n{e}")
+        metrics.inc('errors')
+        save_error_page(driver, url, reason=str(e))
+        return None
+
+
+async def fetch_content(link, driver, session, progress_mgr, scheduler, reply_scheduler, browser_lock, checkpoint, hotel=''):
+    """通过调度器抓取一篇文章（首页用 scheduler，其余回复页用 reply_scheduler），HTTP 模式失败时回退到 Selenium，指标记在 hotel 下"""
+    # 每个任务有自己的上下文，asyncio.to_thread 会把它带进线程
+    with metrics.context(hotel):
+        return await _fetch_content(link, driver, session, progress_mgr, scheduler, reply_scheduler, browser_lock, checkpoint)
+
+
+async def _fetch_page(page_url, driver, session, scheduler, browser_lock, fetch_http, fetch_browser, *args):
+    """抓取一个页面，HTTP 模式失败时回退到 Selenium"""
+    if session is not None:
+        result = await scheduler.run(page_url, fetch_http, page_url, session, *args)
+        if result is not None:
+            return result
+        print(f"HTTP 模式无法解析，回退到 Selenium: {page_url}")
+    # 只有一个浏览器，Selenium 请求需要排队
+    async with browser_lock:
+        return await scheduler.run(page_url, fetch_browser, page_url, driver)
+
+
+async def _fetch_content(link, driver, session, progress_mgr, scheduler, reply_scheduler, browser_lock, checkpoint):
+    """先抓首页，再按分页链接并发抓取其余回复页；每完成一页写一次检查点，任何一页失败时整篇留待下次运行"""
+    try:
+        done = checkpoint.load(link)
+        result = done.get(1)
+        if result is None:
+            result = await _fetch_page(
+                link, driver, session, scheduler, browser_lock,
+                get_page_content_http, lambda url, driver: get_page_content(url, driver, progress_mgr), MAX_REPLY_PAGES
+            )
+            if result is None:
+                return link, None
+            checkpoint.save_page(link, 1, result)
+
+        async def fetch_reply_page(page_num, page_url):
+            if page_num in done:
+                return done[page_num]
+            replies = await _fetch_page(page_url, driver, session, reply_scheduler, browser_lock,
+                                        get_reply_page_http, get_reply_page)
+            if replies is not None:
+                checkpoint.save_page(link, page_num, replies)
+            return replies
+
+        page_urls = result.pop('page_urls')
+        pages = await asyncio.gather(*(fetch_reply_page(n, page_url) for n, page_url in enumerate(page_urls, 2)))
+        if any(replies is None for replies in pages):
+            # 不记为出错链接，下次运行时从检查点继续
+            print(f"有 {sum(replies is None for replies in pages)} 页回复抓取失败，已完成的页下次运行时不再抓取: {link}")
+            return link, None
+        for replies in pages:
+            result['replies'].extend(replies)
+        return link, result
+    except Exception as e:
+        print(f"Error processing {link}: {str(e)}")
+        return link, None
+
+
+async def get_all_contents_async(driver):
     """根据获取到的文章链接调用get_page_content函数获取文章内容
     并将获取到的内容写入json文件
+
+    同一酒店的文章通过 HostScheduler 并发抓取，请求间隔由调度器控制，回复页用另一个间隔更短的调度器，
+    抓取结果在事件循环中逐个写入，数据和进度只有一个写入者。
     """
     # 初始化进度管理器
-    progress_mgr = ProgressManager()
+    progress_mgr = ProgressManager(db=database())
+    session = create_session(cookies_file) if FETCH_MODE == 'http' else None
+    scheduler = HostScheduler(max_per_host=MAX_CONCURRENCY, min_interval=REQUEST_INTERVAL, jitter=REQUEST_JITTER)
+    reply_scheduler = HostScheduler(max_per_host=REPLY_PAGE_CONCURRENCY, min_interval=REPLY_PAGE_INTERVAL,
+                                    jitter=REPLY_PAGE_JITTER)
+    browser_lock = asyncio.Lock()
+    checkpoint = ThreadCheckpoint(THREAD_CHECKPOINT_DIR)
     
     results_count = {}
     
     # 读取链接数据
-    with open(f'data/links.json', 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    data = load_hotel_links()
 
     # 读取或创建结果文件
-    try:
-        with open(f'data/flyert-1.json', 'r', encoding='utf-8') as f:
-            new_data = json.load(f)
-    except:
-        new_data = []
+    store = open_post_store(STORAGE_BACKEND, POSTS_FILE, POSTS_LOG_FILE, id_field='link', group_field='hotel', db=database(), shards=shard_options())
+    store.load()
     
     # 从上次的进度继续处理
     start_from_hotel = False
@@ -317,60 +624,79 @@ def get_all_contents(driver):
         # 更新当前处理的酒店
         progress_mgr.set_current_hotel(hotel)
         
-        # 检查是否需要创建新的酒店数据
-        if not any(i['hotel'] == hotel for i in new_data):
-            new_data.append({
-                'hotel': hotel,
-                'posts': []
-            })
+        # 跳过已处理的链接，其余的交给调度器
+        pending = [link for link in dict.fromkeys(item['links']) if not progress_mgr.is_link_processed(link)]
+        tasks = [fetch_content(link, driver, session, progress_mgr, scheduler, reply_scheduler, browser_lock, checkpoint, hotel)
+                 for link in pending]
         
-        # 处理每个链接
-        for link in item['links']:
-            # 跳过已处理的链接
-            if progress_mgr.is_link_processed(link):
-                continue
-                
-            try:
-                result = get_page_content(link, driver, progress_mgr)
-                if result:
-                    result['link'] = link
-                    # 更新数据
-                    for tmp in new_data:
-                        if tmp['hotel'] == hotel:
-                            tmp['posts'].append(result)
-                            break
-                    
+        for task in asyncio.as_completed(tasks):
+            link, result = await task
+            if result:
+                result['link'] = link
+                with metrics.context(hotel):
+                    metrics.inc('posts')
+                    metrics.inc('replies', len(result['replies']))
                     # 保存结果
-                    with open(f'data/flyert-1.json', 'w', encoding='utf-8') as f:
-                        json.dump(new_data, f, ensure_ascii=False, indent=4)
-                    
-                    # 标记链接为已处理
-                    progress_mgr.mark_link_processed(link)
-                    results_count[hotel] += 1
-                    
-                time.sleep(5)  # 请求间隔
-                
-            except Exception as e:
-                print(f"Error processing {link}: {str(e)}")
-                continue
+                    with metrics.timer('persist'):
+                        store.append(hotel, result)
+                        store.flush()
+                        
+                        # 标记链接为已处理
+                        progress_mgr.mark_link_processed(link)
+                    checkpoint.discard(link)
+                metrics.write_textfile()
+                results_count[hotel] += 1
         
         # 完成当前酒店的处理
         progress_mgr.set_current_hotel("")
     
+    store.close()
+    progress_mgr.close()
+    
     for hotel, count in results_count.items():
         print(f"酒店 {hotel} 新增数据： {count}")
 
 
+def get_all_contents(driver):
+    asyncio.run(get_all_contents_async(driver))
+
+
+def replay_all_contents():
+    """不启动浏览器，用页面缓存中的页面重新抽取 links.json 中的所有文章
+
+    结果按链接覆盖结果文件中原来的记录，不读取也不修改进度。
+    """
+    store = open_post_store(STORAGE_BACKEND, POSTS_FILE, POSTS_LOG_FILE, id_field='link', group_field='hotel', db=database(), shards=shard_options())
+    store.load()
+    replayed = missing = 0
+    start_time = time.perf_counter()
+    for item in load_hotel_links():
+        for link in dict.fromkeys(item['links']):
+            result = get_page_content(link, None, None)
+            if result is None:
+                missing += 1
+                continue
+            result['link'] = link
+            store.append(item['hotel'], result)
+            replayed += 1
+    store.close()
+    print(f"重放完成：重新抽取 {replayed} 篇文章，{missing} 篇没有缓存或无法解析，用时 {time.perf_counter() - start_time:.1f} 秒")
+
+
 def main():
-    test_cookies()
-    
     start_time = time.perf_counter()
+    page_cache.configure(PAGE_CACHE_DIR, PAGE_CACHE_MODE)
+    metrics.configure('flyert', METRICS_TEXTFILE, METRICS_PORT)
+    error_pages.configure(ERROR_PAGES_DIR, ERROR_PAGES_MAX_FILES, ERROR_PAGES_MAX_MB * 1024 * 1024)
+    if page_cache.replaying:
+        replay_all_contents()
+        return
     
-    service = Service(ChromeDriverManager(url="https://registry.npmmirror.com/-/binary/chromedriver").install())
-    driver = webdriver.Chrome(service=service, options=chrome_options) 
+    driver = start_chrome(create_chrome_options(), CHROME_DRIVER_URL)
+    apply_resource_policy(driver, BLOCKED_RESOURCE_TYPES, BLOCKED_URL_PATTERNS)
 
-    driver.get('https://www.flyert.com.cn/')
-    load_cookies(driver, cookies_file)
+    # 用爬取的浏览器检查cookies，没有时在这个窗口中登录
+    test_cookies(driver)
 
     wait = WebDriverWait(driver, 30)
     # 等待页面基本元素加载完成
@@ -383,6 +709,13 @@ def main():
 
 
     driver.quit()
+    resource_stats.summary()
+    metrics.summary()
+    metrics.write_textfile()
+    error_pages.close()
+    db = database()
+    if db is not None:
+        db.close()
         
     end_time = time.perf_counter()
     print(f'Total time cost: {round(end_time - start_time)} seconds')
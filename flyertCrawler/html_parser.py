@@ -0,0 +1,152 @@
+# html_parser.py
+
+import gzip
+import os
+import time
+
+from bs4 import BeautifulSoup, FeatureNotFound
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # selectolax is optional
+    LexborHTMLParser = None
+
+
+# 'html.parser' is the pure-Python BeautifulSoup parser, 'lxml' is BeautifulSoup on top of lxml,
+# 'selectolax' uses the lexbor engine through a thin wrapper
+BACKENDS = ('html.parser', 'lxml', 'selectolax')
+
+_warned = set()
+
+
+def parse_html(html, backend='html.parser'):
+    """解析HTML，返回的文档和节点都支持 select / select_one / text / get_text / get / find_parent
+
+    默认与 HTML_PARSER 的默认值相同；所需的库没有安装时回退到 html.parser。
+    """
+    if backend == 'selectolax':
+        if LexborHTMLParser is not None:
+            return LexborNode(LexborHTMLParser(html).root)
+    elif backend in BACKENDS:
+        try:
+            return BeautifulSoup(html, backend)
+        except FeatureNotFound:
+            pass
+    if backend not in _warned:
+        _warned.add(backend)
+        print(f"HTML解析器 {backend} 不可用，改用 html.parser")
+    return BeautifulSoup(html, 'html.parser')
+
+
+class LexborNode:
+    """selectolax 节点的包装，提供抓取代码用到的那一小部分 BeautifulSoup 接口"""
+
+    __slots__ = ('node',)
+
+    # BeautifulSoup 的 .text 不包含这些标签里的文本
+    _SKIPPED_TEXT_PARENTS = ('script', 'style')
+
+    def __init__(self, node):
+        self.node = node
+
+    @property
+    def name(self):
+        return self.node.tag
+
+    def select(self, selector):
+        return [LexborNode(node) for node in self.node.css(selector)]
+
+    def select_one(self, selector):
+        node = self.node.css_first(selector)
+        return LexborNode(node) if node is not None else None
+
+    def get(self, attr, default=None):
+        value = self.node.attributes.get(attr)
+        return default if value is None else value
+
+    def get_text(self, separator='', strip=False):
+        parts = []
+        for child in self.node.traverse(include_text=True):
+            if child.tag != '-text':
+                continue
+            parent = child.parent
+            if parent is not None and parent.tag in self._SKIPPED_TEXT_PARENTS:
+                continue
+            text = child.text_content
+            if strip:
+                text = text.strip()
+                if not text:
+                    continue
+            parts.append(text)
+        return separator.join(parts)
+
+    @property
+    def text(self):
+        return self.get_text()
+
+    def find_parent(self, name=None):
+        parent = self.node.parent
+        while parent is not None:
+            if name is None or parent.tag == name:
+                return LexborNode(parent)
+            parent = parent.parent
+        return None
+
+
+def backend_available(backend):
+    """检查解析器所需的库是否已安装"""
+    if backend == 'selectolax':
+        return LexborHTMLParser is not None
+    try:
+        BeautifulSoup('', backend)
+        return True
+    except FeatureNotFound:
+        return False
+
+
+def load_pages(paths):
+    """读取保存的HTML页面（.html 或 gzip 压缩的 .html.gz），paths 可以是文件或目录"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(('.html', '.html.gz')))
+        else:
+            files.append(path)
+    pages = []
+    for file_path in files:
+        opener = gzip.open if file_path.endswith('.gz') else open
+        with opener(file_path, 'rt', encoding='utf-8', errors='replace') as f:
+            pages.append(f.read())
+    print(f"读取了 {len(pages)} 个页面。")
+    return pages
+
+
+def compare_backends(pages, extract, backends=BACKENDS, repeat=3):
+    """在保存的页面上比较各解析器的提取结果和耗时
+
+    Args:
+        pages (list): HTML 字符串列表
+        extract: extract(html, backend) -> 提取结果，结果与 html.parser 的不同即记为不一致
+        repeat (int): 每个解析器重复的次数，耗时取平均
+
+    Returns:
+        dict: {解析器: (平均耗时秒数, 不一致的页面数)}
+    """
+    baseline = [extract(html, 'html.parser') for html in pages]
+    results = {}
+    for backend in backends:
+        if not backend_available(backend):
+            print(f"{backend}: 未安装，跳过")
+            continue
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            outputs = [extract(html, backend) for html in pages]
+        elapsed = (time.perf_counter() - start_time) / repeat
+        mismatches = sum(1 for expected, actual in zip(baseline, outputs) if expected != actual)
+        results[backend] = (elapsed, mismatches)
+
+    base_time = results.get('html.parser', (None,))[0]
+    for backend, (elapsed, mismatches) in results.items():
+        speedup = f", 加速 {base_time / elapsed:.1f}x" if base_time and elapsed else ''
+        print(f"{backend}: {elapsed:.3f} 秒{speedup}, 与 html.parser 结果不一致的页面 {mismatches}/{len(pages)}")
+    return results
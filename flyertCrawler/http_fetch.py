@@ -0,0 +1,333 @@
+# 不启动浏览器、直接通过 HTTP 抓取飞客帖子页
+# 飞客的帖子页（t-<id>-<page>-1.html）是 Discuz 服务端渲染的，直接请求 HTML 就能解析出标题、作者、正文和回复。
+# 遇到需要 JS 渲染的页面或 #ShowDiv 跳转提示时返回 None，由调用方回退到 Selenium。
+# 自检（本地假服务器返回 samples/ 中保存的帖子页，不访问网站）: python http_fetch.py
+import pickle
+import os
+import re
+from urllib.parse import urljoin, urlsplit, parse_qs, urlencode, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from html_parser import parse_html
+from time_parser import TimeParser
+from page_cache import page_cache
+from metrics import metrics
+
+
+# HTML 解析器：'html.parser'（默认，纯 Python）、'lxml' 或 'selectolax'（最快，需另外安装）；
+# 换用前可以运行 python bench_parsers.py，检查在 samples/ 中保存的页面上与 html.parser 的结果是否一致
+HTML_PARSER = 'html.parser'
+# 帖子链接 t-<帖子 id>-<页码>-<列表页码>.html；另一种格式是 forum.php?mod=viewthread&tid=<帖子 id>&page=<页码>
+_THREAD_URL = re.compile(r't-(\d+)-(\d+)-(\d+)\.html')
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+
+
+def create_session(cookies_file, pool_size=10):
+    """创建带连接池的 requests.Session，并加载 Selenium 保存的 cookies"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+
+    if os.path.exists(cookies_file):
+        with open(cookies_file, 'rb') as f:
+            cookies = pickle.load(f)
+        for cookie in cookies:
+            session.cookies.set(
+                cookie['name'], cookie['value'],
+                domain=cookie.get('domain', ''), path=cookie.get('path', '/')
+            )
+    else:
+        print("未找到cookies文件，HTTP 模式将以未登录状态请求")
+    return session
+
+
+def last_page_number(url, pager_hrefs, total_title=''):
+    """从分页条找出帖子的总页数
+
+    Args:
+        url (str): 帖子链接
+        pager_hrefs (list): 分页条中的链接（绝对链接）
+        total_title (str): 分页条中“共 N 页”的 title，没有时按链接中的最大页码
+    """
+    match = re.search(r'(\d+)', total_title or '')
+    if match:
+        return int(match.group(1))
+    tid = _thread_id(url)
+    last_page = 1
+    for href in pager_hrefs:
+        if tid and _thread_id(href) == tid:
+            last_page = max(last_page, _page_of(href))
+    return last_page
+
+
+def _thread_id(url):
+    match = _THREAD_URL.search(url)
+    if match:
+        return match.group(1)
+    return parse_qs(urlsplit(url).query).get('tid', [None])[0]
+
+
+def _page_of(url):
+    match = _THREAD_URL.search(url)
+    if match:
+        return int(match.group(2))
+    page = parse_qs(urlsplit(url).query).get('page', ['1'])[0]
+    return int(page) if page.isdigit() else 1
+
+
+def thread_page_urls(url, last_page, max_pages=200):
+    """按帖子链接的格式生成当前页之后到第 last_page 页（最多到第 max_pages 页）的链接"""
+    last_page = min(last_page, max_pages)
+    match = _THREAD_URL.search(url)
+    if match:
+        current = int(match.group(2))
+        return [url[:match.start()] + f't-{match.group(1)}-{n}-{match.group(3)}.html' + url[match.end():]
+                for n in range(current + 1, last_page + 1)]
+    parts = urlsplit(url)
+    query = parse_qs(parts.query)
+    if 'tid' in query:
+        current = _page_of(url)
+        urls = []
+        for n in range(current + 1, last_page + 1):
+            query['page'] = [str(n)]
+            urls.append(urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query, doseq=True), '')))
+        return urls
+    if last_page > 1:
+        print(f"无法识别帖子链接的格式，只抓取第一页: {url}")
+    return []
+
+
+def _text(elem):
+    return elem.get_text('\n', strip=True) if elem else ''
+
+
+def parse_thread_page(html, url, first_page=True, backend=HTML_PARSER):
+    """解析一页帖子 HTML，url 用于把相对链接补全为绝对链接
+
+    Returns:
+        dict: 与 get_page_content 相同的字段（非首页时只有 replies），外加总页数 last_page；
+        页面需要 JS 渲染或出现跳转提示时返回 None
+    """
+    soup = parse_html(html, backend)
+    times = TimeParser()
+
+    jump_elem = soup.select_one('#ShowDiv')
+    if jump_elem:
+        return None
+
+    page = {}
+    if first_page:
+        title_elem = soup.select_one('#thread_subject')
+        timestamp_elem = soup.select_one("[id^='authorposton']")
+        content_elem = soup.select_one('.firstpost')
+        author_link = soup.select_one("span[id^='comiis_authi_author_div'] a.kmxi2")
+        if not (title_elem and timestamp_elem and content_elem and author_link):
+            return None
+        page.update({
+            'title': _text(title_elem),
+            'timestamp': times.parse(_text(timestamp_elem)),
+            'content': _text(content_elem),
+            'author': {
+                'name': _text(author_link),
+                'link': urljoin(url, author_link.get('href', ''))
+            },
+        })
+
+    reply_containers = soup.select('.comiis_viewbox')
+    if first_page:
+        reply_containers = reply_containers[1:]
+
+    replies = []
+    for container in reply_containers:
+        commenter_name = ''
+        commenter_link = ''
+        for link in container.select('.authi.l>a'):
+            href = link.get('href')
+            if href and ('home.php?mod=space&uid=' in href):
+                commenter_name = _text(link)
+                commenter_link = urljoin(url, href)
+                break
+        content_element = container.select_one('.post_message')
+        comment_time_element = container.select_one("[id^='authorposton']")
+        if content_element is None or comment_time_element is None:
+            # Selenium 路径在这种情况下会抛异常，这里同样交给调用方回退
+            return None
+        replies.append({
+            'commenter_name': commenter_name,
+            'comment_content': _text(content_element),
+            'commenter_link': commenter_link,
+            'comment_time': times.parse(_text(comment_time_element))
+        })
+    page['replies'] = replies
+
+    total_elem = soup.select_one('.pg span[title]')
+    page['last_page'] = last_page_number(
+        url, [urljoin(url, a.get('href')) for a in soup.select('.pg a[href]')],
+        total_elem.get('title') if total_elem else ''
+    )
+    metrics.observe('time_parse', times.seconds)
+    return page
+
+
+def fetch_html(session, url, time_out=10):
+    """请求页面，成功时返回 HTML 字节串（交给 BeautifulSoup 按 meta 判断编码），否则返回 None"""
+    try:
+        with metrics.timer('navigate'):
+            response = session.get(url, timeout=time_out)
+    except requests.RequestException as e:
+        print(f"HTTP 请求失败 {url}: {e}")
+        metrics.inc('errors')
+        return None
+    if response.status_code != 200:
+        print(f"HTTP 状态码 {response.status_code}: {url}")
+        metrics.inc('errors')
+        return None
+    metrics.inc('pages')
+    metrics.inc('bytes', len(response.content))
+    page_cache.put(url, response.content)
+    return response.content
+
+
+def get_page_content_http(url, session, max_pages=200, time_out=10):
+    """通过 HTTP 获取文章首页，返回值与 get_page_content 相同：回复只有首页的，page_urls 为其余各页的链接
+
+    需要回退时返回 None。
+    """
+    html = fetch_html(session, url, time_out)
+    if html is None:
+        return None
+    with metrics.timer('parse'):
+        result = parse_thread_page(html, url, first_page=True)
+    if result is None:
+        return None
+    result['page_urls'] = thread_page_urls(url, result.pop('last_page'), max_pages)
+    return result
+
+
+def get_reply_page_http(url, session, time_out=10):
+    """通过 HTTP 获取第二页及之后的一页回复，需要回退时返回 None"""
+    html = fetch_html(session, url, time_out)
+    if html is None:
+        return None
+    with metrics.timer('parse'):
+        page = parse_thread_page(html, url, first_page=False)
+    return page['replies'] if page is not None else None
+
+
+def collect_thread(url, fetch, max_pages=200):
+    """解析帖子首页和分页条算出的其余各页
+
+    Args:
+        url (str): 帖子首页链接
+        fetch: fetch(url) -> HTML，取不到时返回 None（从页面缓存读取）
+
+    Returns:
+        dict: 与 get_page_content 相同；任何一页取不到或需要回退时返回 None
+    """
+    html = fetch(url)
+    if html is None:
+        return None
+    with metrics.timer('parse'):
+        result = parse_thread_page(html, url, first_page=True)
+    if result is None:
+        return None
+
+    for page_url in thread_page_urls(url, result.pop('last_page'), max_pages):
+        html = fetch(page_url)
+        if html is None:
+            return None
+        with metrics.timer('parse'):
+            page = parse_thread_page(html, page_url, first_page=False)
+        if page is None:
+            return None
+        result['replies'].extend(page['replies'])
+    return result
+
+
+def _serve_stub(folder):
+    """启动一个本地服务器，按路径返回 folder 中保存的页面（t-123-1-1.html 等），返回 (server, 根 URL)"""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = os.path.join(folder, os.path.basename(urlsplit(self.path).path))
+            if not os.path.isfile(path):
+                self.send_error(404)
+                return
+            with open(path, 'rb') as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')  # 不声明编码，与站点一样由 <meta charset> 决定
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def main():
+    import asyncio
+    from datetime import datetime
+    from flyert_crawl import _fetch_page
+    from scheduler import HostScheduler
+
+    server, base = _serve_stub(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'samples'))
+    session = requests.Session()
+    try:
+        # 首页：标题、作者、正文、首页回复（跳过楼主）和分页条上的总页数
+        url = base + 't-123-1-1.html'
+        first = get_page_content_http(url, session)
+        assert first['title'] == '万豪酒店入住体验', first
+        assert first['author'] == {'name': '旅行者', 'link': base + 'home.php?mod=space&uid=1001'}, first['author']
+        assert first['content'] == '早餐丰富，房间升级到套房。\n行政酒廊下午茶不错。', first['content']
+        assert first['timestamp'] == int(datetime(2024, 5, 1, 9, 7).timestamp()), first['timestamp']
+        assert [r['commenter_name'] for r in first['replies']] == ['常旅客', '金卡会员'], first['replies']
+        assert first['replies'][0] == {
+            'commenter_name': '常旅客', 'comment_content': '感谢分享',
+            'commenter_link': base + 'home.php?mod=space&uid=1002',
+            'comment_time': int(datetime(2024, 5, 1, 10, 20).timestamp()),
+        }, first['replies'][0]
+        assert first['page_urls'] == [base + 't-123-2-1.html', base + 't-123-3-1.html'], first['page_urls']
+
+        # 其余页：第二页没有“共 N 页”，总页数按 .nxt 等分页链接中的最大页码
+        second = parse_thread_page(fetch_html(session, base + 't-123-2-1.html'), base + 't-123-2-1.html', first_page=False)
+        assert second['last_page'] == 3, second
+        assert [r['comment_content'] for r in second['replies']] == ['同住过，体验一致', '收藏了'], second['replies']
+        assert last_page_number(base + 't-123-2-1.html', [base + 't-123-3-1.html']) == 3
+        assert last_page_number(base + 't-123-1-1.html', [], '共 12 页') == 12
+        assert thread_page_urls(base + 't-123-2-1.html', 5, max_pages=4) == [base + 't-123-3-1.html', base + 't-123-4-1.html']
+        assert thread_page_urls('https://www.flyert.com.cn/forum.php?mod=viewthread&tid=123&page=1', 2) == [
+            'https://www.flyert.com.cn/forum.php?mod=viewthread&tid=123&page=2']
+        thread = collect_thread(url, lambda page_url: fetch_html(session, page_url))
+        assert len(thread['replies']) == 5 and thread['replies'][-1]['comment_content'] == '回复楼上：上海的', thread['replies']
+        assert get_reply_page_http(base + 't-123-3-1.html', session) == thread['replies'][-1:]
+
+        # #ShowDiv 跳转提示和缺少元素的页面交给 Selenium，请求失败（404）也一样
+        scheduler = HostScheduler()
+        browser_lock = asyncio.Lock()
+        for name in ('t-456-1-1.html', 't-789-1-1.html', 't-999-1-1.html'):
+            assert get_page_content_http(base + name, session) is None, name
+            result = asyncio.run(_fetch_page(
+                base + name, None, session, scheduler, browser_lock,
+                get_page_content_http, lambda page_url, driver: {'selenium': page_url}
+            ))
+            assert result == {'selenium': base + name}, result
+        result = asyncio.run(_fetch_page(
+            url, None, session, scheduler, browser_lock, get_page_content_http, lambda page_url, driver: None))
+        assert result['title'] == '万豪酒店入住体验', result
+        print("HTTP 抓取自检通过")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# link_index.py
+
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from progress import open_progress_store
+
+
+# 只用于统计来源的查询参数，不影响页面内容
+TRACKING_PARAMS = ('pvareaid',)
+TRACKING_PREFIXES = ('utm_',)
+
+# 同一个帖子的不同分页映射到第一页：(路径正则, 替换)
+_PATH_RULES = [
+    # flyert: /t-<id>-<page>-1.html, /thread-<id>-<page>-1.html
+    (re.compile(r'^/(?:t|thread)-(\d+)-\d+-\d+\.html$'), r'/t-\1-1-1.html'),
+    # autohome: /bbs/thread/<hash>/<id>-<page>.html
+    (re.compile(r'^(/bbs/thread/\w+/\d+)-\d+\.html$'), r'\1-1.html'),
+]
+
+
+def canonical_url(url):
+    """返回链接的规范形式，同一个页面的不同写法得到同一个结果
+
+    去掉 #片段 和统计参数，协议和域名转为小写，帖子的任意分页都映射为第一页，
+    flyert 的 forum.php?mod=viewthread&tid=<id> 映射为 /t-<id>-1-1.html。
+    """
+    if not url:
+        return url
+    parts = urlsplit(url.strip())
+    path = parts.path
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if key not in TRACKING_PARAMS and not key.startswith(TRACKING_PREFIXES)]
+
+    params = dict(query)
+    if path.endswith('/forum.php') and params.get('mod') == 'viewthread' and params.get('tid', '').isdigit():
+        path, query = f"/t-{params['tid']}-1-1.html", []
+    for pattern, replacement in _PATH_RULES:
+        path, count = pattern.subn(replacement, path)
+        if count:
+            break
+
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ''))
+
+
+class LinkIndex:
+    """所有社区共用的已发现链接索引，跨运行保存
+
+    链接以规范形式保存在 ProgressStore 中，判断是否见过是 O(1)，新增链接只追加一行日志。
+
+    Args:
+        index_file (str): 索引文件
+        seed (iterable, optional): 索引文件还不存在时用来初始化的已有链接
+        db (SqliteDatabase, optional): 保存在 SQLite 中而不是索引文件中
+    """
+
+    def __init__(self, index_file, seed=(), db=None):
+        self.store = open_progress_store(index_file, db=db)
+        self.seen = self.store.view()
+        if not len(self.seen):
+            for url in seed:
+                self.add(url)
+            if len(self.seen):
+                self.store.snapshot()
+
+    def __contains__(self, url):
+        return canonical_url(url) in self.seen
+
+    def __len__(self):
+        return len(self.seen)
+
+    def add(self, url):
+        """加入一个链接，是新链接时返回它的规范形式，否则返回 None"""
+        url = canonical_url(url)
+        if url and self.seen.add(url):
+            return url
+        return None
+
+    def ingest(self, urls):
+        """加入一批链接，按原顺序返回其中新链接的规范形式"""
+        return [url for url in map(self.add, urls) if url]
+
+    def close(self):
+        self.store.close()
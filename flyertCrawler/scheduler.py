@@ -0,0 +1,53 @@
+import asyncio
+import random
+from urllib.parse import urlparse
+
+from metrics import metrics
+
+
+class _HostState:
+    def __init__(self, max_concurrency, min_interval):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.min_interval = min_interval
+        self.next_time = 0.0
+
+
+class HostScheduler:
+    """基于 asyncio 的请求调度器，按域名限制并发数和请求间隔
+
+    阻塞的抓取函数（requests、Selenium）放到线程里执行，
+    等待请求间隔时只挂起当前协程，其他域名或同一域名的其他请求照常进行。
+
+    Args:
+        max_per_host (int): 每个域名同时进行的请求数
+        min_interval (float): 同一域名两次请求开始时间的最小间隔（秒）
+        jitter (tuple): 每次间隔额外加上的随机秒数范围
+        host_limits (dict, optional): {域名: (max_per_host, min_interval)}，覆盖默认值
+    """
+
+    def __init__(self, max_per_host=1, min_interval=0.0, jitter=(0, 0), host_limits=None):
+        self.max_per_host = max_per_host
+        self.min_interval = min_interval
+        self.jitter = jitter
+        self.host_limits = host_limits or {}
+        self._hosts = {}
+
+    def _state(self, host):
+        if host not in self._hosts:
+            max_concurrency, min_interval = self.host_limits.get(host, (self.max_per_host, self.min_interval))
+            self._hosts[host] = _HostState(max_concurrency, min_interval)
+        return self._hosts[host]
+
+    async def run(self, url, fn, *args):
+        """等到 url 所在域名有空位且满足间隔后，在线程中执行 fn(*args)"""
+        state = self._state(urlparse(url).netloc)
+        async with state.semaphore:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            # 先占好时间槽再等待，并发的协程会依次排开
+            start = max(now, state.next_time)
+            state.next_time = start + state.min_interval + random.uniform(*self.jitter)
+            if start > now:
+                await asyncio.sleep(start - now)
+                metrics.observe('sleep', start - now)
+            return await asyncio.to_thread(fn, *args)
@@ -0,0 +1,46 @@
+# thread_checkpoint.py
+
+import hashlib
+import json
+import os
+
+
+class ThreadCheckpoint:
+    """按页记录帖子的抓取结果，中途崩溃后重新运行时只抓取还没完成的页
+
+    每个帖子一个 <链接 sha1 前 16 位>.jsonl 文件，每抓完一页追加一行 {"page": 页码, "data": ...}，
+    首页的 data 是文章内容（含分页链接），其余页是回复列表。文章保存后调用 discard 删除文件。
+    只在事件循环所在的线程中读写。
+    """
+
+    def __init__(self, folder='data/thread_pages'):
+        self.folder = folder
+
+    def _path(self, link):
+        return os.path.join(self.folder, hashlib.sha1(link.encode('utf-8')).hexdigest()[:16] + '.jsonl')
+
+    def load(self, link):
+        """返回已完成的页 {页码: data}"""
+        pages = {}
+        try:
+            with open(self._path(link), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # 写了一半的最后一行
+                    pages[record['page']] = record['data']
+        except FileNotFoundError:
+            pass
+        return pages
+
+    def save_page(self, link, page, data):
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self._path(link), 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'page': page, 'data': data}, ensure_ascii=False) + '\n')
+
+    def discard(self, link):
+        try:
+            os.remove(self._path(link))
+        except FileNotFoundError:
+            pass
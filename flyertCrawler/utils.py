@@ -3,87 +3,14 @@ import os
 import time
 import random
 from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from pprint import pprint
-from bs4 import BeautifulSoup
-from datetime import datetime, timedelta
-import re
-import json
 
+from progress import open_progress_store
+from driver_setup import start_chrome
+from error_capture import error_pages
 
-cookies_file = "cookies.pkl"
-
-def parse_timestamp(time_str):
-    if not time_str:
-        return None
-        
-    # 尝试提取日期时间信息
-    date_pattern = r'(\d{4}-\d{1,2}-\d{1,2}\s+\d{1,2}:\d{1,2})'
-    days_ago_pattern = r'(\d+)\s*天前'
-    hours_ago_pattern = r'(\d+)\s*小时前'
-    yesterday_pattern = r'昨天\s*(\d{1,2}:\d{1,2})'
-    before_yesterday_pattern = r'前天\s*(\d{1,2}:\d{1,2})'
-    just_now_pattern = r'刚刚'
-    
-    # 清理字符串，移除地区信息
-    # time_str = re.sub(r'\s+[^\s\d:-]+$', '', time_str)  # 移除末尾的地区信息
-    
-    # 搜索完整的日期时间格式
-    date_match = re.search(date_pattern, time_str)
-    if date_match:
-        try:
-            return datetime.strptime(date_match.group(1), '%Y-%m-%d %H:%M').strftime('%Y-%m-%d %H:%M')
-        except ValueError:
-            pass
-    
-    # 搜索"前天 HH:MM"格式
-    before_yesterday_match = re.search(before_yesterday_pattern, time_str)
-    if before_yesterday_match:
-        try:
-            time_str = before_yesterday_match.group(1)
-            before_yesterday = datetime.now() - timedelta(days=2)
-            full_time = f"{before_yesterday.strftime('%Y-%m-%d')} {time_str}"
-            return datetime.strptime(full_time, '%Y-%m-%d %H:%M').strftime('%Y-%m-%d %H:%M')
-        except ValueError:
-            pass
-    
-    # 搜索"昨天 HH:MM"格式
-    yesterday_match = re.search(yesterday_pattern, time_str)
-    if yesterday_match:
-        try:
-            time_str = yesterday_match.group(1)
-            yesterday = datetime.now() - timedelta(days=1)
-            full_time = f"{yesterday.strftime('%Y-%m-%d')} {time_str}"
-            return datetime.strptime(full_time, '%Y-%m-%d %H:%M').strftime('%Y-%m-%d %H:%M')
-        except ValueError:
-            pass
-            
-    # 搜索"x小时前"格式
-    hours_match = re.search(hours_ago_pattern, time_str)
-    if hours_match:
-        try:
-            hours = int(hours_match.group(1))
-            timestamp = datetime.now() - timedelta(hours=hours)
-            return timestamp.strftime('%Y-%m-%d %H:%M')
-        except ValueError:
-            pass
-    
-    # 搜索"x天前"格式
-    days_match = re.search(days_ago_pattern, time_str)
-    if days_match:
-        try:
-            days = int(days_match.group(1))
-            timestamp = datetime.now() - timedelta(days=days)
-            return timestamp.strftime('%Y-%m-%d %H:%M')
-        except ValueError:
-            pass
-    
-    # 搜索"刚刚"格式
-    if re.search(just_now_pattern, time_str):
-        return datetime.now().strftime('%Y-%m-%d %H:%M')
-            
-    return None  # 如果无法解析，返回None
 
+cookies_file = "cookies.pkl"
 
 def save_cookies(driver, cookies_file):
     with open(cookies_file, 'wb') as f:
@@ -116,122 +43,141 @@ def manual_login(driver, cookies_file):
     save_cookies(driver, cookies_file)  # 登录后保存cookie到本地
     print("程序正在继续运行")
 
-def test_cookies():
-    # 首次登录获取cookie文件
-    print("测试cookies文件是否已获取。若无，请在弹出的窗口中登录，登录完成后，窗口将关闭；若有，窗口会立即关闭")
-    driver = webdriver.Chrome(service=Service('chromedriver-win64/chromedriver.exe'))
+def test_cookies(driver=None):
+    """检查cookies文件是否已获取，没有时在浏览器中手动登录
+
+    传入 driver 时直接在这个浏览器中检查并加载cookies，不再另外启动一个 Chrome；
+    否则临时启动一个浏览器，检查完关闭。
+    """
+    own_driver = driver is None
+    if own_driver:
+        print("测试cookies文件是否已获取。若无，请在弹出的窗口中登录，登录完成后，窗口将关闭；若有，窗口会立即关闭")
+        driver = start_chrome(webdriver.ChromeOptions())
     driver.get('https://www.flyert.com.cn/')
     if not load_cookies(driver, cookies_file):
         manual_login(driver, cookies_file)
-    driver.quit()
+        driver.get('https://www.flyert.com.cn/')
+    if own_driver:
+        driver.quit()
     
-def scroll_to_bottom(driver, wait_time=3):
-    """渐进式滚动到页面底部，模拟真实用户行为"""
+# 在页面中滚动到底部，并用 MutationObserver / PerformanceObserver 监听 DOM 变化和网络请求，
+# 页面在 quiet 毫秒内既没有 DOM 变化也没有新请求、高度不再增长，或目标元素都已出现时立即返回
+SCROLL_SCRIPT = """
+const [maxWait, quiet, selectors, done] = arguments;
+const start = performance.now();
+let lastChange = start;
+let lastHeight = -1;
+const touch = () => { lastChange = performance.now(); };
+const mutations = new MutationObserver(touch);
+mutations.observe(document.documentElement, {childList: true, subtree: true});
+let resources = null;
+try {
+    resources = new PerformanceObserver(touch);
+    resources.observe({type: 'resource'});
+} catch (e) {}
+function finish(reason) {
+    mutations.disconnect();
+    if (resources) resources.disconnect();
+    done({elapsed: (performance.now() - start) / 1000, reason: reason});
+}
+function tick() {
+    const now = performance.now();
+    const height = document.body.scrollHeight;
+    if (height !== lastHeight) {
+        lastHeight = height;
+        lastChange = now;
+        window.scrollTo(0, height);
+    }
+    if (selectors.length && selectors.every(s => document.querySelector(s))) return finish('selectors');
+    if (now - lastChange >= quiet) return finish('settled');
+    if (now - start >= maxWait) return finish('timeout');
+    setTimeout(tick, 100);
+}
+tick();
+"""
+
+
+def scroll_to_bottom(driver, quiet_time=0.5, max_wait=10, selectors=None):
+    """滚动到页面底部，懒加载内容稳定后立即返回
+
+    Args:
+        driver: webdriver
+        quiet_time (float): 页面连续这么多秒没有 DOM 变化和网络请求即认为加载完成
+        max_wait (float): 最长等待时间（秒）
+        selectors (list, optional): 目标元素的 CSS 选择器，全部出现后立即返回
+
+    Returns:
+        float: 本页实际用于滚动和等待的秒数
+    """
+    start_time = time.perf_counter()
+    try:
+        driver.set_script_timeout(max_wait + 5)
+        result = driver.execute_async_script(SCROLL_SCRIPT, max_wait * 1000, quiet_time * 1000, list(selectors or []))
+        reason = result.get('reason') if result else 'unknown'
+    except Exception as e:
+        print(f"事件驱动滚动失败，改用逐段滚动: {e}")
+        _scroll_step_by_step(driver, max_wait)
+        reason = 'fallback'
+    elapsed = time.perf_counter() - start_time
+    print(f"滚动完成，用时 {elapsed:.2f} 秒 ({reason})。")
+    return elapsed
+
+
+def _scroll_step_by_step(driver, max_wait):
+    """渐进式滚动到页面底部，模拟真实用户行为（浏览器不支持异步脚本时使用）"""
+    deadline = time.perf_counter() + max_wait
     last_height = driver.execute_script("return document.body.scrollHeight")
     
-    while True:
+    while time.perf_counter() < deadline:
         # 滚动一小段距离
         for i in range(3):
             current_height = last_height // 3 * (i + 1)
             driver.execute_script(f"window.scrollTo(0, {current_height});")
             time.sleep(random.uniform(0.5, 1))
             
-        # 等待页面加载
-        time.sleep(wait_time)
-        
         new_height = driver.execute_script("return document.body.scrollHeight")
         if new_height == last_height:
             break
         last_height = new_height
-        
-def save_error_page(driver, url, page_num = None):
-    """保存错误页面源码的辅助函数"""
+
+def save_error_page(driver, url, page_num = None, reason=''):
+    """把出错页面的源码交给后台线程压缩保存（见 error_capture.py），不阻塞抓取"""
     try:
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        url_div = soup.new_tag("div", style="font-weight: bold; margin-bottom: 20px;")
-        url_div.string = f"Page URL: {url}"
-        
-        if soup.body:
-            soup.body.insert(0, url_div)
-        else:
-            soup.append(url_div)
-        
-        if page_num:
-            filename_base = f"{url.rsplit('/', 1)[-1]}_page_{page_num}"
-        else:
-            filename_base = url.rsplit('/', 1)[-1]
-        output_folder = "error_pages"
-        os.makedirs(output_folder, exist_ok=True)
-        
-        file_path = os.path.join(output_folder, f'{filename_base}.html')
-        with open(file_path, 'w', encoding='utf-8') as file:
-            file.write(soup.prettify()) #type: ignore
-            
+        error_pages.capture(url, driver.page_source, reason, page_num)
     except Exception as e:
-        print(f"Failed to save error page: {e}")
+        print(f"Failed to get error page source: {e}")
         
 class ProgressManager:
-    def __init__(self, progress_file='data/progress.json'):
+    """flyert 的进度管理，进度文件格式不变，底层使用带索引和日志的 ProgressStore（db 不为 None 时保存在 SQLite 中）"""
+
+    LINK_SETS = ('processed_links', 'error_links', 'empty_links')
+
+    def __init__(self, progress_file='data/progress.json', db=None):
         self.progress_file = progress_file
-        self.progress = self._load_progress()
-        
-    def _load_progress(self):
-        try:
-            with open(self.progress_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {
-                "current_hotel": "",
-                "processed_links": [],
-                "error_links": [],
-                "empty_links": []
-            }
+        self.store = open_progress_store(progress_file, sets=self.LINK_SETS, fields={"current_hotel": ""}, db=db)
     
     def save_progress(self):
-        with open(self.progress_file, 'w', encoding='utf-8') as f:
-            json.dump(self.progress, f, ensure_ascii=False, indent=4)
+        self.store.snapshot()
+    
+    def close(self):
+        self.store.close()
     
     def is_link_processed(self, link):
-        return link in self.progress['processed_links'] or link in self.progress['error_links'] or link in self.progress['empty_links']
+        return any(self.store.contains(name, link) for name in self.LINK_SETS)
     
     def mark_link_processed(self, link):
-        if link not in self.progress['processed_links']:
-            self.progress['processed_links'].append(link)
-        if link in self.progress['error_links']:
-            self.progress['error_links'].remove(link)
-        self.save_progress()
+        self.store.add('processed_links', link)
+        self.store.discard('error_links', link)
     
     def mark_error_link(self, link):
-        if link not in self.progress['error_links']:
-            self.progress['error_links'].append(link)
-            self.save_progress()
+        self.store.add('error_links', link)
             
     def mark_empty_link(self, link):
-        if link not in self.progress['empty_links']:
-            self.progress['empty_links'].append(link)
-        if link in self.progress['error_links']:
-            self.progress['error_links'].remove(link)
-        self.save_progress()
+        self.store.add('empty_links', link)
+        self.store.discard('error_links', link)
     
     def set_current_hotel(self, hotel):
-        self.progress['current_hotel'] = hotel
-        self.save_progress()
+        self.store.set('current_hotel', hotel)
     
     def get_current_hotel(self):
-        return self.progress['current_hotel']
-    
-def main():
-    test_timeStrs = [
-        '3 小时前',
-        '3 天前',
-    ]
-    for time_str in test_timeStrs:
-        print(f"原始时间字符串: {time_str}")
-        parsed_time = parse_timestamp(time_str)
-        if parsed_time:
-            print(f"解析后的时间: {parsed_time}")
-        else:
-            print("无法解析时间")
-            
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+        return self.store.get('current_hotel', "")
@@ -0,0 +1,52 @@
+# run_all.py
+#
+# 在同一个事件循环里同时运行三个爬虫，总耗时约等于最慢的那个站点，而不是三者之和。
+# 三个项目各自有同名的 src/config 包，无法在同一个进程中导入，所以每个爬虫在自己的目录下以子进程运行，
+# 事件循环负责并发启动、转发输出和等待结束。
+
+import asyncio
+import os
+import sys
+import time
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# site name -> (working directory, entry script)
+CRAWLERS = {
+    'autohome': ('AutohomeCrawler', 'run.py'),
+    'dongchedi': ('DongchediCrawler', 'run.py'),
+    'flyert': ('flyertCrawler', 'flyert_crawl.py'),
+}
+
+
+async def run_crawler(site, folder, script):
+    """以子进程运行一个爬虫，逐行转发输出，返回 (站点, 退出码, 耗时)"""
+    start_time = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, '-u', script,
+        cwd=os.path.join(ROOT, folder),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    async for line in process.stdout:
+        print(f"[{site}] {line.decode('utf-8', errors='replace').rstrip()}")
+    return_code = await process.wait()
+    return site, return_code, time.perf_counter() - start_time
+
+
+async def run_all(sites):
+    results = await asyncio.gather(*(run_crawler(site, *CRAWLERS[site]) for site in sites))
+    for site, return_code, elapsed in results:
+        print(f"{site}: 退出码 {return_code}, 耗时 {round(elapsed)} 秒")
+
+
+if __name__ == "__main__":
+    # python run_all.py [site ...]，默认运行全部站点
+    sites = sys.argv[1:] or list(CRAWLERS)
+    unknown = [site for site in sites if site not in CRAWLERS]
+    if unknown:
+        sys.exit(f"未知的站点: {', '.join(unknown)}，可选: {', '.join(CRAWLERS)}")
+    start_time = time.perf_counter()
+    asyncio.run(run_all(sites))
+    print(f'Total time cost: {round(time.perf_counter() - start_time)} seconds')